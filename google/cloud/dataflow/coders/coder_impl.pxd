@@ -26,6 +26,8 @@ from .stream cimport InputStream, OutputStream
 
 
 cdef object loads, dumps, create_InputStream, create_OutputStream
+cdef object create_ByteCountingOutputStream
+cdef unsigned char GLOBAL_WINDOW_TAG, INTERVAL_WINDOW_TAG, PICKLED_WINDOW_TAG
 
 
 cdef class CoderImpl(object):
@@ -33,6 +35,13 @@ cdef class CoderImpl(object):
   cpdef decode_from_stream(self, InputStream stream, bint nested)
   cpdef bytes encode(self, value)
   cpdef decode(self, bytes encoded)
+  cpdef estimate_size(self, value)
+
+  @cython.locals(count=libc.stdint.int64_t)
+  cpdef encode_all(self, values, OutputStream stream)
+  @cython.locals(values=list)
+  cpdef list decode_all(self, InputStream in_stream, libc.stdint.int64_t count)
+  cpdef list decode_each(self, encoded_values)
 
 
 cdef class SimpleCoderImpl(CoderImpl):
@@ -70,6 +79,8 @@ cdef list small_ints
 cdef class VarIntCoderImpl(StreamCoderImpl):
   @cython.locals(ivalue=libc.stdint.int64_t)
   cpdef bytes encode(self, value)
+  @cython.locals(values=list)
+  cpdef list decode_all(self, InputStream in_stream, libc.stdint.int64_t count)
 
 
 cdef class AbstractComponentCoderImpl(StreamCoderImpl):
@@ -86,7 +97,8 @@ cdef class AbstractComponentCoderImpl(StreamCoderImpl):
 
 cdef class TupleCoderImpl(AbstractComponentCoderImpl):
   """A coder for tuple objects."""
-  pass
+  @cython.locals(values=list, first=CoderImpl, second=CoderImpl)
+  cpdef list decode_all(self, InputStream in_stream, libc.stdint.int64_t count)
 
 
 cdef class WindowedValueCoderImpl(AbstractComponentCoderImpl):
@@ -94,3 +106,72 @@ cdef class WindowedValueCoderImpl(AbstractComponentCoderImpl):
   cdef object wrapped_value_coder
   cdef object timestamp_coder
   cdef object window_coder
+
+
+cdef class GlobalWindowCoderImpl(StreamCoderImpl):
+  cdef object _global_window
+
+
+cdef class IntervalWindowCoderImpl(StreamCoderImpl):
+  cdef object _window_class
+  cdef object _timestamp_class
+
+  @cython.locals(start=libc.stdint.int64_t, end=libc.stdint.int64_t)
+  cpdef decode_from_stream(self, InputStream stream, bint nested)
+
+
+cdef class TaggedWindowCoderImpl(StreamCoderImpl):
+  cdef GlobalWindowCoderImpl _global_window_coder
+  cdef IntervalWindowCoderImpl _interval_window_coder
+  cdef object _global_window_type
+  cdef object _interval_window_type
+
+  @cython.locals(tag=long)
+  cpdef decode_from_stream(self, InputStream stream, bint nested)
+
+
+cdef class WindowsCoderImpl(StreamCoderImpl):
+  cdef CoderImpl _window_coder
+
+
+cdef class BooleanCoderImpl(StreamCoderImpl):
+  @cython.locals(value=long)
+  cpdef decode_from_stream(self, InputStream stream, bint nested)
+
+
+cdef class NoneCoderImpl(StreamCoderImpl):
+  pass
+
+
+cdef class ListCoderImpl(StreamCoderImpl):
+  cdef CoderImpl _elem_coder
+
+
+cdef class DictCoderImpl(StreamCoderImpl):
+  cdef CoderImpl _key_coder
+  cdef CoderImpl _value_coder
+
+  @cython.locals(size=libc.stdint.int64_t, value=dict)
+  cpdef decode_from_stream(self, InputStream stream, bint nested)
+
+
+cdef class IterableCoderImpl(StreamCoderImpl):
+  cdef CoderImpl _elem_coder
+
+  @cython.locals(elements=OutputStream)
+  cpdef encode_to_stream(self, value, OutputStream stream, bint nested)
+
+
+cdef class RowCoderImpl(StreamCoderImpl):
+  cdef tuple _field_names
+  cdef tuple _field_coders
+  cdef object _row_type
+  cdef bint _is_dict
+  cdef Py_ssize_t _bitmap_size
+
+  @cython.locals(fields=list, present=Py_ssize_t)
+  cdef _extract_fields(self, value)
+  @cython.locals(c=CoderImpl, i=Py_ssize_t, bitmap=bytearray)
+  cpdef encode_to_stream(self, value, OutputStream stream, bint nested)
+  @cython.locals(c=CoderImpl, i=Py_ssize_t, bitmap=bytearray, fields=list)
+  cpdef decode_from_stream(self, InputStream stream, bint nested)
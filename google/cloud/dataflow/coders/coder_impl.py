@@ -37,12 +37,22 @@ except ImportError:
 try:
   from stream import InputStream as create_InputStream
   from stream import OutputStream as create_OutputStream
+  from stream import (
+      ByteCountingOutputStream as create_ByteCountingOutputStream)
 except ImportError:
   from slow_stream import InputStream as create_InputStream
   from slow_stream import OutputStream as create_OutputStream
+  from slow_stream import (
+      ByteCountingOutputStream as create_ByteCountingOutputStream)
 # pylint: enable=g-import-not-at-top
 
 
+# Tags prefixing the windows coded by TaggedWindowCoderImpl.
+GLOBAL_WINDOW_TAG = 0
+INTERVAL_WINDOW_TAG = 1
+PICKLED_WINDOW_TAG = 2
+
+
 class CoderImpl(object):
 
   def encode_to_stream(self, value, stream, nested):
@@ -61,6 +71,46 @@ class CoderImpl(object):
     """Encodes an object to an unnested string."""
     raise NotImplementedError
 
+  def estimate_size(self, value):
+    """Estimates the size of the unnested encoding of an object, in bytes.
+
+    By default the object is encoded to a stream which only counts the bytes
+    written to it, so that the encoding is never materialized.
+    """
+    out = create_ByteCountingOutputStream()
+    self.encode_to_stream(value, out, False)
+    return out.get_count()
+
+  def encode_all(self, values, stream):
+    """Writes the nested encodings of all the values to stream.
+
+    Returns:
+      The number of values written.
+    """
+    count = 0
+    for value in values:
+      self.encode_to_stream(value, stream, True)
+      count += 1
+    return count
+
+  def decode_all(self, in_stream, count):
+    """Reads count values from their concatenated nested encodings in stream.
+
+    The count is needed since values whose nested encodings take no bytes at
+    all, such as those of NoneCoderImpl, cannot be told apart in this form.
+
+    Returns:
+      The list of the values read.
+    """
+    values = []
+    for _ in xrange(count):
+      values.append(self.decode_from_stream(in_stream, True))
+    return values
+
+  def decode_each(self, encoded_values):
+    """Decodes each of an iterable of unnested encodings into a list."""
+    return [self.decode(encoded) for encoded in encoded_values]
+
 
 class SimpleCoderImpl(CoderImpl):
   """Subclass of CoderImpl implementing stream methods using encode/decode."""
@@ -73,6 +123,9 @@ class SimpleCoderImpl(CoderImpl):
     """Reads object from potentially-nested encoding in stream."""
     return self.decode(stream.read_all(nested))
 
+  def estimate_size(self, value):
+    return len(self.encode(value))
+
 
 class StreamCoderImpl(CoderImpl):
   """Subclass of CoderImpl implementing encode/decode using stream methods."""
@@ -109,6 +162,9 @@ class CallbackCoderImpl(CoderImpl):
   def decode(self, encoded):
     return self._decoder(encoded)
 
+  def estimate_size(self, value):
+    return len(self._encoder(value))
+
 
 class DeterministicPickleCoderImpl(CoderImpl):
 
@@ -161,6 +217,9 @@ class BytesCoderImpl(CoderImpl):
   def decode(self, encoded):
     return encoded
 
+  def estimate_size(self, value):
+    return len(value)
+
 
 class FloatCoderImpl(StreamCoderImpl):
 
@@ -209,6 +268,12 @@ class VarIntCoderImpl(StreamCoderImpl):
         return i
     return StreamCoderImpl.decode(self, encoded)
 
+  def decode_all(self, in_stream, count):
+    values = []
+    for _ in xrange(count):
+      values.append(in_stream.read_var_int64())
+    return values
+
 
 class AbstractComponentCoderImpl(StreamCoderImpl):
 
@@ -246,6 +311,19 @@ class TupleCoderImpl(AbstractComponentCoderImpl):
   def _construct_from_components(self, components):
     return tuple(components)
 
+  def decode_all(self, in_stream, count):
+    if len(self._coder_impls) != 2:
+      return super(TupleCoderImpl, self).decode_all(in_stream, count)
+    # Pairs, such as the key-value pairs read from shuffle, are by far the
+    # most common tuples, so their components are decoded without a list.
+    values = []
+    first = self._coder_impls[0]   # type cast
+    second = self._coder_impls[1]   # type cast
+    for _ in xrange(count):
+      key = first.decode_from_stream(in_stream, True)
+      values.append((key, second.decode_from_stream(in_stream, True)))
+    return values
+
 
 class WindowedValueCoderImpl(AbstractComponentCoderImpl):
   """A coder for windowed values."""
@@ -264,3 +342,294 @@ class WindowedValueCoderImpl(AbstractComponentCoderImpl):
     return WindowedValue(components[0],  # value
                          components[1],  # timestamp
                          components[2])  # windows
+
+
+class GlobalWindowCoderImpl(StreamCoderImpl):
+  """A coder for the global window, which takes no bytes at all."""
+
+  def __init__(self, global_window):
+    self._global_window = global_window
+
+  def encode_to_stream(self, value, out, nested):
+    pass
+
+  def decode_from_stream(self, in_stream, nested):
+    return self._global_window
+
+
+class IntervalWindowCoderImpl(StreamCoderImpl):
+  """A coder for interval windows, as their start and duration in micros."""
+
+  def __init__(self, window_class, timestamp_class):
+    self._window_class = window_class
+    self._timestamp_class = timestamp_class
+
+  def encode_to_stream(self, value, out, nested):
+    start = value.start.micros
+    out.write_var_int64(start)
+    out.write_var_int64(value.end.micros - start)
+
+  def decode_from_stream(self, in_stream, nested):
+    start = in_stream.read_var_int64()
+    end = start + in_stream.read_var_int64()
+    return self._window_class(self._timestamp_class(micros=start),
+                              self._timestamp_class(micros=end))
+
+
+class TaggedWindowCoderImpl(StreamCoderImpl):
+  """A coder for windows of any type.
+
+  Each window is prefixed by a tag byte.  Global and interval windows are
+  then coded by the coders above, and windows of any other type pickled.
+  """
+
+  def __init__(self, global_window, interval_window_class, timestamp_class):
+    self._global_window_coder = GlobalWindowCoderImpl(global_window)
+    self._interval_window_coder = IntervalWindowCoderImpl(
+        interval_window_class, timestamp_class)
+    self._global_window_type = type(global_window)
+    self._interval_window_type = interval_window_class
+
+  def encode_to_stream(self, value, out, nested):
+    t = type(value)
+    if t is self._global_window_type:
+      out.write_byte(GLOBAL_WINDOW_TAG)
+    elif t is self._interval_window_type:
+      out.write_byte(INTERVAL_WINDOW_TAG)
+      self._interval_window_coder.encode_to_stream(value, out, True)
+    else:
+      out.write_byte(PICKLED_WINDOW_TAG)
+      out.write(dumps(value), True)
+
+  def decode_from_stream(self, in_stream, nested):
+    tag = in_stream.read_byte()
+    if tag == GLOBAL_WINDOW_TAG:
+      return self._global_window_coder.decode_from_stream(in_stream, True)
+    elif tag == INTERVAL_WINDOW_TAG:
+      return self._interval_window_coder.decode_from_stream(in_stream, True)
+    elif tag == PICKLED_WINDOW_TAG:
+      return loads(in_stream.read_all(True))
+    else:
+      raise ValueError('Unknown window tag: %d' % tag)
+
+
+class WindowsCoderImpl(StreamCoderImpl):
+  """A coder for the collection of windows of a windowed value.
+
+  The windows are coded as their number followed by each window, and decoded
+  into a list.
+  """
+
+  def __init__(self, window_coder):
+    self._window_coder = window_coder
+
+  def encode_to_stream(self, value, out, nested):
+    out.write_var_int64(len(value))
+    self._window_coder.encode_all(value, out)
+
+  def decode_from_stream(self, in_stream, nested):
+    return [self._window_coder.decode_from_stream(in_stream, True)
+            for _ in xrange(in_stream.read_var_int64())]
+
+
+class BooleanCoderImpl(StreamCoderImpl):
+  """A coder for bool objects, as a single byte."""
+
+  def encode_to_stream(self, value, out, nested):
+    out.write_byte(1 if value else 0)
+
+  def decode_from_stream(self, in_stream, nested):
+    value = in_stream.read_byte()
+    if value == 0:
+      return False
+    elif value == 1:
+      return True
+    else:
+      raise ValueError('Expected 0 or 1 for a bool, got %d' % value)
+
+  def estimate_size(self, value):
+    return 1
+
+
+class NoneCoderImpl(StreamCoderImpl):
+  """A coder for None, which takes no bytes at all."""
+
+  def encode_to_stream(self, value, out, nested):
+    if value is not None:
+      raise ValueError('Expected None, got %r' % (value,))
+
+  def decode_from_stream(self, in_stream, nested):
+    return None
+
+  def estimate_size(self, value):
+    return 0
+
+
+class ListCoderImpl(StreamCoderImpl):
+  """A coder for lists, as their length followed by each element."""
+
+  def __init__(self, elem_coder):
+    self._elem_coder = elem_coder
+
+  def encode_to_stream(self, value, out, nested):
+    out.write_var_int64(len(value))
+    for elem in value:
+      self._elem_coder.encode_to_stream(elem, out, True)
+
+  def decode_from_stream(self, in_stream, nested):
+    return [self._elem_coder.decode_from_stream(in_stream, True)
+            for _ in xrange(in_stream.read_var_int64())]
+
+
+class DictCoderImpl(StreamCoderImpl):
+  """A coder for dicts, as their size followed by each key and value."""
+
+  def __init__(self, key_coder, value_coder):
+    self._key_coder = key_coder
+    self._value_coder = value_coder
+
+  def encode_to_stream(self, value, out, nested):
+    out.write_var_int64(len(value))
+    for k, v in value.iteritems():
+      self._key_coder.encode_to_stream(k, out, True)
+      self._value_coder.encode_to_stream(v, out, True)
+
+  def decode_from_stream(self, in_stream, nested):
+    size = in_stream.read_var_int64()
+    value = {}
+    for _ in xrange(size):
+      k = self._key_coder.decode_from_stream(in_stream, True)
+      value[k] = self._value_coder.decode_from_stream(in_stream, True)
+    return value
+
+
+class IterableCoderImpl(StreamCoderImpl):
+  """A coder for iterables of any kind.
+
+  The elements are coded as their number followed by the length-prefixed
+  block of their encodings, so that the block can be skipped over as a whole
+  and its elements decoded lazily by a DecodedIterable.
+  """
+
+  def __init__(self, elem_coder):
+    self._elem_coder = elem_coder
+
+  def encode_to_stream(self, value, out, nested):
+    elements = create_OutputStream()
+    count = self._elem_coder.encode_all(value, elements)
+    out.write_var_int64(count)
+    out.write(elements.get(), True)
+
+  def decode_from_stream(self, in_stream, nested):
+    count = in_stream.read_var_int64()
+    return DecodedIterable(self._elem_coder, count, in_stream.read_all(True))
+
+
+class DecodedIterable(object):
+  """An iterable decoding its elements as they are iterated over.
+
+  Only the encoded elements are held in memory; every iteration decodes them
+  anew, in batches of DECODE_BATCH_SIZE elements.  Compares equal to any
+  iterable of the same elements, and is pickled as a list.
+  """
+
+  DECODE_BATCH_SIZE = 1000
+
+  def __init__(self, elem_coder, count, encoded):
+    self._elem_coder = elem_coder
+    self._count = count
+    self._encoded = encoded
+
+  def __len__(self):
+    return self._count
+
+  def __iter__(self):
+    in_stream = create_InputStream(self._encoded)
+    remaining = self._count
+    while remaining > 0:
+      batch_size = min(remaining, self.DECODE_BATCH_SIZE)
+      for value in self._elem_coder.decode_all(in_stream, batch_size):
+        yield value
+      remaining -= batch_size
+
+  def __eq__(self, other):
+    if isinstance(other, collections.Iterable):
+      return list(self) == list(other)
+    return NotImplemented
+
+  def __ne__(self, other):
+    if isinstance(other, collections.Iterable):
+      return list(self) != list(other)
+    return NotImplemented
+
+  __hash__ = None
+
+  def __reduce__(self):
+    return list, (list(self),)
+
+  def __repr__(self):
+    return '<%s of %d elements>' % (self.__class__.__name__, self._count)
+
+
+class RowCoderImpl(StreamCoderImpl):
+  """A coder for records with a fixed list of fields.
+
+  A record is coded as a bitmap of its null fields, one bit per field,
+  followed by the nested encodings of its other fields.  Records are either
+  tuples of their field values, such as namedtuples, or dicts from field names
+  to values in which missing fields are null; null fields are left out of
+  the decoded dicts.
+  """
+
+  def __init__(self, field_names, field_coders, row_type):
+    self._field_names = tuple(field_names)
+    self._field_coders = tuple(field_coders)
+    self._row_type = row_type
+    self._is_dict = issubclass(row_type, dict)
+    self._bitmap_size = (len(self._field_coders) + 7) // 8
+
+  def _extract_fields(self, value):
+    if not self._is_dict:
+      if len(value) != len(self._field_coders):
+        raise ValueError('Expected a row of %d fields, got %d: %r' % (
+            len(self._field_coders), len(value), value))
+      return value
+    fields = []
+    present = 0
+    for name in self._field_names:
+      if name in value:
+        fields.append(value[name])
+        present += 1
+      else:
+        fields.append(None)
+    if present != len(value):
+      raise ValueError('Unexpected fields in row: %s' % ', '.join(
+          sorted(set(value) - set(self._field_names))))
+    return fields
+
+  def encode_to_stream(self, value, out, nested):
+    fields = self._extract_fields(value)
+    bitmap = bytearray(self._bitmap_size)
+    for i in xrange(len(self._field_coders)):
+      if fields[i] is None:
+        bitmap[i >> 3] |= 1 << (i & 7)
+    out.write(bytes(bitmap))
+    for i in xrange(len(self._field_coders)):
+      if fields[i] is not None:
+        c = self._field_coders[i]   # type cast
+        c.encode_to_stream(fields[i], out, True)
+
+  def decode_from_stream(self, in_stream, nested):
+    bitmap = bytearray(in_stream.read(self._bitmap_size))
+    fields = []
+    for i in xrange(len(self._field_coders)):
+      if bitmap[i >> 3] & (1 << (i & 7)):
+        fields.append(None)
+      else:
+        c = self._field_coders[i]   # type cast
+        fields.append(c.decode_from_stream(in_stream, True))
+    if self._is_dict:
+      return self._row_type(
+          [(name, field) for name, field in zip(self._field_names, fields)
+           if field is not None])
+    return self._row_type(*fields)
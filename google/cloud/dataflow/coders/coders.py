@@ -28,11 +28,15 @@ try:
   # occurs.
   from google.cloud.dataflow.internal.pickler import dill
   from google.cloud.dataflow.transforms.timeutil import Timestamp
+  from google.cloud.dataflow.transforms.window import GlobalWindow
+  from google.cloud.dataflow.transforms.window import IntervalWindow
 except ImportError:
   # We fall back to using the stock dill library in tests that don't use the
   # full Python SDK.
   import dill
   Timestamp = collections.namedtuple('Timestamp', 'micros')
+  GlobalWindow = collections.namedtuple('GlobalWindow', ())
+  IntervalWindow = collections.namedtuple('IntervalWindow', 'start end')
 
 
 def serialize_coder(coder):
@@ -43,6 +47,21 @@ def serialize_coder(coder):
 def deserialize_coder(serialized):
   from google.cloud.dataflow.internal import pickler
   return pickler.loads(serialized.split('$', 1)[1])
+
+
+def _window_classes():
+  """Returns the global window, interval window and timestamp classes.
+
+  The transforms package imports this module, so the imports above fall back
+  to stand-ins while the SDK itself is loading.  By the time windows are
+  coded, the real classes can be imported.
+  """
+  try:
+    from google.cloud.dataflow.transforms import timeutil
+    from google.cloud.dataflow.transforms import window
+    return window.GlobalWindow, window.IntervalWindow, timeutil.Timestamp
+  except ImportError:
+    return GlobalWindow, IntervalWindow, Timestamp
 # pylint: enable=g-import-not-at-top
 
 
@@ -90,6 +109,10 @@ class Coder(object):
       assert isinstance(self._impl, coder_impl.CoderImpl)
     return self._impl
 
+  def estimate_size(self, value):
+    """Estimates the size of the encoding of the given object, in bytes."""
+    return self.get_impl().estimate_size(value)
+
   def __getstate__(self):
     return self._dict_without_impl()
 
@@ -244,6 +267,26 @@ class TimestampCoder(FastCoder):
     return True
 
 
+class BooleanCoder(FastCoder):
+  """Coder for bool objects."""
+
+  def _create_impl(self):
+    return coder_impl.BooleanCoderImpl()
+
+  def is_deterministic(self):
+    return True
+
+
+class NoneCoder(FastCoder):
+  """Coder for None, the only value of NoneType."""
+
+  def _create_impl(self):
+    return coder_impl.NoneCoderImpl()
+
+  def is_deterministic(self):
+    return True
+
+
 def maybe_dill_dumps(o):
   """Pickle using cPickle or the Dill pickler as a fallback."""
   # We need to use the dill pickler for objects of certain custom classes,
@@ -414,6 +457,189 @@ class TupleCoder(FastCoder):
     return 'TupleCoder[%s]' % ', '.join(str(c) for c in self._coders)
 
 
+class ListCoder(FastCoder):
+  """Coder of list objects."""
+
+  def __init__(self, elem_coder):
+    self._elem_coder = elem_coder
+
+  def _create_impl(self):
+    return coder_impl.ListCoderImpl(self._elem_coder.get_impl())
+
+  def is_deterministic(self):
+    return self._elem_coder.is_deterministic()
+
+  @staticmethod
+  def from_type_hint(typehint, registry):
+    return ListCoder(registry.get_coder(typehint.inner_type))
+
+  def _get_component_coders(self):
+    return [self._elem_coder]
+
+  def __repr__(self):
+    return 'ListCoder[%s]' % self._elem_coder
+
+
+class DictCoder(FastCoder):
+  """Coder of dict objects."""
+
+  def __init__(self, key_coder, value_coder):
+    self._key_coder = key_coder
+    self._value_coder = value_coder
+
+  def _create_impl(self):
+    return coder_impl.DictCoderImpl(self._key_coder.get_impl(),
+                                    self._value_coder.get_impl())
+
+  def is_deterministic(self):
+    # Equal dicts may iterate over their entries in different orders, and so
+    # be encoded differently, whatever the key and value coders.
+    return False
+
+  @staticmethod
+  def from_type_hint(typehint, registry):
+    return DictCoder(registry.get_coder(typehint.key_type),
+                     registry.get_coder(typehint.value_type))
+
+  def _get_component_coders(self):
+    return [self._key_coder, self._value_coder]
+
+  def __repr__(self):
+    return 'DictCoder[%s, %s]' % (self._key_coder, self._value_coder)
+
+
+class IterableCoder(FastCoder):
+  """Coder of iterables of homogeneous objects.
+
+  Values are decoded lazily, as iterables decoding their elements as they are
+  iterated over.
+  """
+
+  def __init__(self, elem_coder):
+    self._elem_coder = elem_coder
+
+  def _create_impl(self):
+    return coder_impl.IterableCoderImpl(self._elem_coder.get_impl())
+
+  def is_deterministic(self):
+    return self._elem_coder.is_deterministic()
+
+  @staticmethod
+  def from_type_hint(typehint, registry):
+    return IterableCoder(registry.get_coder(typehint.inner_type))
+
+  def _get_component_coders(self):
+    return [self._elem_coder]
+
+  def elem_coder(self):
+    return self._elem_coder
+
+  def __repr__(self):
+    return 'IterableCoder[%s]' % self._elem_coder
+
+
+class RowCoder(FastCoder):
+  """Coder of records with a fixed list of fields, each with its own coder.
+
+  Null fields take a single bit each, and the others are coded by their field
+  coders.  Records are decoded into namedtuples of the given row type, or into
+  dicts if the row type is dict; see coder_impl.RowCoderImpl for details.
+
+  RowCoder may be registered as the coder of a namedtuple class, whose fields
+  are then coded by the coders registered for their types as listed by the
+  optional _field_types dict attribute of the class, or pickled otherwise::
+
+    Point = collections.namedtuple('Point', ['x', 'y'])
+    Point._field_types = {'x': int, 'y': int}
+    registry.register_coder(Point, RowCoder)
+  """
+
+  def __init__(self, fields, row_type=None):
+    """Initializes a RowCoder.
+
+    Args:
+      fields: The fields of the records, as (name, coder) pairs in order.
+      row_type: The type to decode records into: a namedtuple class with the
+        given fields, or dict.  If None, a namedtuple class is created with
+        the names of the fields.
+    """
+    self._fields = tuple((name, coder) for name, coder in fields)
+    self._row_type = row_type
+
+  def _create_impl(self):
+    field_names = [name for name, _ in self._fields]
+    row_type = self._row_type or collections.namedtuple('Row', field_names)
+    return coder_impl.RowCoderImpl(
+        field_names, [coder.get_impl() for _, coder in self._fields], row_type)
+
+  def is_deterministic(self):
+    return all(coder.is_deterministic() for _, coder in self._fields)
+
+  @staticmethod
+  def from_type_hint(typehint, registry):
+    if not hasattr(typehint, '_fields'):
+      raise TypeError('RowCoder requires a namedtuple class, got %r.'
+                      % typehint)
+    # pylint: disable=protected-access
+    field_types = getattr(typehint, '_field_types', {})
+    return RowCoder(
+        [(name, registry.get_coder(field_types[name]) if name in field_types
+          else PickleCoder())
+         for name in typehint._fields],
+        typehint)
+
+  def _get_component_coders(self):
+    return [coder for _, coder in self._fields]
+
+  def __repr__(self):
+    return 'RowCoder[%s]' % ', '.join(
+        '%s: %s' % (name, coder) for name, coder in self._fields)
+
+
+class GlobalWindowCoder(FastCoder):
+  """Coder for the global window."""
+
+  def _create_impl(self):
+    global_window_class, _, _ = _window_classes()
+    return coder_impl.GlobalWindowCoderImpl(global_window_class())
+
+  def is_deterministic(self):
+    return True
+
+
+class IntervalWindowCoder(FastCoder):
+  """Coder for interval windows."""
+
+  def _create_impl(self):
+    _, interval_window_class, timestamp_class = _window_classes()
+    return coder_impl.IntervalWindowCoderImpl(interval_window_class,
+                                              timestamp_class)
+
+  def is_deterministic(self):
+    return True
+
+
+class TaggedWindowCoder(FastCoder):
+  """Coder for windows of any type.
+
+  Global and interval windows are coded compactly, and windows of any other
+  type pickled.
+  """
+
+  def _create_impl(self):
+    global_window_class, interval_window_class, timestamp_class = (
+        _window_classes())
+    return coder_impl.TaggedWindowCoderImpl(
+        global_window_class(), interval_window_class, timestamp_class)
+
+  def is_deterministic(self):
+    # Note that TaggedWindowCoder is not deterministic because the
+    # implementation pickles windows of other types than the global and
+    # interval windows.  See the corresponding comments on PickleCoder for
+    # more details.
+    return False
+
+
 class WindowCoder(PickleCoder):
   """Coder for windows in windowed values."""
 
@@ -430,6 +656,32 @@ class WindowCoder(PickleCoder):
     return super(WindowCoder, self).as_cloud_object(is_pair_like=False)
 
 
+class WindowsCoder(FastCoder):
+  """Coder for the collections of windows of windowed values.
+
+  WindowedValueCoder pickles the windows of each value unless it is given
+  this coder, whose encoding is much more compact but cannot decode windows
+  pickled by earlier versions.
+  """
+
+  def __init__(self, window_coder=None):
+    if not window_coder:
+      window_coder = TaggedWindowCoder()
+    self.window_coder = window_coder
+
+  def _create_impl(self):
+    return coder_impl.WindowsCoderImpl(self.window_coder.get_impl())
+
+  def is_deterministic(self):
+    return self.window_coder.is_deterministic()
+
+  def _get_component_coders(self):
+    return [self.window_coder]
+
+  def __repr__(self):
+    return 'WindowsCoder[%s]' % self.window_coder
+
+
 class WindowedValueCoder(FastCoder):
   """Coder for windowed values."""
 
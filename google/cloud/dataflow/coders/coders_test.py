@@ -18,6 +18,7 @@ import logging
 import unittest
 
 from google.cloud.dataflow import coders
+from google.cloud.dataflow.transforms import window
 
 
 class PickleCoderTest(unittest.TestCase):
@@ -55,6 +56,28 @@ class CodersTest(unittest.TestCase):
     self.assertEqual('abc', real_coder.decode(real_coder.encode('abc')))
 
 
+class WindowedValueCoderTest(unittest.TestCase):
+
+  def test_windows_pickled_by_default(self):
+    coder = coders.WindowedValueCoder(coders.BytesCoder())
+    self.assertEqual(coders.PickleCoder(), coder.window_coder)
+    self.assertEqual(coder, coders.registry.get_windowed_coder(str))
+
+  def test_compact_windows(self):
+    value = window.GlobalWindows.WindowedValue('abc')
+    pickled = coders.WindowedValueCoder(coders.BytesCoder())
+    compact = coders.WindowedValueCoder(coders.BytesCoder(),
+                                        window_coder=coders.WindowsCoder())
+    decoded = compact.decode(compact.encode(value))
+    self.assertEqual(value.value, decoded.value)
+    self.assertEqual(value.timestamp.micros, decoded.timestamp.micros)
+    self.assertEqual(value.windows, decoded.windows)
+    self.assertLess(len(compact.encode(value)), len(pickled.encode(value)))
+
+  def test_window_coder_cloud_object_is_not_pair_like(self):
+    self.assertNotIn('is_pair_like', coders.WindowCoder().as_cloud_object())
+
+
 if __name__ == '__main__':
   logging.getLogger().setLevel(logging.INFO)
   unittest.main()
@@ -14,6 +14,7 @@
 
 """Tests common to all coder implementations."""
 
+import collections
 import logging
 import math
 import sys
@@ -22,6 +23,18 @@ import unittest
 import dill
 
 import coders
+from google.cloud.dataflow.transforms import timeutil
+from google.cloud.dataflow.transforms import window
+
+# The streams used by the coder implementations, compiled or not.
+# pylint: disable=g-import-not-at-top
+try:
+  from stream import InputStream
+  from stream import OutputStream
+except ImportError:
+  from slow_stream import InputStream
+  from slow_stream import OutputStream
+# pylint: enable=g-import-not-at-top
 
 
 # Defined out of line for picklability.
@@ -34,6 +47,9 @@ class CustomCoder(coders.Coder):
     return int(encoded) - 1
 
 
+Point = collections.namedtuple('Point', ['x', 'y', 'label'])
+
+
 class CodersTest(unittest.TestCase):
 
   # These class methods ensure that we test each defined coder in both
@@ -77,6 +93,15 @@ class CodersTest(unittest.TestCase):
     self._observe(coder)
     for v in values:
       self.assertEqual(v, coder.decode(coder.encode(v)))
+      self.assertEqual(len(coder.encode(v)), coder.estimate_size(v))
+    impl = coder.get_impl()
+    self.assertEqual(list(values),
+                     impl.decode_each([coder.encode(v) for v in values]))
+    out = OutputStream()
+    self.assertEqual(len(values), impl.encode_all(values, out))
+    in_stream = InputStream(out.get())
+    self.assertEqual(list(values), impl.decode_all(in_stream, len(values)))
+    self.assertEqual(0, in_stream.size())
     copy1 = dill.loads(dill.dumps(coder))
     copy2 = dill.loads(dill.dumps(coder))
     for v in values:
@@ -153,6 +178,139 @@ class CodersTest(unittest.TestCase):
         ((-2, 5), u'a\u0101' * 100),
         ((300, 1), 'abc\0' * 5))
 
+  def test_global_window_coder(self):
+    coder = coders.GlobalWindowCoder()
+    self.check_coder(coder, window.GlobalWindow())
+    self.assertEqual('', coder.encode(window.GlobalWindow()))
+    self.check_coder(coders.TupleCoder((coder, coders.VarIntCoder())),
+                     (window.GlobalWindow(), 1))
+
+  def test_interval_window_coder(self):
+    windows = [window.IntervalWindow(timeutil.Timestamp(micros=start),
+                                     timeutil.Timestamp(micros=end))
+               for start, end in [(0, 1), (-10, 10), (1234567890, 1234567899),
+                                  (-1234567890123456, 1234567890123456)]]
+    self.check_coder(coders.IntervalWindowCoder(), *windows)
+    self.check_coder(
+        coders.TupleCoder((coders.IntervalWindowCoder(), coders.VarIntCoder())),
+        *[(w, 1) for w in windows])
+
+  def test_tagged_window_coder(self):
+    windows = [window.GlobalWindow(),
+               window.IntervalWindow(timeutil.Timestamp(micros=10),
+                                     timeutil.Timestamp(micros=20)),
+               ('not', 'a', 'window')]
+    self.check_coder(coders.TaggedWindowCoder(), *windows)
+    self.check_coder(
+        coders.TupleCoder((coders.TaggedWindowCoder(), coders.VarIntCoder())),
+        *[(w, 1) for w in windows])
+
+  def test_windows_coder(self):
+    coder = coders.WindowsCoder()
+    interval_window = window.IntervalWindow(timeutil.Timestamp(micros=10),
+                                            timeutil.Timestamp(micros=20))
+    self.check_coder(coder, [], [window.GlobalWindow()],
+                     [interval_window, window.GlobalWindow()])
+    # Singleton global windows are coded by their count and tag only.
+    self.assertEqual(2, len(coder.encode([window.GlobalWindow()])))
+    self.check_coder(
+        coders.TupleCoder((coders.WindowsCoder(coders.IntervalWindowCoder()),
+                           coders.VarIntCoder())),
+        ([interval_window], 1))
+
+  def test_boolean_coder(self):
+    self.check_coder(coders.BooleanCoder(), True, False)
+    self.assertEqual('\x01', coders.BooleanCoder().encode(True))
+    self.check_coder(
+        coders.TupleCoder((coders.BooleanCoder(), coders.VarIntCoder())),
+        (True, 1), (False, 2))
+
+  def test_none_coder(self):
+    self.check_coder(coders.NoneCoder(), None)
+    self.assertEqual('', coders.NoneCoder().encode(None))
+    self.check_coder(
+        coders.TupleCoder((coders.NoneCoder(), coders.VarIntCoder())),
+        (None, 1))
+
+  def test_list_coder(self):
+    coder = coders.ListCoder(coders.VarIntCoder())
+    self.check_coder(coder, [], [1], [1, 2, 3], range(1000))
+    self.check_coder(
+        coders.TupleCoder((coder, coders.BytesCoder())),
+        ([1, 2], 'a'), ([], ''))
+    self.check_coder(
+        coders.ListCoder(coders.ListCoder(coders.BytesCoder())),
+        [['a', 'b'], [], ['c']])
+
+  def test_dict_coder(self):
+    coder = coders.DictCoder(coders.BytesCoder(), coders.VarIntCoder())
+    self.check_coder(coder, {}, {'a': 1}, {'a': 1, 'b': 2, 'c': -3})
+    self.check_coder(
+        coders.TupleCoder((coder, coders.VarIntCoder())),
+        ({'a': 1}, 1), ({}, 2))
+    self.assertFalse(coder.is_deterministic())
+
+  def test_iterable_coder(self):
+    coder = coders.IterableCoder(coders.VarIntCoder())
+    self.check_coder(coder, [], [1], [1, 2, 3], range(1000))
+    # Iterables of unknown length, such as generators, are coded too.
+    self.assertEqual(
+        [0, 1, 2], list(coder.decode(coder.encode(x for x in xrange(3)))))
+    self.check_coder(
+        coders.TupleCoder((coders.VarIntCoder(), coder)),
+        (1, [1, 2]), (2, []))
+    self.check_coder(
+        coders.IterableCoder(coders.IterableCoder(coders.BytesCoder())),
+        [['a', 'b'], [], ['c']])
+
+  def test_iterable_coder_decodes_lazily(self):
+    coder = coders.IterableCoder(coders.VarIntCoder())
+    decoded = coder.decode(coder.encode([1, 2, 3]))
+    self.assertEqual(3, len(decoded))
+    # The elements are decoded anew on every iteration.
+    self.assertEqual([1, 2, 3], list(decoded))
+    self.assertEqual([1, 2, 3], list(decoded))
+    self.assertEqual([1, 2, 3], dill.loads(dill.dumps(decoded)))
+    self.assertNotEqual([1, 2], decoded)
+    # The elements are decoded in batches, even those encoded in no bytes.
+    coder = coders.IterableCoder(coders.NoneCoder())
+    self.assertEqual([None] * 2500,
+                     list(coder.decode(coder.encode([None] * 2500))))
+
+  def test_row_coder(self):
+    fields = [('x', coders.VarIntCoder()), ('y', coders.FloatCoder()),
+              ('label', coders.BytesCoder())]
+    coder = coders.RowCoder(fields, Point)
+    self.check_coder(coder, Point(1, 2.5, 'a'), Point(None, None, None),
+                     Point(-1, None, ''))
+    self.assertIsInstance(coder.decode(coder.encode(Point(1, 2.5, 'a'))),
+                          Point)
+    # A single byte of null bitmap, a one byte varint and the 'a' label.
+    self.assertEqual(4, len(coder.encode(Point(1, None, 'a'))))
+    self.check_coder(
+        coders.TupleCoder((coders.VarIntCoder(), coder)),
+        (1, Point(1, 2.5, 'a')), (2, Point(2, None, None)))
+    with self.assertRaises(ValueError):
+      coder.encode((1, 2.5))
+
+  def test_row_coder_default_row_type(self):
+    coder = coders.RowCoder([('x', coders.VarIntCoder()),
+                             ('y', coders.VarIntCoder())])
+    row = coder.decode(coder.encode((1, 2)))
+    self.assertEqual((1, 2), row)
+    self.assertEqual(('x', 'y'), row._fields)
+
+  def test_row_coder_dict_rows(self):
+    fields = [('f%d' % i, coders.VarIntCoder()) for i in range(10)]
+    coder = coders.RowCoder(fields, dict)
+    self.check_coder(coder, {}, {'f0': 0}, {'f%d' % i: i for i in range(10)},
+                     {'f1': 1, 'f9': 9})
+    # Null fields are left out of the decoded rows.
+    self.assertEqual({'f1': 1}, coder.decode(coder.encode({'f1': 1,
+                                                           'f2': None})))
+    with self.assertRaises(ValueError):
+      coder.encode({'f1': 1, 'unknown': 2})
+
   def test_base64_pickle_coder(self):
     self.check_coder(coders.Base64PickleCoder(), 'a', 1, 1.5, (1, 2, 3))
 
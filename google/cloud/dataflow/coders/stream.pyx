@@ -60,7 +60,7 @@ cdef class OutputStream(object):
 
   cpdef write_bigendian_int64(self, libc.stdint.int64_t signed_v):
     cdef libc.stdint.uint64_t v = signed_v
-    if  self.size < self.pos - 8:
+    if  self.size - self.pos < 8:
       self.extend(8)
     self.data[self.pos    ] = <unsigned char>(v >> 56)
     self.data[self.pos + 1] = <unsigned char>(v >> 48)
@@ -74,7 +74,7 @@ cdef class OutputStream(object):
 
   cpdef write_bigendian_int32(self, libc.stdint.int32_t signed_v):
     cdef libc.stdint.uint32_t v = signed_v
-    if  self.size < self.pos - 4:
+    if  self.size - self.pos < 4:
       self.extend(4)
     self.data[self.pos    ] = <unsigned char>(v >> 24)
     self.data[self.pos + 1] = <unsigned char>(v >> 16)
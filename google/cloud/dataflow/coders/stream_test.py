@@ -103,6 +103,16 @@ class StreamTest(unittest.TestCase):
     for v in values:
       self.assertEquals(v, in_s.read_bigendian_int32())
 
+  def test_bigendian_values_grow_stream(self):
+    out_s = self.OutputStream()
+    for v in range(1000):
+      out_s.write_bigendian_int64(v)
+      out_s.write_bigendian_int32(v)
+    in_s = self.InputStream(out_s.get())
+    for v in range(1000):
+      self.assertEquals(v, in_s.read_bigendian_int64())
+      self.assertEquals(v, in_s.read_bigendian_int32())
+
   def test_byte_counting(self):
     bc_s = self.ByteCountingOutputStream()
     self.assertEquals(0, bc_s.get_count())
@@ -82,7 +82,11 @@ class CoderRegistry(object):
     self._register_coder_internal(str, coders.BytesCoder)
     self._register_coder_internal(bytes, coders.BytesCoder)
     self._register_coder_internal(unicode, coders.StrUtf8Coder)
+    self._register_coder_internal(bool, coders.BooleanCoder)
+    self._register_coder_internal(type(None), coders.NoneCoder)
     self._register_coder_internal(typehints.TupleConstraint, coders.TupleCoder)
+    self._register_coder_internal(typehints.ListConstraint, coders.ListCoder)
+    self._register_coder_internal(typehints.DictConstraint, coders.DictCoder)
     self._register_coder_internal(typehints.AnyTypeConstraint,
                                   coders.PickleCoder)
     self._fallback_coder = fallback_coder or coders.PickleCoder
@@ -14,6 +14,7 @@
 
 """Unit tests for the typecoders module."""
 
+import collections
 import unittest
 
 from google.cloud.dataflow.coders import coders
@@ -46,6 +47,10 @@ class CustomCoder(coders.Coder):
     return True
 
 
+Record = collections.namedtuple('Record', ['name', 'count', 'extra'])
+Record._field_types = {'name': str, 'count': int}
+
+
 class TypeCodersTest(unittest.TestCase):
 
   def test_register_non_type_coder(self):
@@ -109,6 +114,53 @@ class TypeCodersTest(unittest.TestCase):
         real_coder.encode('abc'), expected_coder.encode('abc'))
     self.assertEqual('abc', real_coder.decode(real_coder.encode('abc')))
 
+  def test_standard_bool_and_none_coders(self):
+    self.assertEqual(coders.BooleanCoder(),
+                     typecoders.registry.get_coder(bool))
+    self.assertEqual(coders.NoneCoder(),
+                     typecoders.registry.get_coder(type(None)))
+
+  def test_standard_collection_coders(self):
+    self.assertEqual(coders.ListCoder(coders.VarIntCoder()),
+                     typecoders.registry.get_coder(typehints.List[int]))
+    self.assertEqual(
+        coders.DictCoder(coders.BytesCoder(), coders.FloatCoder()),
+        typecoders.registry.get_coder(typehints.Dict[str, float]))
+
+  def test_group_by_key_output_coder(self):
+    # GroupByKey outputs are hinted KV[K, Iterable[V]], and DoFns reading them
+    # may index the grouped values and take their len().
+    coder = typecoders.registry.get_coder(
+        typehints.KV[str, typehints.Iterable[int]])
+    self.assertEqual(
+        coders.TupleCoder((coders.BytesCoder(), coders.PickleCoder())), coder)
+    key, values = coder.decode(coder.encode(('k', [1, 2, 3])))
+    self.assertEqual('k', key)
+    self.assertEqual(3, len(values))
+    self.assertEqual(2, values[1])
+
+  def test_nested_collection_coder(self):
+    coder = typecoders.registry.get_coder(
+        typehints.KV[str, typehints.List[typehints.List[bool]]])
+    self.assertTrue(coder.is_deterministic())
+    value = ('k', [[True, False], [], [True]])
+    revived_coder = pickler.loads(pickler.dumps(coder))
+    self.assertEqual(value, revived_coder.decode(revived_coder.encode(value)))
+
+  def test_get_coder_with_row_coder(self):
+    typecoders.registry.register_coder(Record, coders.RowCoder)
+    coder = typecoders.registry.get_coder(typehints.KV[str, Record])
+    self.assertEqual(
+        coders.RowCoder([('name', coders.BytesCoder()),
+                         ('count', coders.VarIntCoder()),
+                         ('extra', coders.PickleCoder())], Record),
+        coder.value_coder())
+    revived_coder = pickler.loads(pickler.dumps(coder))
+    value = ('k', Record('abc', 123, None))
+    decoded = revived_coder.decode(revived_coder.encode(value))
+    self.assertEqual(value, decoded)
+    self.assertIsInstance(decoded[1], Record)
+
 
 if __name__ == '__main__':
   unittest.main()
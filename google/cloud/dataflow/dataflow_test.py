@@ -24,6 +24,7 @@ from google.cloud.dataflow.pipeline import Pipeline
 from google.cloud.dataflow.pvalue import AsDict
 from google.cloud.dataflow.pvalue import AsIter as AllOf
 from google.cloud.dataflow.pvalue import AsList
+from google.cloud.dataflow.pvalue import AsMultimap
 from google.cloud.dataflow.pvalue import AsSingleton
 from google.cloud.dataflow.pvalue import EmptySideInput
 from google.cloud.dataflow.pvalue import SideOutputValue
@@ -378,6 +379,18 @@ class DataflowTest(unittest.TestCase):
     assert_that(results, matcher(1, some_kvs))
     pipeline.run()
 
+  def test_as_multimap_side_input(self):
+    some_kvs = [('a', 1), ('b', 2), ('a', 3)]
+    pipeline = Pipeline('DirectPipelineRunner')
+    main_input = pipeline | Create('main input', ['a', 'b', 'c'])
+    side_kvs = pipeline | Create('side kvs', some_kvs)
+    results = main_input | FlatMap(
+        'test',
+        lambda x, multimap: [(x, sorted(multimap.get(x, [])))],
+        AsMultimap(side_kvs))
+    assert_that(results, equal_to([('a', [1, 3]), ('b', [2]), ('c', [])]))
+    pipeline.run()
+
   def test_window_transform(self):
     class TestWindowFn(WindowFn):
       """Windowing function adding two disjoint windows to each element."""
@@ -127,6 +127,7 @@ except ImportError:
 
 
 __all__ = [
+    'RowAsDictCoder',
     'TableRowJsonCoder',
     'BigQueryDisposition',
     'BigQuerySource',
@@ -148,6 +149,44 @@ class RowAsDictJsonCoder(coders.Coder):
     return json.loads(encoded_table_row)
 
 
+# Coders of the values of table fields of each type, as read from BigQuery
+# by BigQueryWrapper.convert_row_to_dict.  Fields of other types are pickled.
+_FIELD_VALUE_CODERS = {
+    'STRING': coders.StrUtf8Coder,
+    'BYTES': coders.StrUtf8Coder,
+    'INTEGER': coders.VarIntCoder,
+    'FLOAT': coders.FloatCoder,
+    'TIMESTAMP': coders.FloatCoder,
+    'BOOLEAN': coders.BooleanCoder,
+}
+
+
+def _field_coder(field_schema):
+  """Returns the coder of the values of a table field."""
+  if field_schema.type.upper() == 'RECORD':
+    coder = coders.RowCoder(
+        [(f.name, _field_coder(f)) for f in field_schema.fields], dict)
+  else:
+    coder = _FIELD_VALUE_CODERS.get(
+        field_schema.type.upper(), coders.PickleCoder)()
+  if field_schema.mode == 'REPEATED':
+    coder = coders.ListCoder(coder)
+  return coder
+
+
+class RowAsDictCoder(coders.RowCoder):
+  """A compact coder for table rows represented as dicts.
+
+  The fields of the rows are coded by coders chosen from the table schema,
+  which makes this coder a much more compact alternative to pickling rows
+  passed between steps.  Null fields are left out of the decoded rows.
+  """
+
+  def __init__(self, table_schema):
+    super(RowAsDictCoder, self).__init__(
+        [(f.name, _field_coder(f)) for f in table_schema.fields], dict)
+
+
 class TableRowJsonCoder(coders.Coder):
   """A coder for a TableRow instance to/from a JSON string.
 
@@ -22,6 +22,7 @@ import unittest
 import mock
 import google.cloud.dataflow as df
 from google.cloud.dataflow.internal.json_value import to_json_value
+from google.cloud.dataflow.io.bigquery import RowAsDictCoder
 from google.cloud.dataflow.io.bigquery import RowAsDictJsonCoder
 from google.cloud.dataflow.io.bigquery import TableRowJsonCoder
 from google.cloud.dataflow.utils.options import PipelineOptions
@@ -38,6 +39,34 @@ class TestRowAsDictJsonCoder(unittest.TestCase):
     self.assertEqual(test_value, coder.decode(coder.encode(test_value)))
 
 
+class TestRowAsDictCoder(unittest.TestCase):
+
+  def test_row_as_dict(self):
+    schema_definition = [
+        ('s', 'STRING'), ('i', 'INTEGER'), ('f', 'FLOAT'), ('b', 'BOOLEAN')]
+    schema = bigquery.TableSchema(
+        fields=[bigquery.TableFieldSchema(name=k, type=v)
+                for k, v in schema_definition])
+    coder = RowAsDictCoder(schema)
+    test_value = {'s': u'abc', 'i': 123, 'f': 123.456, 'b': True}
+    self.assertEqual(test_value, coder.decode(coder.encode(test_value)))
+    self.assertEqual({'i': 123}, coder.decode(coder.encode({'i': 123})))
+    self.assertLess(len(coder.encode(test_value)),
+                    len(RowAsDictJsonCoder().encode(test_value)))
+
+  def test_nested_and_repeated_fields(self):
+    inner_schema = bigquery.TableFieldSchema(
+        name='inner', type='RECORD', mode='REPEATED',
+        fields=[bigquery.TableFieldSchema(name='x', type='INTEGER'),
+                bigquery.TableFieldSchema(name='y', type='STRING')])
+    schema = bigquery.TableSchema(
+        fields=[bigquery.TableFieldSchema(name='s', type='STRING'),
+                inner_schema])
+    coder = RowAsDictCoder(schema)
+    test_value = {'s': u'abc', 'inner': [{'x': 1, 'y': u'a'}, {'x': 2}]}
+    self.assertEqual(test_value, coder.decode(coder.encode(test_value)))
+
+
 class TestTableRowJsonCoder(unittest.TestCase):
 
   def test_row_as_table_row(self):
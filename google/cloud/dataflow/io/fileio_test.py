@@ -84,6 +84,38 @@ class TestTextFileSource(unittest.TestCase):
     self.assertEqual(len(progress_record), 3)
     self.assertEqual(progress_record, [0, 6, 13])
 
+  def test_read_lines_spanning_buffers(self):
+    lines = ['', 'a', 'bcdefghij', '', '', 'klm', 'nopqrstuvwxyz' * 3, 'z']
+    for text in ('\n'.join(lines), '\n'.join(lines) + '\n'):
+      file_path = self.create_temp_file(text)
+      for strip_trailing_newlines in (True, False):
+        expected_lines = text.splitlines(not strip_trailing_newlines)
+        for read_buffer_size in (1, 2, 3, 7, 64, 1024):
+          source = fileio.TextFileSource(
+              file_path=file_path,
+              strip_trailing_newlines=strip_trailing_newlines)
+          read_lines = []
+          offsets = []
+          with source.reader() as reader:
+            reader.READ_BUFFER_SIZE = read_buffer_size
+            for line in reader:
+              read_lines.append(line)
+              offsets.append(reader.get_progress().position.byte_offset)
+          self.assertEqual(read_lines, expected_lines)
+          self.assertEqual(
+              offsets,
+              [sum(len(line) + 1 for line in lines[:i])
+               for i in range(len(expected_lines))])
+
+  def test_update_stop_position_exhaustive_small_buffer(self):
+    read_buffer_size = fileio.TextFileReader.READ_BUFFER_SIZE
+    fileio.TextFileReader.READ_BUFFER_SIZE = 3
+    try:
+      self.run_update_stop_position_exhaustive(
+          ['', 'aaaa', '', 'bbbb', 'cccc', '', 'dddd', 'eeee', ''], '\n')
+    finally:
+      fileio.TextFileReader.READ_BUFFER_SIZE = read_buffer_size
+
   def try_splitting_reader_at(self, reader, split_request, expected_response):
     actual_response = reader.request_dynamic_split(split_request)
 
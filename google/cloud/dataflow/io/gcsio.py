@@ -18,13 +18,16 @@ This library evolved from the Google App Engine GCS client available at
 https://github.com/GoogleCloudPlatform/appengine-gcs-client.
 """
 
+import collections
 import errno
 import fnmatch
 import logging
 import multiprocessing
 import os
+import Queue
 import re
 import StringIO
+import sys
 import threading
 
 from google.cloud.dataflow.internal import auth
@@ -46,6 +49,9 @@ except ImportError:
 
 DEFAULT_READ_BUFFER_SIZE = 1024 * 1024
 
+# By default, segments are read synchronously as they are needed.
+DEFAULT_READ_AHEAD_SEGMENTS = 0
+
 
 def parse_gcs_path(gcs_path):
   """Return the bucket and object names of the given gs:// path."""
@@ -55,13 +61,22 @@ def parse_gcs_path(gcs_path):
   return match.group(1), match.group(2)
 
 
+def _new_storage_client():
+  credentials = auth.get_service_credentials()
+  return storage.StorageV1(credentials=credentials)
+
+
 class GcsIO(object):
   """Google Cloud Storage I/O client."""
   _instance = None
 
-  def __new__(cls, storage_client=None):
+  # Creates the storage clients of the threads reading ahead in opened files,
+  # or None if files are not read ahead.
+  client_factory = None
+
+  def __new__(cls, storage_client=None, client_factory=None):
     if storage_client:
-      return super(GcsIO, cls).__new__(cls, storage_client)
+      return super(GcsIO, cls).__new__(cls, storage_client, client_factory)
     else:
       # Create a single storage client for each thread.  We would like to avoid
       # creating more than one storage client for each thread, since each
@@ -69,23 +84,34 @@ class GcsIO(object):
       # credentaials.
       local_state = threading.local()
       if getattr(local_state, 'gcsio_instance', None) is None:
-        credentials = auth.get_service_credentials()
-        storage_client = storage.StorageV1(credentials=credentials)
+        storage_client = _new_storage_client()
         local_state.gcsio_instance = (
             super(GcsIO, cls).__new__(cls, storage_client))
         local_state.gcsio_instance.client = storage_client
+        local_state.gcsio_instance.client_factory = _new_storage_client
       return local_state.gcsio_instance
 
-  def __init__(self, storage_client=None):
+  def __init__(self, storage_client=None, client_factory=None):
+    """Initializes a GcsIO instance.
+
+    Args:
+      storage_client: the storage client to use, or None to create one.
+      client_factory: a callable returning a new storage client, for the
+        threads reading ahead in files opened with read_ahead_segments.  It
+        must be given along with storage_client for files to be read ahead,
+        since a storage client may not be shared by several threads.
+    """
     # We must do this check on storage_client because the client attribute may
     # have already been set in __new__ for the singleton case when
     # storage_client is None.
     if storage_client is not None:
       self.client = storage_client
+      self.client_factory = client_factory
 
   def open(self, filename, mode='r',
            read_buffer_size=DEFAULT_READ_BUFFER_SIZE,
-           mime_type='application/octet-stream'):
+           mime_type='application/octet-stream',
+           read_ahead_segments=DEFAULT_READ_AHEAD_SEGMENTS):
     """Open a GCS file path for reading or writing.
 
     Args:
@@ -93,6 +119,9 @@ class GcsIO(object):
       mode: 'r' for reading or 'w' for writing.
       read_buffer_size: Buffer size to use during read operations.
       mime_type: Mime type to set for write operations.
+      read_ahead_segments: Number of buffer-sized segments following the
+        current one to fetch concurrently during sequential read operations.
+        Ignored if this object has no client_factory.
 
     Returns:
       file object.
@@ -102,7 +131,9 @@ class GcsIO(object):
     """
     if mode == 'r' or mode == 'rb':
       return GcsBufferedReader(self.client, filename,
-                               buffer_size=read_buffer_size)
+                               buffer_size=read_buffer_size,
+                               read_ahead_segments=read_ahead_segments,
+                               client_factory=self.client_factory)
     elif mode == 'w' or mode == 'wb':
       return GcsBufferedWriter(self.client, filename, mime_type=mime_type)
     else:
@@ -138,14 +169,59 @@ class GcsIO(object):
     return object_paths
 
 
-class GcsBufferedReader(object):
-  """A class for reading Google Cloud Storage files."""
+class _SegmentFetch(object):
+  """A segment of a GCS file being read ahead by a fetching thread."""
+
+  def __init__(self, start, size):
+    self.start = start
+    self.size = size
+    self.cancelled = False
+    self._done = threading.Event()
+    self._value = None
+    self._exc_info = None
+
+  def set_value(self, value):
+    self._value = value
+    self._done.set()
+
+  def set_exc_info(self, exc_info):
+    self._exc_info = exc_info
+    self._done.set()
+
+  def get_value(self):
+    self._done.wait()
+    if self._exc_info:
+      raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+    return self._value
+
 
-  def __init__(self, client, path, buffer_size=DEFAULT_READ_BUFFER_SIZE):
+class GcsBufferedReader(object):
+  """A class for reading Google Cloud Storage files.
+
+  Segments of buffer_size bytes are fetched as the file is read.  If
+  read_ahead_segments is positive, then once the file is read sequentially
+  past its first segment, up to that many of the following segments are
+  fetched concurrently by as many threads, each over its own download and
+  its own storage client, made by client_factory, as a storage client may
+  not be used by several threads at once.  Without a client_factory, the
+  file is not read ahead.  The fetched segments are kept until read, so that
+  at most read_ahead_segments segments are ever held in memory besides the
+  current one.  Seeking elsewhere than the next segment discards them.
+
+  The fetching threads are stopped when the reader is closed, or else when
+  it is garbage collected.
+  """
+
+  def __init__(self, client, path, buffer_size=DEFAULT_READ_BUFFER_SIZE,
+               read_ahead_segments=DEFAULT_READ_AHEAD_SEGMENTS,
+               client_factory=None):
     self.client = client
     self.path = path
     self.bucket, self.name = parse_gcs_path(path)
     self.buffer_size = buffer_size
+    self.read_ahead_segments = (
+        read_ahead_segments if client_factory is not None else 0)
+    self.client_factory = client_factory
 
     # Get object state.
     get_request = (
@@ -165,6 +241,7 @@ class GcsBufferedReader(object):
 
     # Ensure read is from file of the correct generation.
     get_request.generation = metadata.generation
+    self.get_request = get_request
 
     # Initialize read buffer state.
     self.download_stream = StringIO.StringIO()
@@ -176,6 +253,12 @@ class GcsBufferedReader(object):
     self.buffer_start_position = 0
     self.closed = False
 
+    # Segments being read ahead, in file order, and the queue and threads
+    # fetching them (both started on first use).
+    self.read_ahead = collections.deque()
+    self.fetch_queue = None
+    self.fetch_threads = []
+
   @retry.with_exponential_backoff()  # Using retry defaults from utils/retry.py
   def _get_object_metadata(self, get_request):
     return self.client.objects.Get(get_request)
@@ -236,8 +319,6 @@ class GcsBufferedReader(object):
 
     while to_read > 0:
       # If we have exhausted the buffer, get the next segment.
-      # TODO(ccy): We should consider prefetching the next block in another
-      # thread.
       self._fetch_next_if_buffer_exhausted()
 
       # Determine number of bytes to read from buffer.
@@ -270,9 +351,82 @@ class GcsBufferedReader(object):
   def _fetch_next_if_buffer_exhausted(self):
     if not self.buffer or (self.buffer_start_position + len(self.buffer)
                            <= self.position):
+      sequential = bool(self.buffer)
       bytes_to_request = min(self._remaining(), self.buffer_size)
       self.buffer_start_position = self.position
-      self.buffer = self._get_segment(self.position, bytes_to_request)
+      if self.read_ahead_segments > 0 and (sequential or self.read_ahead):
+        self.buffer = self._get_read_ahead_segment(self.position,
+                                                   bytes_to_request)
+      else:
+        self.buffer = self._get_segment(self.position, bytes_to_request)
+
+  def _get_read_ahead_segment(self, start, size):
+    """Get the given segment, reading the following ones ahead."""
+    if self.read_ahead and self.read_ahead[0].start == start:
+      fetch = self.read_ahead.popleft()
+    else:
+      self._cancel_read_ahead()
+      fetch = None
+    # Request the following segments before waiting for this one.
+    if self.read_ahead:
+      next_start = self.read_ahead[-1].start + self.read_ahead[-1].size
+    else:
+      next_start = start + size
+    while (len(self.read_ahead) < self.read_ahead_segments and
+           next_start < self.size):
+      next_fetch = _SegmentFetch(
+          next_start, min(self.size - next_start, self.buffer_size))
+      self._start_fetch_threads()
+      self.fetch_queue.put(next_fetch)
+      self.read_ahead.append(next_fetch)
+      next_start += next_fetch.size
+    if fetch is None:
+      return self._get_segment(start, size)
+    return fetch.get_value()
+
+  def _cancel_read_ahead(self):
+    for fetch in self.read_ahead:
+      fetch.cancelled = True
+    self.read_ahead.clear()
+
+  def _start_fetch_threads(self):
+    if self.fetch_queue is None:
+      self.fetch_queue = Queue.Queue()
+      for _ in xrange(self.read_ahead_segments):
+        fetch_thread = threading.Thread(
+            target=GcsBufferedReader._fetch_segments,
+            args=(self.client_factory, self.get_request, self.fetch_queue))
+        fetch_thread.daemon = True
+        fetch_thread.start()
+        self.fetch_threads.append(fetch_thread)
+
+  @staticmethod
+  def _fetch_segments(client_factory, get_request, fetch_queue):
+    """Fetches the segments put on fetch_queue until None is put on it."""
+    # This is a static method so that the fetching threads do not keep a
+    # reader which was not closed alive.
+    exc_info = None
+    try:
+      client = client_factory()
+      download_stream = StringIO.StringIO()
+      downloader = transfer.Download(download_stream, auto_transfer=False)
+      client.objects.Get(get_request, download=downloader)
+    except Exception:  # pylint: disable=broad-except
+      exc_info = sys.exc_info()
+    while True:
+      fetch = fetch_queue.get()
+      if fetch is None:
+        return
+      if fetch.cancelled:
+        continue
+      if exc_info:
+        fetch.set_exc_info(exc_info)
+        continue
+      try:
+        fetch.set_value(GcsBufferedReader._get_range(
+            downloader, download_stream, fetch.start, fetch.size))
+      except Exception:  # pylint: disable=broad-except
+        fetch.set_exc_info(sys.exc_info())
 
   def _remaining(self):
     return self.size - self.position
@@ -283,16 +437,33 @@ class GcsBufferedReader(object):
     self.download_stream = None
     self.downloader = None
     self.buffer = None
+    self._cancel_read_ahead()
+    self._stop_fetch_threads()
+
+  def __del__(self):
+    # The fetching threads of a reader that was never closed would otherwise
+    # wait for segments to fetch forever.
+    if getattr(self, 'fetch_threads', None):
+      self._stop_fetch_threads()
+
+  def _stop_fetch_threads(self):
+    for _ in self.fetch_threads:
+      self.fetch_queue.put(None)
+    self.fetch_threads = []
 
   def _get_segment(self, start, size):
     """Get the given segment of the current GCS file."""
+    return self._get_range(self.downloader, self.download_stream, start, size)
+
+  @staticmethod
+  def _get_range(downloader, download_stream, start, size):
     if size == 0:
       return ''
     end = start + size - 1
-    self.downloader.GetRange(start, end)
-    value = self.download_stream.getvalue()
+    downloader.GetRange(start, end)
+    value = download_stream.getvalue()
     # Clear the StringIO object after we've read its contents.
-    self.download_stream.truncate(0)
+    download_stream.truncate(0)
     assert len(value) == size
     return value
 
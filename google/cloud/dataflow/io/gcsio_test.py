@@ -154,6 +154,11 @@ class TestGCSIO(unittest.TestCase):
     self.client = FakeGcsClient()
     self.gcs = gcsio.GcsIO(self.client)
 
+  def _new_client(self):
+    client = FakeGcsClient()
+    client.objects = self.client.objects
+    return client
+
   def test_full_file_read(self):
     file_name = 'gs://gcsio-test/full_file'
     file_size = 5 * 1024 * 1024 + 100
@@ -234,6 +239,115 @@ class TestGCSIO(unittest.TestCase):
       f.seek(start)
       self.assertEqual(f.readline(), lines[line_index][chars_left:])
 
+  def test_file_read_ahead(self):
+    file_name = 'gs://gcsio-test/read_ahead_file'
+    file_size = 10 * 1024 + 100
+    random_file = self._insert_random_file(self.client, file_name, file_size)
+    clients = []
+
+    def client_factory():
+      clients.append(FakeGcsClient())
+      clients[-1].objects = self.client.objects
+      return clients[-1]
+
+    f = gcsio.GcsBufferedReader(self.client, file_name, buffer_size=1024,
+                                read_ahead_segments=3,
+                                client_factory=client_factory)
+    chunks = []
+    while True:
+      chunk = f.read(777)
+      if not chunk:
+        break
+      chunks.append(chunk)
+      self.assertLessEqual(len(f.read_ahead), 3)
+    self.assertEqual(''.join(chunks), random_file.contents)
+    self.assertEqual(len(f.fetch_threads), 3)
+    self.assertEqual(len(clients), 3)
+
+    fetch_threads = f.fetch_threads
+    f.close()
+    for fetch_thread in fetch_threads:
+      fetch_thread.join(10)
+      self.assertFalse(fetch_thread.is_alive())
+
+  def test_file_read_ahead_read_line(self):
+    file_name = 'gs://gcsio-test/read_ahead_line_file'
+    lines = [os.urandom(random.randint(100, 500)).replace('\n', ' ') + '\n'
+             for _ in range(0, 100)]
+    bucket, name = gcsio.parse_gcs_path(file_name)
+    self.client.objects.add_file(FakeFile(bucket, name, ''.join(lines), 1))
+
+    gcs = gcsio.GcsIO(self.client, client_factory=self._new_client)
+    f = gcs.open(file_name, read_buffer_size=1024, read_ahead_segments=2)
+    for line in lines:
+      self.assertEqual(f.readline(), line)
+    self.assertEqual(f.readline(), '')
+    f.close()
+
+  def test_file_read_ahead_random_seek(self):
+    file_name = 'gs://gcsio-test/read_ahead_seek_file'
+    file_size = 100 * 1024 - 100
+    random_file = self._insert_random_file(self.client, file_name, file_size)
+
+    gcs = gcsio.GcsIO(self.client, client_factory=self._new_client)
+    f = gcs.open(file_name, read_buffer_size=1024, read_ahead_segments=4)
+    random.seed(0)
+    for _ in range(0, 10):
+      a = random.randint(0, file_size - 1)
+      b = random.randint(0, file_size - 1)
+      start, end = min(a, b), max(a, b)
+      f.seek(start)
+      self.assertEqual(f.read(end - start + 1),
+                       random_file.contents[start:end + 1])
+      self.assertEqual(f.tell(), end + 1)
+    f.close()
+
+  def test_file_read_ahead_needs_client_factory(self):
+    file_name = 'gs://gcsio-test/read_ahead_no_factory_file'
+    file_size = 4 * 1024
+    random_file = self._insert_random_file(self.client, file_name, file_size)
+
+    f = self.gcs.open(file_name, read_buffer_size=1024, read_ahead_segments=2)
+    self.assertEqual(f.read(), random_file.contents)
+    # The threads would otherwise share the storage client.
+    self.assertEqual(f.fetch_threads, [])
+    f.close()
+
+  def test_file_read_ahead_threads_stop_without_close(self):
+    file_name = 'gs://gcsio-test/read_ahead_unclosed_file'
+    file_size = 4 * 1024
+    random_file = self._insert_random_file(self.client, file_name, file_size)
+
+    f = gcsio.GcsBufferedReader(self.client, file_name, buffer_size=1024,
+                                read_ahead_segments=2,
+                                client_factory=self._new_client)
+    self.assertEqual(f.read(2048), random_file.contents[:2048])
+    fetch_threads = f.fetch_threads
+    self.assertEqual(len(fetch_threads), 2)
+    del f
+    for fetch_thread in fetch_threads:
+      fetch_thread.join(10)
+      self.assertFalse(fetch_thread.is_alive())
+
+  def test_file_read_ahead_error(self):
+    file_name = 'gs://gcsio-test/read_ahead_error_file'
+    file_size = 4 * 1024
+    random_file = self._insert_random_file(self.client, file_name, file_size)
+
+    def client_factory():
+      raise ValueError('No client.')
+
+    f = gcsio.GcsBufferedReader(self.client, file_name, buffer_size=1024,
+                                read_ahead_segments=2,
+                                client_factory=client_factory)
+    # The first segment is read synchronously.
+    self.assertEqual(f.read(1024), random_file.contents[:1024])
+    # The second one too, while the following ones are read ahead.
+    self.assertEqual(f.read(1024), random_file.contents[1024:2048])
+    with self.assertRaises(ValueError):
+      f.read(1024)
+    f.close()
+
   def test_file_write(self):
     file_name = 'gs://gcsio-test/write_file'
     file_size = 5 * 1024 * 1024 + 2000
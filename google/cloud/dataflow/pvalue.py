@@ -296,6 +296,16 @@ class ListPCollectionView(PCollectionView):
   pass
 
 
+class DictPCollectionView(PCollectionView):
+  """A PCollectionView that can be treated as a dict."""
+  pass
+
+
+class MultimapPCollectionView(PCollectionView):
+  """A PCollectionView that can be treated as a dict of lists."""
+  pass
+
+
 def _get_cached_view(pcoll, key):
   return pcoll.pipeline._view_cache.get(key, None)  # pylint: disable=protected-access
 
@@ -444,12 +454,15 @@ def AsList(pcoll, label=None):  # pylint: disable=invalid-name
 
 @can_take_label_as_first_argument
 def AsDict(pcoll, label=None):  # pylint: disable=invalid-name
-  """Convenience function packaging an entire PCollection as a side input dict.
+  """Create a DictPCollectionView from the key-value pairs of input PCollection.
+
+  The contents of the given PCollection will be available as a dict-like object
+  in PTransforms that use the returned PCollectionView as a side input.  If
+  several values are associated with the same key, only one of them will be
+  present in the dict.
 
-  Intended for use in side-argument specification---the same places where
-  AsSingleton and AsIter are used. Unlike those wrapper classes, AsDict (as
-  implemented) is a function that schedules a Combiner to condense pcoll into a
-  single dict, then wraps the resulting one-element PCollection in AsSingleton.
+  Workers look the keys up on demand, so the dict need not fit in the memory
+  of any single worker.
 
   Args:
     pcoll: Input pcollection. All elements should be key-value pairs (i.e.
@@ -457,10 +470,9 @@ def AsDict(pcoll, label=None):  # pylint: disable=invalid-name
     label: Label to be specified if several AsDict's for the same PCollection.
 
   Returns:
-    A singleton PCollectionView containing the dict as above.
+    A dict PCollectionView containing the pairs as above.
   """
   label = label or _format_view_label(pcoll)
-  combine_label = 'CombineToDict(%s)' % label
 
   # Don't recreate the view if it was already created.
   cache_key = (pcoll, AsDict)
@@ -471,8 +483,45 @@ def AsDict(pcoll, label=None):  # pylint: disable=invalid-name
   # Local import is required due to dependency loop; even though the
   # implementation of this function requires concepts defined in modules that
   # depend on pvalue, it lives in this module to reduce user workload.
-  from google.cloud.dataflow.transforms import combiners  # pylint: disable=g-import-not-at-top
-  view = AsSingleton(label, pcoll | combiners.ToDict(combine_label))
+  from google.cloud.dataflow.transforms import sideinputs  # pylint: disable=g-import-not-at-top
+  view = (pcoll | sideinputs.ViewAsDict(label=label))
+  _cache_view(pcoll, cache_key, view)
+  return view
+
+
+@can_take_label_as_first_argument
+def AsMultimap(pcoll, label=None):  # pylint: disable=invalid-name
+  """Create a MultimapPCollectionView from the pairs of input PCollection.
+
+  The contents of the given PCollection will be available as a dict-like object
+  mapping each key to the list of all the values associated with it, in
+  PTransforms that use the returned PCollectionView as a side input.
+
+  Workers look the keys up on demand, so the multimap need not fit in the
+  memory of any single worker.
+
+  Args:
+    pcoll: Input pcollection. All elements should be key-value pairs (i.e.
+       2-tuples).
+    label: Label to be specified if several AsMultimap's for the same
+      PCollection.
+
+  Returns:
+    A multimap PCollectionView containing the pairs as above.
+  """
+  label = label or _format_view_label(pcoll)
+
+  # Don't recreate the view if it was already created.
+  cache_key = (pcoll, AsMultimap)
+  cached_view = _get_cached_view(pcoll, cache_key)
+  if cached_view:
+    return cached_view
+
+  # Local import is required due to dependency loop; even though the
+  # implementation of this function requires concepts defined in modules that
+  # depend on pvalue, it lives in this module to reduce user workload.
+  from google.cloud.dataflow.transforms import sideinputs  # pylint: disable=g-import-not-at-top
+  view = (pcoll | sideinputs.ViewAsMultimap(label=label))
   _cache_view(pcoll, cache_key, view)
   return view
 
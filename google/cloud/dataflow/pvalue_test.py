@@ -20,6 +20,7 @@ from google.cloud.dataflow.pipeline import Pipeline
 from google.cloud.dataflow.pvalue import AsDict
 from google.cloud.dataflow.pvalue import AsIter
 from google.cloud.dataflow.pvalue import AsList
+from google.cloud.dataflow.pvalue import AsMultimap
 from google.cloud.dataflow.pvalue import AsSingleton
 from google.cloud.dataflow.pvalue import PValue
 from google.cloud.dataflow.transforms import Create
@@ -52,6 +53,8 @@ class PValueTest(unittest.TestCase):
     self.assertEqual(AsIter(value), AsIter(value))
     self.assertEqual(AsList(value), AsList(value))
     self.assertEqual(AsDict(value2), AsDict(value2))
+    self.assertEqual(AsMultimap(value2), AsMultimap(value2))
+    self.assertNotEqual(AsDict(value2), AsMultimap(value2))
 
 
 if __name__ == '__main__':
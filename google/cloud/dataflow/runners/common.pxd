@@ -25,4 +25,10 @@ cdef class DoFnRunner(object):
 
   cdef object main_receivers
 
+  cdef long batch_size
+  cdef list batch
+  cdef object batch_prototype
+
+  cpdef _add_to_batch(self, element)
+  cpdef _flush_batch(self)
   cpdef _process_outputs(self, element, results)
@@ -62,6 +62,14 @@ class DoFnRunner(object):
         def process(self, context):
           return fn.process(context, *args, **kwargs)
 
+        def process_batch(self, context, elements):
+          return fn.process_batch(context, elements, *args, **kwargs)
+
+        def supports_process_batch(self):
+          return fn.supports_process_batch()
+
+        max_batch_size = fn.max_batch_size
+
         def finish_bundle(self, context):
           return fn.finish_bundle(context, *args, **kwargs)
       self.dofn = CurriedFn()
@@ -74,6 +82,13 @@ class DoFnRunner(object):
     # Optimize for the common case.
     self.main_receivers = tagged_receivers[None]
 
+    # Consecutive elements sharing a timestamp and windows are buffered and
+    # handed to process_batch together, if the DoFn supports it.
+    self.batch_size = (
+        self.dofn.max_batch_size if self.dofn.supports_process_batch() else 0)
+    self.batch = []
+    self.batch_prototype = None
+
   def start(self):
     self.context.set_element(None)
     try:
@@ -82,6 +97,7 @@ class DoFnRunner(object):
       self.reraise_augmented(exn)
 
   def finish(self):
+    self._flush_batch()
     self.context.set_element(None)
     try:
       self._process_outputs(None, self.dofn.finish_bundle(self.context))
@@ -89,6 +105,9 @@ class DoFnRunner(object):
       self.reraise_augmented(exn)
 
   def process(self, element):
+    if self.batch_size:
+      self._add_to_batch(element)
+      return
     try:
       with self.logger.PerThreadLoggingContext(step_name=self.step_name):
         self.context.set_element(element)
@@ -96,6 +115,31 @@ class DoFnRunner(object):
     except BaseException as exn:
       self.reraise_augmented(exn)
 
+  def _add_to_batch(self, element):
+    prototype = self.batch_prototype
+    if prototype is None:
+      self.batch_prototype = element
+    elif (element.timestamp != prototype.timestamp
+          or element.windows != prototype.windows):
+      self._flush_batch()
+      self.batch_prototype = element
+    self.batch.append(element.value)
+    if len(self.batch) >= self.batch_size:
+      self._flush_batch()
+
+  def _flush_batch(self):
+    if not self.batch:
+      return
+    batch, prototype = self.batch, self.batch_prototype
+    self.batch, self.batch_prototype = [], None
+    try:
+      with self.logger.PerThreadLoggingContext(step_name=self.step_name):
+        self.context.set_batch(prototype)
+        self._process_outputs(
+            prototype, self.dofn.process_batch(self.context, batch))
+    except BaseException as exn:
+      self.reraise_augmented(exn)
+
   def reraise_augmented(self, exn):
     if getattr(exn, '_tagged_with_step', False) or not self.step_name:
       raise
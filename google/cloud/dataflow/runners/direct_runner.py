@@ -27,9 +27,11 @@ import logging
 
 from google.cloud.dataflow import coders
 from google.cloud.dataflow import error
+from google.cloud.dataflow.pvalue import DictPCollectionView
 from google.cloud.dataflow.pvalue import EmptySideInput
 from google.cloud.dataflow.pvalue import IterablePCollectionView
 from google.cloud.dataflow.pvalue import ListPCollectionView
+from google.cloud.dataflow.pvalue import MultimapPCollectionView
 from google.cloud.dataflow.pvalue import SingletonPCollectionView
 from google.cloud.dataflow.runners.common import DoFnRunner
 from google.cloud.dataflow.runners.common import DoFnState
@@ -118,6 +120,14 @@ class DirectPipelineRunner(PipelineRunner):
       result = [v.value for v in values]
     elif isinstance(view, ListPCollectionView):
       result = [v.value for v in values]
+    elif isinstance(view, DictPCollectionView):
+      result = dict(v.value for v in values)
+    elif isinstance(view, MultimapPCollectionView):
+      result = collections.defaultdict(list)
+      for v in values:
+        key, value = v.value
+        result[key].append(value)
+      result = dict(result)
     else:
       raise NotImplementedError
 
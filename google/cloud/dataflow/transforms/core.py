@@ -56,7 +56,8 @@ class DoFnProcessContext(object):
   Attributes:
     label: label of the ParDo whose element is being processed.
     element: element being processed
-      (in process method only; always None in start_bundle and finish_bundle)
+      (in process method only; always None in start_bundle, finish_bundle
+      and process_batch)
     timestamp: timestamp of the element
       (in process method only; always None in start_bundle and finish_bundle)
     windows: windows of the element
@@ -97,6 +98,15 @@ class DoFnProcessContext(object):
       self.timestamp = windowed_value.timestamp
       self.windows = windowed_value.windows
 
+  def set_batch(self, windowed_value):
+    """Sets the timestamp and windows shared by a batch of elements.
+
+    There is no single element being processed by process_batch, so the
+    element is None.
+    """
+    self.set_element(windowed_value)
+    self.element = None
+
   def aggregate_to(self, aggregator, input_value):
     """Provide a new input value for the aggregator.
 
@@ -165,6 +175,34 @@ class DoFn(WithTypeHints):
     """
     raise NotImplementedError
 
+  # Upper bound on the number of elements passed to a single process_batch
+  # call.
+  max_batch_size = 1000
+
+  def process_batch(self, context, elements, *args, **kwargs):
+    """Optionally called, instead of process, for a run of elements.
+
+    A DoFn whose per-element work is cheap may override this method to
+    amortize the per-call framework overhead over many elements.  The runner
+    groups consecutive elements that share the same timestamp and windows
+    (at most max_batch_size of them) and passes their values as a list.
+    Results are handled exactly as those returned from process, with each
+    plain output value assigned the shared timestamp and windows of the batch.
+
+    Args:
+      context: a DoFnProcessContext object whose timestamp and windows are
+        those shared by all the elements in the batch, and whose element is
+        None.
+      elements: a list of element values to be processed.
+      *args: side inputs
+      **kwargs: keyword side inputs
+    """
+    raise NotImplementedError
+
+  def supports_process_batch(self):
+    """Returns whether process_batch has been overridden for this DoFn."""
+    return self.process_batch.im_func is not DoFn.process_batch.im_func
+
   @staticmethod
   def from_callable(fn):
     return CallableWrapperDoFn(fn)
@@ -25,6 +25,7 @@ import google.cloud.dataflow as df
 from google.cloud.dataflow.pipeline import Pipeline
 import google.cloud.dataflow.pvalue as pvalue
 import google.cloud.dataflow.transforms.combiners as combine
+from google.cloud.dataflow.transforms import window
 from google.cloud.dataflow.transforms.ptransform import PTransform
 from google.cloud.dataflow.transforms.util import assert_that, equal_to
 import google.cloud.dataflow.typehints as typehints
@@ -112,6 +113,38 @@ class PTransformTest(unittest.TestCase):
     assert_that(result, equal_to([11, 12, 13]))
     pipeline.run()
 
+  def test_do_with_process_batch(self):
+    class SumBatchDoFn(df.DoFn):
+      max_batch_size = 3
+
+      def process(self, context, addon):
+        raise AssertionError('process_batch should be used instead.')
+
+      def process_batch(self, context, elements, addon):
+        return [sum(elements) + addon]
+
+    pipeline = Pipeline('DirectPipelineRunner')
+    pcoll = pipeline | df.Create('start', [1, 2, 3, 4, 5, 6, 7])
+    result = pcoll | df.ParDo('do', SumBatchDoFn(), 100)
+    assert_that(result, equal_to([106, 115, 107]))
+    pipeline.run()
+
+  def test_do_with_process_batch_splits_on_windows(self):
+    class CountBatchDoFn(df.DoFn):
+
+      def process_batch(self, context, elements):
+        assert context.element is None
+        return [(context.windows[0].start, len(elements))]
+
+    pipeline = Pipeline('DirectPipelineRunner')
+    result = (pipeline
+              | df.Create('start', [1, 2, 3, 6, 7, 11])
+              | df.Map(lambda t: window.TimestampedValue(t, t - t % 5))
+              | df.WindowInto('w', window.FixedWindows(5))
+              | df.ParDo('do', CountBatchDoFn()))
+    assert_that(result, equal_to([(0, 3), (5, 2), (10, 1)]))
+    pipeline.run()
+
   def test_do_with_unconstructed_do_fn(self):
     class MyDoFn(df.DoFn):
 
@@ -16,7 +16,8 @@
 
 Important: this module is an implementation detail and should not be used
 directly by pipeline writers. Instead, users should use the helper methods
-AsSingleton, AsIter, AsList and AsDict in google.cloud.dataflow.pvalue.
+AsSingleton, AsIter, AsList, AsDict and AsMultimap in
+google.cloud.dataflow.pvalue.
 """
 
 from __future__ import absolute_import
@@ -24,6 +25,7 @@ from __future__ import absolute_import
 from google.cloud.dataflow import pvalue
 from google.cloud.dataflow import typehints
 from google.cloud.dataflow.transforms.ptransform import PTransform
+from google.cloud.dataflow.typehints import trivial_inference
 
 
 class CreatePCollectionView(PTransform):
@@ -115,3 +117,50 @@ class ViewAsList(PTransform):
             | CreatePCollectionView(pvalue.ListPCollectionView(pcoll.pipeline))
             .with_input_types(input_type)
             .with_output_types(output_type))
+
+
+class ViewAsDict(PTransform):
+  """Transform to view PCollection as a dict PCollectionView.
+
+  Important: this transform is an implementation detail and should not be used
+  directly by pipeline writers. Use pvalue.AsDict(...) instead.
+  """
+
+  def __init__(self, label=None):
+    if label:
+      label = 'ViewAsDict(%s)' % label
+    super(ViewAsDict, self).__init__(label=label)
+
+  def apply(self, pcoll):
+    self._check_pcollection(pcoll)
+    input_type = pcoll.element_type
+    key_type, value_type = trivial_inference.key_value_types(input_type)
+    output_type = typehints.Dict[key_type, value_type]
+    return (pcoll
+            | CreatePCollectionView(pvalue.DictPCollectionView(pcoll.pipeline))
+            .with_input_types(input_type)
+            .with_output_types(output_type))
+
+
+class ViewAsMultimap(PTransform):
+  """Transform to view PCollection as a multimap PCollectionView.
+
+  Important: this transform is an implementation detail and should not be used
+  directly by pipeline writers. Use pvalue.AsMultimap(...) instead.
+  """
+
+  def __init__(self, label=None):
+    if label:
+      label = 'ViewAsMultimap(%s)' % label
+    super(ViewAsMultimap, self).__init__(label=label)
+
+  def apply(self, pcoll):
+    self._check_pcollection(pcoll)
+    input_type = pcoll.element_type
+    key_type, value_type = trivial_inference.key_value_types(input_type)
+    output_type = typehints.Dict[key_type, typehints.List[value_type]]
+    return (pcoll
+            | CreatePCollectionView(
+                pvalue.MultimapPCollectionView(pcoll.pipeline))
+            .with_input_types(input_type)
+            .with_output_types(output_type))
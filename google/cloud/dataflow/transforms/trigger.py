@@ -28,6 +28,7 @@ from google.cloud.dataflow.transforms import core
 from google.cloud.dataflow.transforms.timeutil import MAX_TIMESTAMP
 from google.cloud.dataflow.transforms.timeutil import MIN_TIMESTAMP
 from google.cloud.dataflow.transforms.timeutil import TimeDomain
+from google.cloud.dataflow.transforms.timeutil import Timestamp
 from google.cloud.dataflow.transforms.window import GlobalWindow
 from google.cloud.dataflow.transforms.window import OutputTimeFn
 from google.cloud.dataflow.transforms.window import WindowedValue
@@ -180,6 +181,13 @@ class TriggerFn(object):
   def reset(self, window, context):
     """Clear any state and timers used by this TriggerFn."""
     pass
+
+  def state_tags(self):
+    """Returns the state tags read by this TriggerFn, so they can be prefetched.
+
+    Tags read through a NestedContext must be returned with its prefix.
+    """
+    return ()
 # pylint: enable=unused-argument
 
 
@@ -294,6 +302,14 @@ class AfterWatermark(TriggerFn):
     if self.late:
       self.late.reset(window, NestedContext(context, 'late'))
 
+  def state_tags(self):
+    tags = [self.LATE_TAG]
+    if self.early:
+      tags.extend(tag.with_prefix('early') for tag in self.early.state_tags())
+    if self.late:
+      tags.extend(tag.with_prefix('late') for tag in self.late.state_tags())
+    return tags
+
   def __eq__(self, other):
     return (type(self) == type(other)
             and self.early == other.early
@@ -330,6 +346,9 @@ class AfterCount(TriggerFn):
   def reset(self, window, context):
     context.clear_state(self.COUNT_TAG)
 
+  def state_tags(self):
+    return (self.COUNT_TAG,)
+
 
 class Repeatedly(TriggerFn):
   """Repeatedly invoke the given trigger, never finishing."""
@@ -357,6 +376,9 @@ class Repeatedly(TriggerFn):
   def reset(self, window, context):
     self.underlying.reset(window, context)
 
+  def state_tags(self):
+    return self.underlying.state_tags()
+
 
 class ParallelTriggerFn(TriggerFn):
 
@@ -399,6 +421,11 @@ class ParallelTriggerFn(TriggerFn):
     for ix, trigger in enumerate(self.triggers):
       trigger.reset(window, self._sub_context(context, ix))
 
+  def state_tags(self):
+    return [tag.with_prefix('%d/' % ix)
+            for ix, trigger in enumerate(self.triggers)
+            for tag in trigger.state_tags()]
+
   @staticmethod
   def _sub_context(context, index):
     return NestedContext(context, '%d/' % index)
@@ -467,6 +494,11 @@ class AfterEach(TriggerFn):
     for ix, trigger in enumerate(self.triggers):
       trigger.reset(window, self._sub_context(context, ix))
 
+  def state_tags(self):
+    return [self.INDEX_TAG] + [tag.with_prefix('%d/' % ix)
+                               for ix, trigger in enumerate(self.triggers)
+                               for tag in trigger.state_tags()]
+
   @staticmethod
   def _sub_context(context, index):
     return NestedContext(context, '%d/' % index)
@@ -559,6 +591,13 @@ class SimpleState(object):
   def at(self, window):
     return TriggerContext(self, window)
 
+  def prefetch_state(self, window_tag_pairs):
+    """Hints that the state of the given (window, tag) pairs will be read.
+
+    Backends with remote state may use this to fetch it all at once.
+    """
+    pass
+
 
 class UnmergedState(SimpleState):
   """State suitable for use in TriggerDriver.
@@ -570,22 +609,64 @@ class UnmergedState(SimpleState):
   def set_global_state(self, tag, value):
     pass
 
+  @abstractmethod
+  def add_global_state(self, tag, value):
+    pass
+
   @abstractmethod
   def get_global_state(self, tag, default=None):
     pass
+
+  @abstractmethod
+  def clear_global_state(self, tag):
+    pass
+
+  def prefetch_global_state(self, tags):
+    """Hints that the global state of the given tags will be read."""
+    pass
 # pylint: enable=unused-argument
 
 
 class MergeableStateAdapter(SimpleState):
-  """Wraps an UnmergedState, tracking merged windows."""
+  """Wraps an UnmergedState, tracking merged windows.
+
+  The ids of the windows are persisted in a global list state, as a log of
+  (window, ids) entries appended whenever the ids of a window change, ids
+  being None once the window is gone.  The latest entry of each window wins.
+  Once the log holds many more entries than there are windows, it is
+  rewritten with a single entry per window.
+  """
   # TODO(robertwb): A similar indirection could be used for sliding windows
   # or other window_fns when a single element typically belongs to many windows.
 
+  # Formerly held the whole map of windows to ids; only read to migrate it.
   WINDOW_IDS = ValueStateTag('window_ids')
+  WINDOW_ID_LOG = ListStateTag('window_id_log')
+
+  # The log is rewritten once it is longer than twice the number of windows
+  # plus this many entries.
+  LOG_SLACK = 16
 
   def __init__(self, raw_state):
     self.raw_state = raw_state
-    self.window_ids = self.raw_state.get_global_state(self.WINDOW_IDS, {})
+    self.raw_state.prefetch_global_state([self.WINDOW_IDS, self.WINDOW_ID_LOG])
+    self.window_ids = {}
+    self.log_length = 0
+    for window, ids in self.raw_state.get_global_state(self.WINDOW_ID_LOG, []):
+      self.log_length += 1
+      if ids is None:
+        self.window_ids.pop(window, None)
+      else:
+        self.window_ids[window] = list(ids)
+    legacy_window_ids = self.raw_state.get_global_state(self.WINDOW_IDS)
+    if legacy_window_ids:
+      self.window_ids.update(legacy_window_ids)
+      self.raw_state.clear_global_state(self.WINDOW_IDS)
+      self._rewrite_log()
+    # Maps each window id back to its window.
+    self.id_windows = dict((window_id, window)
+                           for window, ids in self.window_ids.iteritems()
+                           for window_id in ids)
     self.counter = None
 
   def set_timer(self, window, name, time_domain, timestamp):
@@ -628,8 +709,9 @@ class MergeableStateAdapter(SimpleState):
     for window_id in self._get_ids(window):
       self.raw_state.clear_state(window_id, tag)
     if tag is None:
-      del self.window_ids[window]
-      self._persist_window_ids()
+      for window_id in self.window_ids.pop(window):
+        del self.id_windows[window_id]
+      self._persist_window_ids(window)
 
   def merge(self, to_be_merged, merge_result):
     for window in to_be_merged:
@@ -639,17 +721,27 @@ class MergeableStateAdapter(SimpleState):
             merge_window_ids = self.window_ids[merge_result]
           else:
             merge_window_ids = self.window_ids[merge_result] = []
-          merge_window_ids.extend(self.window_ids.pop(window))
-          self._persist_window_ids()
+          window_ids = self.window_ids.pop(window)
+          merge_window_ids.extend(window_ids)
+          for window_id in window_ids:
+            self.id_windows[window_id] = merge_result
+          self._persist_window_ids(window)
+          self._persist_window_ids(merge_result)
 
   def known_windows(self):
     return self.window_ids.keys()
 
+  def prefetch_state(self, window_tag_pairs):
+    self.raw_state.prefetch_state(
+        [(window_id, tag)
+         for window, tag in window_tag_pairs
+         for window_id in self._get_ids(window)])
+
   def get_window(self, window_id):
-    for window, ids in self.window_ids.items():
-      if window_id in ids:
-        return window
-    raise ValueError('No window for %s' % window_id)
+    try:
+      return self.id_windows[window_id]
+    except KeyError:
+      raise ValueError('No window for %s' % window_id)
 
   def _get_id(self, window):
     if window in self.window_ids:
@@ -657,7 +749,8 @@ class MergeableStateAdapter(SimpleState):
     else:
       window_id = self._get_next_counter()
       self.window_ids[window] = [window_id]
-      self._persist_window_ids()
+      self.id_windows[window_id] = window
+      self._persist_window_ids(window)
       return window_id
 
   def _get_ids(self, window):
@@ -667,12 +760,24 @@ class MergeableStateAdapter(SimpleState):
     if not self.window_ids:
       self.counter = 0
     elif self.counter is None:
-      self.counter = max(k for ids in self.window_ids.values() for k in ids)
+      self.counter = max(self.id_windows)
     self.counter += 1
     return self.counter
 
-  def _persist_window_ids(self):
-    self.raw_state.set_global_state(self.WINDOW_IDS, self.window_ids)
+  def _persist_window_ids(self, window):
+    """Appends the current ids of the given window to the log."""
+    ids = self.window_ids.get(window)
+    self.raw_state.add_global_state(
+        self.WINDOW_ID_LOG, (window, None if ids is None else tuple(ids)))
+    self.log_length += 1
+    if self.log_length > 2 * len(self.window_ids) + self.LOG_SLACK:
+      self._rewrite_log()
+
+  def _rewrite_log(self):
+    self.raw_state.clear_global_state(self.WINDOW_ID_LOG)
+    for window, ids in self.window_ids.iteritems():
+      self.raw_state.add_global_state(self.WINDOW_ID_LOG, (window, tuple(ids)))
+    self.log_length = len(self.window_ids)
 
   def __repr__(self):
     return '\n\t'.join([repr(self.window_ids)] +
@@ -687,7 +792,9 @@ def create_trigger_driver(windowing, is_batch=False, phased_combine_fn=None):
   if windowing.is_default() and is_batch:
     driver = DefaultGlobalBatchTriggerDriver()
   else:
-    driver = GeneralTriggerDriver(windowing)
+    # Batch state is kept in memory, keyed by window objects; Windmill state
+    # is namespaced by integer window ids.
+    driver = GeneralTriggerDriver(windowing, per_window_state=is_batch)
 
   if phased_combine_fn:
     # TODO(ccy): Refactor GeneralTriggerDriver to combine values eagerly using
@@ -709,6 +816,10 @@ class TriggerDriver(object):
   def process_timer(self, window_id, name, time_domain, timestamp, state):
     pass
 
+  def prefetch_timers(self, window_ids, state):
+    """Hints that process_timer will be called for the given window ids."""
+    pass
+
 
 class DefaultGlobalBatchTriggerDriver(TriggerDriver):
   """Breaks a bundles into window (pane)s according to the default triggering.
@@ -756,16 +867,24 @@ class CombiningTriggerDriver(TriggerDriver):
     for output in uncombined:
       yield output.with_value(self.phased_combine_fn.apply(output.value))
 
+  def prefetch_timers(self, window_ids, state):
+    self.underlying.prefetch_timers(window_ids, state)
+
 
 class GeneralTriggerDriver(TriggerDriver):
   """Breaks a series of bundle and timer firings into window (pane)s.
 
   Suitable for all variants of Windowing.
+
+  State is normally kept through a MergeableStateAdapter, which maps each
+  window to integer window ids.  If per_window_state is set, the state backend
+  may instead be keyed by the windows themselves, which is done whenever the
+  window fn never merges windows.
   """
   ELEMENTS = ListStateTag('elements')
   TOMBSTONE = CombiningValueStateTag('tombstone', combiners.CountCombineFn())
 
-  def __init__(self, windowing):
+  def __init__(self, windowing, per_window_state=False):
     self.window_fn = windowing.windowfn
     self.output_time_fn_impl = OutputTimeFn.get_impl(windowing.output_time_fn,
                                                      self.window_fn)
@@ -775,11 +894,12 @@ class GeneralTriggerDriver(TriggerDriver):
     # pylint: enable=invalid-name
     self.trigger_fn = windowing.triggerfn
     self.accumulation_mode = windowing.accumulation_mode
-    self.is_merging = True
+    self.is_merging = not per_window_state or self.window_fn.is_merging()
+    self._mergeable_state = None
 
   def process_elements(self, state, windowed_values, output_watermark):
     if self.is_merging:
-      state = MergeableStateAdapter(state)
+      state = self._get_mergeable_state(state)
 
     windows_to_elements = collections.defaultdict(list)
     for wv in windowed_values:
@@ -817,6 +937,9 @@ class GeneralTriggerDriver(TriggerDriver):
           state.clear_state(window, self.WATERMARK_HOLD)
 
     # Next handle element adding.
+    state.prefetch_state([(window, tag)
+                          for window in windows_to_elements
+                          for tag in (self.TOMBSTONE, self.WATERMARK_HOLD)])
     for window, elements in windows_to_elements.items():
       if state.get_state(window, self.TOMBSTONE):
         continue
@@ -845,8 +968,9 @@ class GeneralTriggerDriver(TriggerDriver):
   def process_timer(self, window_id, unused_name, time_domain, timestamp,
                     state):
     if self.is_merging:
-      state = MergeableStateAdapter(state)
+      state = self._get_mergeable_state(state)
     window = state.get_window(window_id)
+    state.prefetch_state([(window, tag) for tag in self._firing_tags()])
     if state.get_state(window, self.TOMBSTONE):
       return
     if time_domain == TimeDomain.WATERMARK:
@@ -858,6 +982,39 @@ class GeneralTriggerDriver(TriggerDriver):
     else:
       raise Exception('Unexpected time domain: %s' % time_domain)
 
+  def prefetch_timers(self, window_ids, state):
+    if self.is_merging:
+      state = self._get_mergeable_state(state)
+    windows = set()
+    for window_id in window_ids:
+      try:
+        windows.add(state.get_window(window_id))
+      except ValueError:
+        # Timers for windows that no longer exist are ignored when fired.
+        pass
+    state.prefetch_state([(window, tag)
+                          for window in windows
+                          for tag in self._firing_tags()])
+
+  def _get_mergeable_state(self, raw_state):
+    """Returns the MergeableStateAdapter wrapping the given state.
+
+    The adapter is reused as long as the same state is passed in, so that the
+    window ids are only loaded once.
+    """
+    if (self._mergeable_state is None
+        or self._mergeable_state.raw_state is not raw_state):
+      self._mergeable_state = MergeableStateAdapter(raw_state)
+    return self._mergeable_state
+
+  def _firing_tags(self):
+    """The state tags read to decide whether a window fires on a timer.
+
+    The elements of a window are only read once it is known to fire.
+    """
+    return ((self.TOMBSTONE, self.WATERMARK_HOLD)
+            + tuple(self.trigger_fn.state_tags()))
+
   def _output(self, window, finished, state):
     """Output window and clean up if appropriate."""
 
@@ -879,13 +1036,41 @@ class GeneralTriggerDriver(TriggerDriver):
     return WindowedValue(values, timestamp, (window,))
 
 
+# Types whose instances are never mutated, and hence need not be copied.
+_IMMUTABLE_TYPES = frozenset([
+    type(None), bool, int, long, float, complex, str, unicode, Timestamp])
+
+
+def _is_immutable(value):
+  """Returns whether the value is built only of immutable objects."""
+  value_type = type(value)
+  if value_type in _IMMUTABLE_TYPES:
+    return True
+  elif value_type is tuple or value_type is frozenset:
+    return all(_is_immutable(v) for v in value)
+  return False
+
+
+def _defensive_copy(value):
+  """Returns a deep copy of the value, or the value itself if immutable."""
+  if _is_immutable(value):
+    return value
+  return copy.deepcopy(value)
+
+
 class InMemoryUnmergedState(UnmergedState):
   """In-memory implementation of UnmergedState.
 
   Used for batch and testing.
+
+  Unless defensive_copy is False, values are copied as they are added, so that
+  later mutations by the caller do not alter the stored state.  Values built
+  only of immutable objects (numbers, strings, timestamps and tuples of them)
+  are shared rather than copied.  Callers handing over values they do not
+  otherwise reference, such as values freshly decoded from shuffle, should
+  pass defensive_copy=False to skip copying altogether.
   """
   def __init__(self, defensive_copy=True):
-    # TODO(robertwb): Skip defensive_copy in production if it's too expensive.
     self.timers = collections.defaultdict(dict)
     self.state = collections.defaultdict(lambda: collections.defaultdict(list))
     self.global_state = {}
@@ -894,12 +1079,21 @@ class InMemoryUnmergedState(UnmergedState):
   def set_global_state(self, tag, value):
     assert isinstance(tag, ValueStateTag)
     if self.defensive_copy:
-      value = copy.deepcopy(value)
+      value = _defensive_copy(value)
     self.global_state[tag.tag] = value
 
+  def add_global_state(self, tag, value):
+    assert isinstance(tag, ListStateTag)
+    if self.defensive_copy:
+      value = _defensive_copy(value)
+    self.global_state.setdefault(tag.tag, []).append(value)
+
   def get_global_state(self, tag, default=None):
     return self.global_state.get(tag.tag, default)
 
+  def clear_global_state(self, tag):
+    self.global_state.pop(tag.tag, None)
+
   def set_timer(self, window, name, time_domain, timestamp):
     self.timers[window][(name, time_domain)] = timestamp
 
@@ -911,11 +1105,18 @@ class InMemoryUnmergedState(UnmergedState):
 
   def add_state(self, window, tag, value):
     if self.defensive_copy:
-      value = copy.deepcopy(value)
+      value = _defensive_copy(value)
     if isinstance(tag, ValueStateTag):
       self.state[window][tag.tag] = value
     elif isinstance(tag, CombiningValueStateTag):
-      self.state[window][tag.tag].append(value)
+      # Values are folded into an accumulator as they are added, so that
+      # reading the state does not recombine every value added so far.
+      window_state = self.state[window]
+      if tag.tag in window_state:
+        accumulator = window_state[tag.tag]
+      else:
+        accumulator = tag.combine_fn.create_accumulator()
+      window_state[tag.tag] = tag.combine_fn.add_inputs(accumulator, [value])
     elif isinstance(tag, ListStateTag):
       self.state[window][tag.tag].append(value)
     elif isinstance(tag, WatermarkHoldStateTag):
@@ -924,11 +1125,16 @@ class InMemoryUnmergedState(UnmergedState):
       raise ValueError('Invalid tag.', tag)
 
   def get_state(self, window, tag):
+    if isinstance(tag, CombiningValueStateTag):
+      window_state = self.state[window]
+      if tag.tag in window_state:
+        accumulator = window_state[tag.tag]
+      else:
+        accumulator = tag.combine_fn.create_accumulator()
+      return tag.combine_fn.extract_output(accumulator)
     values = self.state[window][tag.tag]
     if isinstance(tag, ValueStateTag):
       return values
-    elif isinstance(tag, CombiningValueStateTag):
-      return tag.combine_fn.apply(values)
     elif isinstance(tag, ListStateTag):
       return values
     elif isinstance(tag, WatermarkHoldStateTag):
@@ -0,0 +1,73 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A microbenchmark of count-based triggers over large windows.
+
+Feeds all the elements of a single fixed window, one element per bundle,
+through a GeneralTriggerDriver backed by InMemoryUnmergedState and reports
+the per-element cost for growing window sizes.  The cost should stay flat
+as the window grows, as the trigger state is read on every element.
+
+Run as:
+  python -m google.cloud.dataflow.transforms.trigger_benchmark
+"""
+
+from __future__ import absolute_import
+
+import logging
+import sys
+import time
+
+from google.cloud.dataflow.transforms.core import Windowing
+from google.cloud.dataflow.transforms.trigger import AccumulationMode
+from google.cloud.dataflow.transforms.trigger import AfterCount
+from google.cloud.dataflow.transforms.trigger import GeneralTriggerDriver
+from google.cloud.dataflow.transforms.trigger import InMemoryUnmergedState
+from google.cloud.dataflow.transforms.trigger import Repeatedly
+from google.cloud.dataflow.transforms.window import FixedWindows
+from google.cloud.dataflow.transforms.window import IntervalWindow
+from google.cloud.dataflow.transforms.window import MIN_TIMESTAMP
+from google.cloud.dataflow.transforms.window import WindowedValue
+
+
+def run_trigger(trigger_fn, num_elements):
+  driver = GeneralTriggerDriver(
+      Windowing(FixedWindows(10), trigger_fn, AccumulationMode.DISCARDING))
+  state = InMemoryUnmergedState()
+  window = IntervalWindow(0, 10)
+  bundles = [[WindowedValue(n, 1, [window])] for n in xrange(num_elements)]
+  start = time.time()
+  for bundle in bundles:
+    for _ in driver.process_elements(state, bundle, MIN_TIMESTAMP):
+      pass
+  return time.time() - start
+
+
+def run_benchmark(window_sizes=(1000, 10000, 100000), num_runs=3):
+  triggers = [
+      ('AfterCount', AfterCount(10 ** 9)),
+      ('Repeatedly', Repeatedly(AfterCount(1000))),
+  ]
+  for name, trigger_fn in triggers:
+    for num_elements in window_sizes:
+      best = min(run_trigger(trigger_fn, num_elements)
+                 for _ in range(num_runs))
+      print '%-10s %8d elements %8.3f s %8.3f us/element' % (
+          name, num_elements, best, 1e6 * best / num_elements)
+      sys.stdout.flush()
+
+
+if __name__ == '__main__':
+  logging.getLogger().setLevel(logging.INFO)
+  run_benchmark()
@@ -23,15 +23,19 @@ import yaml
 import google.cloud.dataflow as df
 from google.cloud.dataflow.pipeline import Pipeline
 from google.cloud.dataflow.transforms.core import Windowing
+from google.cloud.dataflow.transforms.timeutil import TimeDomain
 from google.cloud.dataflow.transforms.trigger import AccumulationMode
 from google.cloud.dataflow.transforms.trigger import AfterAll
 from google.cloud.dataflow.transforms.trigger import AfterCount
 from google.cloud.dataflow.transforms.trigger import AfterEach
 from google.cloud.dataflow.transforms.trigger import AfterFirst
 from google.cloud.dataflow.transforms.trigger import AfterWatermark
+from google.cloud.dataflow.transforms.trigger import CombiningValueStateTag
 from google.cloud.dataflow.transforms.trigger import DefaultTrigger
 from google.cloud.dataflow.transforms.trigger import GeneralTriggerDriver
 from google.cloud.dataflow.transforms.trigger import InMemoryUnmergedState
+from google.cloud.dataflow.transforms.trigger import ListStateTag
+from google.cloud.dataflow.transforms.trigger import MergeableStateAdapter
 from google.cloud.dataflow.transforms.trigger import Repeatedly
 from google.cloud.dataflow.transforms.util import assert_that, equal_to
 from google.cloud.dataflow.transforms.window import FixedWindows
@@ -89,9 +93,20 @@ class TriggerTest(unittest.TestCase):
   def run_trigger(self, window_fn, trigger_fn, accumulation_mode,
                   bundles, late_bundles,
                   expected_panes):
+    bundles, late_bundles = list(bundles), list(late_bundles)
+    for per_window_state in (False, True):
+      self._run_trigger(window_fn, trigger_fn, accumulation_mode,
+                        bundles, late_bundles, expected_panes,
+                        per_window_state)
+
+  def _run_trigger(self, window_fn, trigger_fn, accumulation_mode,
+                   bundles, late_bundles, expected_panes, per_window_state):
     actual_panes = collections.defaultdict(list)
     driver = GeneralTriggerDriver(
-        Windowing(window_fn, trigger_fn, accumulation_mode))
+        Windowing(window_fn, trigger_fn, accumulation_mode),
+        per_window_state=per_window_state)
+    self.assertEqual(window_fn.is_merging() or not per_window_state,
+                     driver.is_merging)
     state = InMemoryUnmergedState()
 
     for bundle in bundles:
@@ -361,6 +376,54 @@ class TriggerTest(unittest.TestCase):
          IntervalWindow(0, 17): [set('abcdefgh')]},
         2)
 
+  def test_state_tags(self):
+    trigger_fn = AfterWatermark(
+        early=AfterCount(2),
+        late=AfterEach(AfterCount(1), AfterFirst(AfterCount(3),
+                                                 DefaultTrigger())))
+    self.assertEqual(
+        ['earlycount', 'is_late', 'late0/count', 'late1/0/count', 'lateindex'],
+        sorted(tag.tag for tag in trigger_fn.state_tags()))
+
+  def test_timers_read_elements_of_firing_windows_only(self):
+
+    class RecordingState(InMemoryUnmergedState):
+
+      def __init__(self):
+        super(RecordingState, self).__init__()
+        self.prefetched = set()
+        self.read = set()
+
+      def prefetch_state(self, window_tag_pairs):
+        self.prefetched.update((w, tag.tag) for w, tag in window_tag_pairs)
+
+      def get_state(self, window, tag):
+        self.read.add((window, tag.tag))
+        return super(RecordingState, self).get_state(window, tag)
+
+    driver = GeneralTriggerDriver(
+        Windowing(FixedWindows(10), AfterWatermark(early=AfterCount(5)),
+                  AccumulationMode.DISCARDING),
+        per_window_state=True)
+    state = RecordingState()
+    windows = IntervalWindow(0, 10), IntervalWindow(10, 20)
+    list(driver.process_elements(
+        state, [WindowedValue(t, t, (windows[t // 10],)) for t in (1, 11)],
+        MIN_TIMESTAMP))
+    driver.prefetch_timers(windows, state)
+    fired = list(driver.process_timer(
+        windows[0], '', TimeDomain.WATERMARK, windows[0].end, state))
+    fired += list(driver.process_timer(
+        windows[1], '', TimeDomain.WATERMARK, windows[0].end, state))
+
+    self.assertEqual([[1]], [list(wvalue.value) for wvalue in fired])
+    self.assertEqual(
+        set((w, tag) for w in windows
+            for tag in ('tombstone', 'watermark', 'is_late', 'earlycount')),
+        state.prefetched)
+    self.assertIn((windows[0], 'elements'), state.read)
+    self.assertNotIn((windows[1], 'elements'), state.read)
+
 
 class TriggerPipelineTest(unittest.TestCase):
 
@@ -383,6 +446,81 @@ class TriggerPipelineTest(unittest.TestCase):
         }.iteritems()))
 
 
+class InMemoryUnmergedStateTest(unittest.TestCase):
+
+  def test_defensive_copy(self):
+    tag = ListStateTag('values')
+    state = InMemoryUnmergedState()
+    mutable, immutable = ['a'], ('b', 1, (None, 2.0))
+    state.add_state('w', tag, mutable)
+    state.add_state('w', tag, immutable)
+    mutable.append('c')
+    stored = state.get_state('w', tag)
+    self.assertEqual([['a'], ('b', 1, (None, 2.0))], stored)
+    self.assertIsNot(mutable, stored[0])
+    self.assertIs(immutable, stored[1])
+
+  def test_combining_state(self):
+    tag = CombiningValueStateTag('sum', sum)
+    state = InMemoryUnmergedState()
+    self.assertEqual(0, state.get_state('w', tag))
+    for value in range(1, 5):
+      state.add_state('w', tag, value)
+      self.assertEqual(value * (value + 1) / 2, state.get_state('w', tag))
+    state.clear_state('w', tag)
+    self.assertEqual(0, state.get_state('w', tag))
+
+  def test_no_defensive_copy(self):
+    tag = ListStateTag('values')
+    state = InMemoryUnmergedState(defensive_copy=False)
+    value = ['a']
+    state.add_state('w', tag, value)
+    self.assertIs(value, state.get_state('w', tag)[0])
+
+
+class MergeableStateAdapterTest(unittest.TestCase):
+
+  def test_window_ids_survive_reload(self):
+    tag = ListStateTag('values')
+    raw_state = InMemoryUnmergedState()
+    state = MergeableStateAdapter(raw_state)
+    for window in 'abc':
+      state.add_state(window, tag, window)
+    state.merge(['a', 'b'], 'ab')
+    for state in state, MergeableStateAdapter(raw_state):
+      self.assertEqual(['ab', 'c'], sorted(state.known_windows()))
+      self.assertEqual(['a', 'b'], sorted(state.get_state('ab', tag)))
+      self.assertEqual('ab', state.get_window(1))
+      self.assertEqual('ab', state.get_window(2))
+      self.assertEqual('c', state.get_window(3))
+      self.assertRaises(ValueError, state.get_window, 4)
+
+  def test_log_is_rewritten(self):
+    tag = ListStateTag('values')
+    raw_state = InMemoryUnmergedState()
+    state = MergeableStateAdapter(raw_state)
+    for n in range(1000):
+      state.add_state(n, tag, n)
+      if n:
+        state.merge([n - 1, n], n)
+    log = raw_state.get_global_state(MergeableStateAdapter.WINDOW_ID_LOG)
+    self.assertLessEqual(len(log), 2 + MergeableStateAdapter.LOG_SLACK)
+    state = MergeableStateAdapter(raw_state)
+    self.assertEqual([999], state.known_windows())
+    self.assertEqual(999, state.get_window(1))
+    self.assertEqual(range(1000), sorted(state.get_state(999, tag)))
+
+  def test_legacy_window_ids_migrated(self):
+    raw_state = InMemoryUnmergedState()
+    raw_state.set_global_state(MergeableStateAdapter.WINDOW_IDS, {'a': [1, 2]})
+    MergeableStateAdapter(raw_state)
+    self.assertIsNone(
+        raw_state.get_global_state(MergeableStateAdapter.WINDOW_IDS))
+    state = MergeableStateAdapter(raw_state)
+    self.assertEqual('a', state.get_window(2))
+    self.assertEqual(3, state._get_id('b'))  # pylint: disable=protected-access
+
+
 class TranscriptTest(unittest.TestCase):
 
   # We must prepend an underscore to this name so that the open-source unittest
@@ -105,6 +105,10 @@ class WindowFn(object):
     """Returns a window that is the result of merging a set of windows."""
     raise NotImplementedError
 
+  def is_merging(self):
+    """Returns whether this WindowFn may ever merge windows."""
+    return True
+
   def get_transformed_output_time(self, window, input_timestamp):  # pylint: disable=unused-argument
     """Given input time and output window, returns output time for window.
 
@@ -125,6 +129,16 @@ class WindowFn(object):
     return input_timestamp
 
 
+class NonMergingWindowFn(WindowFn):
+  """A windowing function that never merges windows."""
+
+  def merge(self, merge_context):
+    pass  # No merging.
+
+  def is_merging(self):
+    return False
+
+
 class BoundedWindow(object):
   """A window for timestamps in range (-infinity, end).
 
@@ -251,7 +265,7 @@ class GlobalWindow(BoundedWindow):
     return self is other or type(self) is type(other)
 
 
-class GlobalWindows(WindowFn):
+class GlobalWindows(NonMergingWindowFn):
   """A windowing function that assigns everything to one global window."""
 
   @classmethod
@@ -261,9 +275,6 @@ class GlobalWindows(WindowFn):
   def assign(self, assign_context):
     return [GlobalWindow()]
 
-  def merge(self, merge_context):
-    pass  # No merging.
-
   def __hash__(self):
     return hash(type(self))
 
@@ -275,7 +286,7 @@ class GlobalWindows(WindowFn):
     return not self == other
 
 
-class FixedWindows(WindowFn):
+class FixedWindows(NonMergingWindowFn):
   """A windowing function that assigns each element to one time interval.
 
   The attributes size and offset determine in what time interval a timestamp
@@ -300,11 +311,8 @@ class FixedWindows(WindowFn):
     start = timestamp - (timestamp - self.offset) % self.size
     return [IntervalWindow(start, start + self.size)]
 
-  def merge(self, merge_context):
-    pass  # No merging.
-
 
-class SlidingWindows(WindowFn):
+class SlidingWindows(NonMergingWindowFn):
   """A windowing function that assigns each element to a set of sliding windows.
 
   The attributes size and offset determine in what time interval a timestamp
@@ -332,9 +340,6 @@ class SlidingWindows(WindowFn):
     return [IntervalWindow(Timestamp.of(s), Timestamp.of(s) + self.size)
             for s in range(start, start - self.size, -self.period)]
 
-  def merge(self, merge_context):
-    pass  # No merging.
-
 
 class Sessions(WindowFn):
   """A windowing function that groups elements into sessions.
@@ -61,16 +61,33 @@ class TypeCheckWrapperDoFn(DoFn):
 
   def process(self, context, *args, **kwargs):
     if self._input_hints:
-      actual_inputs = inspect.getcallargs(
-          self._process_fn, context.element, *args, **kwargs)
-      for var, hint in self._input_hints.items():
-        if hint is actual_inputs[var]:
-          # self parameter
-          continue
-        var_name = var + '.element' if var == self.context_var else var
-        _check_instance_type(hint, actual_inputs[var], var_name, True)
+      self._type_check_inputs(context.element, args, kwargs)
     return self._type_check_result(self._dofn.process(context, *args, **kwargs))
 
+  def process_batch(self, context, elements, *args, **kwargs):
+    if self._input_hints:
+      for element in elements:
+        self._type_check_inputs(element, args, kwargs)
+    return self._type_check_result(
+        self._dofn.process_batch(context, elements, *args, **kwargs))
+
+  def supports_process_batch(self):
+    return self._dofn.supports_process_batch()
+
+  @property
+  def max_batch_size(self):
+    return self._dofn.max_batch_size
+
+  def _type_check_inputs(self, element, args, kwargs):
+    actual_inputs = inspect.getcallargs(
+        self._process_fn, element, *args, **kwargs)
+    for var, hint in self._input_hints.items():
+      if hint is actual_inputs[var]:
+        # self parameter
+        continue
+      var_name = var + '.element' if var == self.context_var else var
+      _check_instance_type(hint, actual_inputs[var], var_name, True)
+
   def _type_check_result(self, transform_results):
     if self._output_type_hint is None or transform_results is None:
       return transform_results
@@ -145,6 +162,17 @@ class OutputCheckWrapperDoFn(DoFn):
   def process(self, context, *args, **kwargs):
     return self.run(self.dofn.process, context, args, kwargs)
 
+  def process_batch(self, context, elements, *args, **kwargs):
+    return self.run(
+        self.dofn.process_batch, context, (elements,) + args, kwargs)
+
+  def supports_process_batch(self):
+    return self.dofn.supports_process_batch()
+
+  @property
+  def max_batch_size(self):
+    return self.dofn.max_batch_size
+
   def _check_type(self, output):
     if output is None:
       return output
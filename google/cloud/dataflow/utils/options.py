@@ -323,12 +323,23 @@ class WorkerOptions(PipelineOptions):
         help=
         ('The teardown policy for the VMs. By default this is left unset and '
          'the service sets the default policy.'))
+    parser.add_argument(
+        '--partial_group_by_key_memory_mb',
+        type=int,
+        default=None,
+        help=
+        ('Memory budget, in megabytes, for the values buffered by each partial '
+         'group-by-key operation (including lifted combiners) on a worker. '
+         'Larger budgets group more values before the shuffle. If not set, '
+         'a default of 64 MB is used.'))
 
   def validate(self, validator):
     errors = []
     if validator.is_service_runner():
       errors.extend(
           validator.validate_optional_argument_positive(self, 'num_workers'))
+      errors.extend(validator.validate_optional_argument_positive(
+          self, 'partial_group_by_key_memory_mb'))
     return errors
 
 
@@ -418,7 +418,7 @@ class BatchWorker(object):
     logging.info('Executing %s', work_item)
     BatchWorker.log_memory_usage_if_needed(self.worker_id, force=True)
 
-    work_executor = executor.MapTaskExecutor()
+    work_executor = executor.MapTaskExecutor(self.pipeline_options)
     progress_reporter = ProgressReporter(
         work_item, work_executor, self, self.client)
 
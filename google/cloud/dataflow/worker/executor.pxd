@@ -14,6 +14,17 @@
 
 cimport cython
 
+cdef class ReceiverSet(object):
+  cdef public list receivers
+  cdef public object opcounter
+  cdef public object counter_factory
+  cdef public int output_index
+  cdef public object coder
+
+  cpdef output(self, windowed_value, object coder=*)
+  cpdef update_counters_start(self, windowed_value, object coder=*)
+  cpdef update_counters_finish(self)
+
 cdef class Operation(object):
   cdef public spec
   cdef public counter_factory
@@ -27,9 +38,12 @@ cdef class Operation(object):
   cpdef process(self, windowed_value)
   cpdef finish(self)
 
-  @cython.locals(receiver=Operation)
+  @cython.locals(receiver_set=ReceiverSet)
   cpdef output(self, windowed_value, object coder=*, int output_index=*)
 
+cdef class SingletonReceiverSet(ReceiverSet):
+  cdef Operation receiver
+
 cdef class ReadOperation(Operation):
   cdef object _current_progress
   cdef object _reader
@@ -38,6 +52,10 @@ cdef class DoOperation(Operation):
   cdef object state
   cdef object context
   cdef object dofn_runner
+  cdef object fn_data
+  cdef object side_input_cache
+  cdef object side_input_hit_counter
+  cdef object side_input_miss_counter
 
 cdef class CombineOperation(Operation):
   cdef object phased_combine_fn
@@ -47,6 +65,7 @@ cdef class ShuffleWriteOperation(Operation):
   cdef object writer
   cdef object _write_coder
   cdef bint is_ungrouped
+  cdef bint sorts_values
 
 cdef class GroupedShuffleReadOperation(Operation):
   cdef object shuffle_source
@@ -65,6 +84,9 @@ cdef class ReifyTimestampAndWindowsOperation(Operation):
 cdef class BatchGroupAlsoByWindowsOperation(Operation):
   cdef object windowing
   cdef object phased_combine_fn
+  cdef bint windows_close_in_order
+
+  cpdef fire_timers(self, key, driver, state, watermark)
 
 cdef class StreamingGroupAlsoByWindowsOperation(Operation):
   cdef object windowing
@@ -74,7 +96,18 @@ cdef class StreamingGroupAlsoByWindowsOperation(Operation):
 cdef class PGBKCVOperation(Operation):
   cdef public object combine_fn
   cdef dict table
-  cdef long max_keys
+  cdef public long max_bytes
   cdef long key_count
-
+  cdef double entry_bytes
+  cdef long updates_until_sample
+  cdef long hits
+  cdef long misses
+  cdef long evictions
+  cdef object hit_counter
+  cdef object miss_counter
+  cdef object eviction_counter
+
+  cpdef sample_entry_size(self, tuple wkey, accumulator)
+  cpdef evict(self)
+  cpdef update_counters(self)
   cpdef output_key(self, tuple wkey, value)
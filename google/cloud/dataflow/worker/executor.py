@@ -17,9 +17,12 @@
 """Worker operations executor."""
 
 import collections
+import cPickle
+import functools
 import itertools
 import logging
 import random
+import threading
 
 
 from google.cloud.dataflow import pvalue
@@ -30,19 +33,24 @@ from google.cloud.dataflow.internal import pickler
 from google.cloud.dataflow.pvalue import EmptySideInput
 from google.cloud.dataflow.runners import common
 import google.cloud.dataflow.transforms as ptransform
-from google.cloud.dataflow.transforms import combiners
 from google.cloud.dataflow.transforms import trigger
 from google.cloud.dataflow.transforms.combiners import curry_combine_fn
 from google.cloud.dataflow.transforms.combiners import PhasedCombineFnExecutor
+from google.cloud.dataflow.transforms.timeutil import Duration
 from google.cloud.dataflow.transforms.trigger import InMemoryUnmergedState
 from google.cloud.dataflow.transforms.window import GlobalWindows
+from google.cloud.dataflow.transforms.window import MAX_TIMESTAMP
 from google.cloud.dataflow.transforms.window import MIN_TIMESTAMP
+from google.cloud.dataflow.transforms.window import Sessions
 from google.cloud.dataflow.transforms.window import WindowedValue
+from google.cloud.dataflow.utils.counters import Counter
 from google.cloud.dataflow.utils.names import PropertyNames
+from google.cloud.dataflow.utils.options import WorkerOptions
 from google.cloud.dataflow.worker import logger
 from google.cloud.dataflow.worker import maptask
 from google.cloud.dataflow.worker import opcounters
 from google.cloud.dataflow.worker import shuffle
+from google.cloud.dataflow.worker import sideinputs
 
 
 class ReceiverSet(object):
@@ -94,6 +102,43 @@ class ReceiverSet(object):
         ' '.join([r.str_internal(is_recursive=True) for r in self.receivers]))
 
 
+class SingletonReceiverSet(ReceiverSet):
+  """A ReceiverSet specialized for an edge with a single receiving Operation.
+
+  This is a micro-optimization of the most common shape of a map task,
+  linear chains (e.g. ParDo -> ParDo -> Write): the value is handed straight
+  to the receiver, without looping over a list of receivers.  The operations
+  themselves are not fused; each one still processes every element.
+  """
+
+  def __init__(self, counter_factory, coder, output_index, receiver):
+    super(SingletonReceiverSet, self).__init__(
+        counter_factory, coder, output_index)
+    self.receivers.append(receiver)
+    self.receiver = receiver
+
+  def add_receiver(self, receiving_operation):
+    raise RuntimeError('Cannot add receivers to a specialized edge.')
+
+  def output(self, windowed_value, coder=None):
+    if self.opcounter:
+      self.opcounter.update_from(windowed_value, coder)
+    self.receiver.process(windowed_value)
+    if self.opcounter:
+      self.opcounter.update_collect()
+
+
+def specialize_receiver_set(receiver_set):
+  """Returns an equivalent, possibly specialized, ReceiverSet for an edge."""
+  if (type(receiver_set) is ReceiverSet
+      and len(receiver_set.receivers) == 1):
+    return SingletonReceiverSet(
+        receiver_set.counter_factory, receiver_set.coder,
+        receiver_set.output_index, receiver_set.receivers[0])
+  else:
+    return receiver_set
+
+
 class Operation(object):
   """An operation representing the live version of a work item specification.
 
@@ -134,7 +179,8 @@ class Operation(object):
     pass
 
   def output(self, windowed_value, coder=None, output_index=0):
-    self.receivers[output_index].output(windowed_value, coder)
+    receiver_set = self.receivers[output_index]
+    receiver_set.output(windowed_value, coder)
 
   def add_receiver(self, operation, output_index=0):
     """Adds a receiver operation for the specified output."""
@@ -352,6 +398,8 @@ class ShuffleWriteOperation(Operation):
   def start(self):
     super(ShuffleWriteOperation, self).start()
     self.is_ungrouped = self.spec.shuffle_kind == 'ungrouped'
+    self.sorts_values = (
+        self.spec.shuffle_kind == 'group_keys_and_sort_values')
     coder = self.spec.output_coders[0]
     if self.is_ungrouped:
       coders = (BytesCoder(), coder)
@@ -387,18 +435,207 @@ class ShuffleWriteOperation(Operation):
       k, v = str(random.getrandbits(64)), o.value
     else:
       k, v = o.value
-    # TODO(silviuc): Use timestamps for the secondary key to get values in
-    # times-sorted order.
-    self.writer.Write(k, '', v)
+    if self.sorts_values:
+      # Have the values of each key read back in timestamp order.
+      secondary_key = shuffle.timestamp_secondary_key(o.timestamp)
+    else:
+      secondary_key = ''
+    self.writer.Write(k, secondary_key, v)
     self.receivers[0].update_counters_finish()
 
 
+def read_side_values(read_fn, max_bytes, size=0):
+  """Reads the values of a side source unless they take more than max_bytes.
+
+  Args:
+    read_fn: a callable returning an iterable of the values of the source.
+    max_bytes: the bound on the estimated size of the values read.
+    size: the estimated size already accounted for, in bytes.
+
+  Returns:
+    A tuple of (values, size).  The values are a list, or, if they are
+    estimated to take more than max_bytes, a callable returning an iterable
+    of them instead.  The first call to that callable resumes the read
+    interrupted here, so that the values already read are not read again.
+  """
+  values = []
+  value_iter = iter(read_fn())
+  for ix, value in enumerate(value_iter):
+    if ix % SideInputCache.SIZE_SAMPLE_PERIOD == 0:
+      value_size = estimate_size(value)
+    size += value_size
+    values.append(value)
+    if size > max_bytes:
+      return _ResumedSideRead(values, value_iter, read_fn), size
+  return values, size
+
+
+class _ResumedSideRead(object):
+  """A callable reading the values of a side source anew on every call.
+
+  The first call resumes an interrupted read instead, returning the values
+  read so far followed by the rest of them.
+  """
+
+  def __init__(self, values, value_iter, read_fn):
+    self._values = values
+    self._value_iter = value_iter
+    self._read_fn = read_fn
+
+  def __call__(self):
+    if self._values is None:
+      return self._read_fn()
+    values, value_iter = self._values, self._value_iter
+    self._values = self._value_iter = None
+    return itertools.chain(values, value_iter)
+
+
+class SideInputCache(object):
+  """A process-wide cache of the values read from side input sources.
+
+  A batch stage is often split into many work items that all read the same
+  side inputs; this keeps the values read from each side source so that they
+  are read and decoded once per worker rather than once per work item.
+  Sources are identified by their pickled form.  The cached values are
+  bounded by their estimated size, evicting the least recently used ones
+  first.  Sources whose values alone would exceed that bound are remembered
+  as such, and left to be read lazily by the caller.
+
+  Side inputs made of such sources are spilled to local files by the caller;
+  the last MAX_SPILLED of them are kept here as well, so that each is read
+  and spilled once per worker too.
+  """
+
+  # Default bound on the estimated size of the cached values.
+  DEFAULT_MAX_BYTES = 256 << 20
+
+  # The size of one in this many values is estimated, and taken as that of
+  # its neighbours.
+  SIZE_SAMPLE_PERIOD = 64
+
+  # Number of spilled side inputs kept.
+  MAX_SPILLED = 16
+
+  def __init__(self, max_bytes=None):
+    self.max_bytes = max_bytes or self.DEFAULT_MAX_BYTES
+    self._lock = threading.Lock()
+    # Maps (pickled source, singleton) to (values, estimated bytes), least
+    # recently used first.
+    self._entries = collections.OrderedDict()
+    self._bytes = 0
+    # Keys of the sources whose values are too large to be cached.
+    self._too_large = set()
+    # Maps (pickled sources, view class) to spilled side inputs, least
+    # recently used first.
+    self._spilled = collections.OrderedDict()
+
+  def read(self, source, singleton, read_fn):
+    """Returns the values of a side source.
+
+    Args:
+      source: the side input source.
+      singleton: whether only the first value of the source is needed.
+      read_fn: a callable returning an iterable of the values of the source,
+        used if they are not cached.
+
+    Returns:
+      A tuple of (values, hit), where hit is whether the values were cached.
+      The values should not be modified, as they may be shared with other
+      work items.  If they are estimated to take more than max_bytes, the
+      values are instead a callable returning an iterable of them, as
+      returned by read_side_values; sources known to be that large are not
+      read here at all.
+    """
+    key = self._cache_key(source, singleton)
+    if key is not None:
+      with self._lock:
+        if key in self._too_large:
+          return read_fn, False
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+          self._entries[key] = entry
+          return entry[0], True
+    values, size = read_side_values(
+        read_fn, self.max_bytes, 0 if key is None else len(key[0]))
+    if key is not None:
+      if callable(values):
+        with self._lock:
+          self._too_large.add(key)
+      else:
+        self._put(key, values, size)
+    return values, False
+
+  def read_spilled(self, sources, view_class, spill_fn):
+    """Returns a side input spilled to a local file, shared by work items.
+
+    Args:
+      sources: the side input sources the side input is read from.
+      view_class: the class of the view of the side input.
+      spill_fn: a callable returning the side input spilled from the values
+        of the sources, used if it is not kept already.
+
+    Returns:
+      A tuple of (side input, hit), where hit is whether the side input was
+      kept already.
+    """
+    keys = [self._cache_key(source, False) for source in sources]
+    if None in keys:
+      return spill_fn(), False
+    key = tuple(k for k, _ in keys), view_class
+    with self._lock:
+      spilled = self._spilled.pop(key, None)
+      if spilled is not None:
+        self._spilled[key] = spilled
+        return spilled, True
+    # Spilled outside of the lock, as it reads the whole side input; another
+    # work item spilling the same side input meanwhile is merely redundant.
+    spilled = spill_fn()
+    with self._lock:
+      self._spilled[key] = spilled
+      while len(self._spilled) > self.MAX_SPILLED:
+        self._spilled.popitem(last=False)
+    return spilled, False
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+      self._bytes = 0
+      self._too_large.clear()
+      self._spilled.clear()
+
+  def _cache_key(self, source, singleton):
+    try:
+      return cPickle.dumps(source, cPickle.HIGHEST_PROTOCOL), singleton
+    except Exception:  # pylint: disable=broad-except
+      # Sources that cannot be pickled are simply not cached.
+      return None
+
+  def _put(self, key, values, size):
+    with self._lock:
+      previous = self._entries.pop(key, None)
+      if previous is not None:
+        self._bytes -= previous[1]
+      self._entries[key] = values, size
+      self._bytes += size
+      while self._bytes > self.max_bytes:
+        _, (_, evicted_size) = self._entries.popitem(last=False)
+        self._bytes -= evicted_size
+
+
+side_input_cache = SideInputCache()
+
+
 class DoOperation(Operation):
   """A Do operation that will execute a custom DoFn for each input element."""
 
-  def __init__(self, spec, counter_factory):
+  def __init__(self, spec, counter_factory, side_input_cache=None):
     super(DoOperation, self).__init__(spec, counter_factory)
     self.state = common.DoFnState(counter_factory)
+    # Deserialized lazily, once, in case this operation is restarted.
+    self.fn_data = None
+    # Values read from side sources, shared with other work items; None to
+    # read all side inputs anew every time the operation starts.
+    self.side_input_cache = side_input_cache
 
   def _read_side_inputs(self, tags_and_types):
     """Generator reading side inputs in the order prescribed by tags_and_types.
@@ -412,7 +649,11 @@ class DoOperation(Operation):
     Yields:
       With each iteration it yields the result of reading an entire side source
       either in singleton or collection mode according to the tags_and_types
-      argument.
+      argument.  Collections too large to be held in memory are yielded as a
+      sideinputs.SpilledMapSideInput for dict and multimap views, and as a
+      sideinputs.SpilledListSideInput otherwise, which is shared with other
+      work items through the side input cache; without a cache, iterable
+      views are yielded as a sideinputs.ReiterableSideInput instead.
     """
     # We will read the side inputs in the order prescribed by the
     # tags_and_types argument because this is exactly the order needed to
@@ -423,28 +664,30 @@ class DoOperation(Operation):
     # specification. This can happen for instance if the source has been
     # sharded into several files.
     for side_tag, view_class, view_options in tags_and_types:
-      # Note that currently, the implementation of Iterable and List views
-      # are identical. This may change in the future once we allow very large
-      # side input collections.
       is_singleton = view_class == pvalue.SingletonPCollectionView
+      # The values of each side source, or, for sources too large to be held
+      # in memory, a callable reading them.
+      parts = []
+      sources = []
       # Using the side_tag in the lambda below will trigger a pylint warning.
       # However in this case it is fine because the lambda is used right away
       # while the variable has the value assigned by the current iteration of
       # the for loop.
       # pylint: disable=cell-var-from-loop
-      results = []
       for si in itertools.ifilter(
           lambda o: o.tag == side_tag, self.spec.side_inputs):
         if isinstance(si, maptask.WorkerSideInputSource):
           op = ReadOperation(si, self.counter_factory)
         else:
           raise NotImplementedError('Unknown side input type: %r' % si)
-        for v in op.side_read_all(singleton=is_singleton):
-          results.append(v)
-          if is_singleton:
-            break
+        read_fn = functools.partial(op.side_read_all, singleton=is_singleton)
+        sources.append(si.source)
+        parts.append(self._read_side_source(si.source, is_singleton, read_fn))
       if is_singleton:
         has_default, default = view_options
+        results = [v for part in parts
+                   for v in itertools.islice(
+                       part() if callable(part) else part, 1)]
         if results:
           yield results[0]
         elif has_default:
@@ -452,16 +695,76 @@ class DoOperation(Operation):
         else:
           yield EmptySideInput()
       else:
-        yield results
+        is_lazy = any(callable(part) for part in parts)
+        if is_lazy:
+          values = sideinputs.ReiterableSideInput(
+              [part if callable(part) else functools.partial(iter, part)
+               for part in parts])
+        else:
+          values = [v for part in parts for v in part]
+        if view_class in (pvalue.DictPCollectionView,
+                          pvalue.MultimapPCollectionView):
+          multimap = view_class == pvalue.MultimapPCollectionView
+          if is_lazy:
+            yield self._spill_side_input(
+                sources, view_class,
+                lambda: sideinputs.SpilledMapSideInput(values,
+                                                       multimap=multimap))
+          elif multimap:
+            result = collections.defaultdict(list)
+            for key, value in values:
+              result[key].append(value)
+            yield dict(result)
+          else:
+            yield dict(values)
+        elif is_lazy and (view_class == pvalue.ListPCollectionView or
+                          self.side_input_cache is not None):
+          # Iterable side inputs are spilled too when they can be shared with
+          # other work items, rather than read again from their sources.
+          yield self._spill_side_input(
+              sources, view_class,
+              lambda: sideinputs.SpilledListSideInput(values))
+        else:
+          yield values
+
+  def _read_side_source(self, source, singleton, read_fn):
+    """Returns the values of a side source, or a callable if too large."""
+    if self.side_input_cache is None:
+      values, _ = read_side_values(read_fn, SideInputCache.DEFAULT_MAX_BYTES)
+      return values
+    values, hit = self.side_input_cache.read(source, singleton, read_fn)
+    self._update_side_input_counters(hit)
+    return values
+
+  def _spill_side_input(self, sources, view_class, spill_fn):
+    """Returns a spilled side input, shared with other work items if cached."""
+    if self.side_input_cache is None:
+      return spill_fn()
+    spilled, hit = self.side_input_cache.read_spilled(
+        sources, view_class, spill_fn)
+    self._update_side_input_counters(hit)
+    return spilled
+
+  def _update_side_input_counters(self, hit):
+    if hit:
+      self.side_input_hit_counter.update(1)
+    else:
+      self.side_input_miss_counter.update(1)
 
   def start(self):
     super(DoOperation, self).start()
 
     # See fn_data in dataflow_runner.py
-    fn, args, kwargs, tags_and_types, window_fn = (
-        pickler.loads(self.spec.serialized_fn))
+    if self.fn_data is None:
+      self.fn_data = pickler.loads(self.spec.serialized_fn)
+    fn, args, kwargs, tags_and_types, window_fn = self.fn_data
 
     self.state.step_name = self.step_name
+    if self.side_input_cache is not None:
+      self.side_input_hit_counter = self.counter_factory.get_counter(
+          '%s-SideInputCacheHits' % self.step_name, Counter.SUM)
+      self.side_input_miss_counter = self.counter_factory.get_counter(
+          '%s-SideInputCacheMisses' % self.step_name, Counter.SUM)
 
     # TODO(silviuc): What is the proper label here? PCollection being processed?
     self.context = ptransform.DoFnProcessContext('label', state=self.state)
@@ -517,11 +820,21 @@ class CombineOperation(Operation):
         o.with_value((key, self.phased_combine_fn.apply(values))))
 
 
-def create_pgbk_op(spec, counter_factory):
+def estimate_size(value):
+  """Returns a rough estimate of the number of bytes needed to hold value."""
+  try:
+    return len(cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL))
+  except Exception:  # pylint: disable=broad-except
+    # Unpicklable values (e.g. ones holding lambdas) are rare here; assume
+    # they are of moderate size rather than failing the work item.
+    return 1024
+
+
+def create_pgbk_op(spec, counter_factory, max_bytes=None):
   if spec.combine_fn:
-    return PGBKCVOperation(spec, counter_factory)
+    return PGBKCVOperation(spec, counter_factory, max_bytes=max_bytes)
   else:
-    return PGBKOperation(spec, counter_factory)
+    return PGBKOperation(spec, counter_factory, max_bytes=max_bytes)
 
 
 class PGBKOperation(Operation):
@@ -529,85 +842,198 @@ class PGBKOperation(Operation):
 
   This takes (windowed) input (key, value) tuples and outputs
   (key, [value]) tuples, performing a best effort group-by-key for
-  values in this bundle, memory permitting.
+  values in this bundle, memory permitting.  The buffered values are bounded
+  by their estimated size.  When the buffer is full the largest groups are
+  emitted first, so that each output carries as many values as possible.
   """
 
-  def __init__(self, spec, counter_factory):
+  # Default bound on the estimated in-memory size of the buffered values.
+  DEFAULT_MAX_BYTES = 64 << 20
+
+  # When the buffer is full, groups are flushed until the estimated size of
+  # the buffer drops to this fraction of max_bytes.
+  FLUSH_TARGET = 0.9
+
+  # Estimated bytes used by the buffer itself for each group (the hash table
+  # slot, the key/windows tuple and the value list) and for each value.
+  GROUP_OVERHEAD_BYTES = 128
+  VALUE_OVERHEAD_BYTES = 8
+
+  # The size of a value is re-estimated once every this many values.
+  SIZE_SAMPLE_PERIOD = 64
+
+  def __init__(self, spec, counter_factory, max_bytes=None):
     super(PGBKOperation, self).__init__(spec, counter_factory)
     assert not self.spec.combine_fn
-    self.table = collections.defaultdict(list)
+    self.max_bytes = max_bytes or self.DEFAULT_MAX_BYTES
+    # Maps (key, windows) to [timestamp of the first value, values].
+    self.table = {}
     self.size = 0
-    # TODO(robertwb) Make this configurable.
-    self.max_size = 10000
+    # Running estimate of the bytes held by each buffered value.
+    self.value_bytes = self.VALUE_OVERHEAD_BYTES
+    self.values_until_sample = 0
 
   def process(self, o):
     # TODO(robertwb): Structural (hashable) values.
-    key = o.value[0], tuple(o.windows)
-    self.table[key].append(o)
+    key, value = o.value
+    kw = key, tuple(o.windows)
+    entry = self.table.get(kw, None)
+    if entry is None:
+      entry = self.table[kw] = [o.timestamp, []]
+    entry[1].append(value)
     self.size += 1
-    if self.size > self.max_size:
-      self.flush(9 * self.max_size // 10)
+    if self.values_until_sample <= 0:
+      self.sample_value_size(value)
+    else:
+      self.values_until_sample -= 1
+    if self.estimated_bytes() > self.max_bytes:
+      self.flush(self.max_bytes * self.FLUSH_TARGET)
+
+  def sample_value_size(self, value):
+    size = self.VALUE_OVERHEAD_BYTES + estimate_size(value)
+    # An exponentially weighted moving average, biased upwards so that a
+    # burst of large values is flushed early rather than running out of
+    # memory.
+    if size > self.value_bytes:
+      self.value_bytes = size
+    else:
+      self.value_bytes += (size - self.value_bytes) / 16.0
+    self.values_until_sample = self.SIZE_SAMPLE_PERIOD
+
+  def estimated_bytes(self):
+    return (self.size * self.value_bytes
+            + len(self.table) * self.GROUP_OVERHEAD_BYTES)
 
   def finish(self):
     self.flush(0)
 
-  def flush(self, target):
-    limit = self.size - target
-    for ix, (kw, vs) in enumerate(self.table.items()):
-      if ix >= limit:
+  def flush(self, target_bytes):
+    """Emits the largest groups until the buffer is below target_bytes."""
+    if target_bytes <= 0:
+      groups = self.table.items()
+    else:
+      groups = sorted(self.table.iteritems(),
+                      key=lambda item: len(item[1][1]), reverse=True)
+    for kw, (timestamp, values) in groups:
+      if self.estimated_bytes() <= target_bytes:
         break
       del self.table[kw]
+      self.size -= len(values)
       key, windows = kw
-      output_value = [v.value[1] for v in vs]
-      windowed_value = WindowedValue(
-          (key, output_value),
-          vs[0].timestamp, windows)
-      self.output(windowed_value)
+      self.output(WindowedValue((key, values), timestamp, windows))
 
 
 class PGBKCVOperation(Operation):
+  """Partial group-by-key operation with combiner lifting.
+
+  This takes (windowed) input (key, value) tuples and outputs (key,
+  accumulator) tuples, combining the values of each key seen in this bundle
+  into an in-memory table.  The table is bounded by the estimated size of its
+  entries rather than by key count.  When it gets full the least frequently
+  used keys are flushed, so that hot keys keep being combined before they
+  reach the shuffle.
+  """
 
-  def __init__(self, spec, counter_factory):
+  # Default bound on the estimated in-memory size of the combining table.
+  DEFAULT_MAX_BYTES = 64 << 20
+
+  # When the table is full, cold keys are flushed until the estimated size of
+  # the table drops to this fraction of max_bytes.
+  EVICTION_TARGET = 0.9
+
+  # Estimated bytes used by the table itself for each entry (the hash table
+  # slot, the windows/key tuple and the entry list).
+  ENTRY_OVERHEAD_BYTES = 128
+
+  # The size of an accumulator is re-estimated once every this many updates.
+  SIZE_SAMPLE_PERIOD = 64
+
+  def __init__(self, spec, counter_factory, max_bytes=None):
     super(PGBKCVOperation, self).__init__(spec, counter_factory)
     # Combiners do not accept deferred side-inputs (the ignored fourth
     # argument) and therefore the code to handle the extra args/kwargs is
     # simpler than for the DoFn's of ParDo.
     fn, args, kwargs = pickler.loads(self.spec.combine_fn)[:3]
     self.combine_fn = curry_combine_fn(fn, args, kwargs)
-    # Optimization for the (known tiny accumulator, often wide keyspace)
-    # count function.
-    # TODO(robertwb): Bound by in-memory size rather than key count.
-    self.max_keys = (
-        1000000 if isinstance(fn, combiners.CountCombineFn) else 10000)
+    self.max_bytes = max_bytes or self.DEFAULT_MAX_BYTES
+    # Running estimate of the bytes held by each table entry.  Entries are
+    # sampled while they are being updated so the estimate follows growing
+    # accumulators (e.g. those of ToList).
+    self.entry_bytes = self.ENTRY_OVERHEAD_BYTES
+    self.updates_until_sample = 0
     self.key_count = 0
+    # Maps (windows, key) to [accumulator, use_count].
     self.table = {}
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+
+  def start(self):
+    super(PGBKCVOperation, self).start()
+    self.hit_counter = self.counter_factory.get_counter(
+        '%s-CombinerTableHits' % self.step_name, Counter.SUM)
+    self.miss_counter = self.counter_factory.get_counter(
+        '%s-CombinerTableMisses' % self.step_name, Counter.SUM)
+    self.eviction_counter = self.counter_factory.get_counter(
+        '%s-CombinerTableEvictions' % self.step_name, Counter.SUM)
 
   def process(self, wkv):
     key, value = wkv.value
     wkey = tuple(wkv.windows), key
     entry = self.table.get(wkey, None)
     if entry is None:
-      if self.key_count >= self.max_keys:
-        target = self.key_count * 9 // 10
-        old_wkeys = []
-        # TODO(robertwb): Use an LRU cache?
-        for old_wkey, old_wvalue in enumerate(self.table.iterkeys()):
-          old_wkeys.append(old_wkey)  # Can't mutate while iterating.
-          self.output_key(old_wkey, old_wvalue)
-          self.key_count -= 1
-          if self.key_count <= target:
-            break
-        for old_wkey in reversed(old_wkeys):
-          del self.table[old_wkey]
+      self.misses += 1
+      if self.key_count * self.entry_bytes >= self.max_bytes:
+        self.evict()
       self.key_count += 1
-      entry = self.table[wkey] = [self.combine_fn.create_accumulator()]
+      entry = self.table[wkey] = [self.combine_fn.create_accumulator(), 0]
+    else:
+      self.hits += 1
     entry[0] = self.combine_fn.add_inputs(entry[0], [value])
+    entry[1] += 1
+    if self.updates_until_sample <= 0:
+      self.sample_entry_size(wkey, entry[0])
+    else:
+      self.updates_until_sample -= 1
+
+  def sample_entry_size(self, wkey, accumulator):
+    size = self.ENTRY_OVERHEAD_BYTES + estimate_size((wkey[1], accumulator))
+    # An exponentially weighted moving average, biased upwards so that a
+    # burst of large accumulators quickly shrinks the table.
+    if size > self.entry_bytes:
+      self.entry_bytes = size
+    else:
+      self.entry_bytes += (size - self.entry_bytes) / 16.0
+    self.updates_until_sample = self.SIZE_SAMPLE_PERIOD
+
+  def evict(self):
+    """Flushes the least frequently used keys to make room in the table."""
+    target_keys = int(self.max_bytes * self.EVICTION_TARGET / self.entry_bytes)
+    by_use = sorted(self.table.iteritems(), key=lambda item: item[1][1])
+    evicted = by_use[:max(len(by_use) - target_keys, 1)]
+    for wkey, entry in evicted:
+      del self.table[wkey]
+      self.output_key(wkey, entry[0])
+    self.key_count -= len(evicted)
+    self.evictions += len(evicted)
+    # Age the use counts of the surviving keys so that keys that were hot
+    # in the past but are no longer used eventually get flushed too.
+    for entry in self.table.itervalues():
+      entry[1] >>= 1
+    self.update_counters()
+
+  def update_counters(self):
+    self.hit_counter.update(self.hits)
+    self.miss_counter.update(self.misses)
+    self.eviction_counter.update(self.evictions)
+    self.hits = self.misses = self.evictions = 0
 
   def finish(self):
-    for wkey, value in self.table.iteritems():
-      self.output_key(wkey, value[0])
+    for wkey, entry in self.table.iteritems():
+      self.output_key(wkey, entry[0])
     self.table = {}
     self.key_count = 0
+    self.update_counters()
 
   def output_key(self, wkey, value):
     windows, key = wkey
@@ -652,12 +1078,27 @@ class BatchGroupAlsoByWindowsOperation(Operation):
   """BatchGroupAlsoByWindowsOperation operation.
 
   Implements GroupAlsoByWindow for batch pipelines.
+
+  Unless the windowing is the default one, the values of each key are handed
+  to the trigger driver in chunks of CHUNK_SIZE values.  When they are read
+  from shuffle in timestamp order, the windows ending before the last value
+  of a chunk can receive no more values, so they are fired (and their state
+  freed) right after the chunk rather than once all values are read.
   """
 
+  # Number of values handed to the trigger driver at once.
+  CHUNK_SIZE = 1000
+
   def __init__(self, spec, counter_factory):
     super(BatchGroupAlsoByWindowsOperation, self).__init__(
         spec, counter_factory)
     self.windowing = pickler.loads(self.spec.window_fn)
+    # Whether no value later in time can fall into, or be merged into, a
+    # window ending before it.  Other merging window fns could merge any
+    # windows.
+    window_fn = self.windowing.windowfn
+    self.windows_close_in_order = (
+        not window_fn.is_merging() or isinstance(window_fn, Sessions))
     if self.spec.combine_fn:
       # Combiners do not accept deferred side-inputs (the ignored fourth
       # argument) and therefore the code to handle the extra args/kwargs is
@@ -676,18 +1117,40 @@ class BatchGroupAlsoByWindowsOperation(Operation):
     k, vs = o.value
     driver = trigger.create_trigger_driver(
         self.windowing, is_batch=True, phased_combine_fn=self.phased_combine_fn)
-    state = InMemoryUnmergedState()
-
-    # TODO(robertwb): Process in smaller chunks.
-    for wvalue in driver.process_elements(state, vs, MIN_TIMESTAMP):
-      self.output(wvalue.with_value((k, wvalue.value)))
-
-    while state.timers:
-      timers = state.get_and_clear_timers()
+    # The values were freshly decoded from shuffle and are not referenced
+    # anywhere else, so the state need not copy them defensively.
+    state = InMemoryUnmergedState(defensive_copy=False)
+
+    if self.windowing.is_default():
+      # A single pane of all the values, which are iterated over lazily.
+      for wvalue in driver.process_elements(state, vs, MIN_TIMESTAMP):
+        self.output(wvalue.with_value((k, wvalue.value)))
+      return
+
+    fire_early = (self.windows_close_in_order
+                  and getattr(vs, 'sorted_by_timestamp', False))
+    values = iter(vs)
+    while True:
+      chunk = list(itertools.islice(values, self.CHUNK_SIZE))
+      if not chunk:
+        break
+      for wvalue in driver.process_elements(state, chunk, MIN_TIMESTAMP):
+        self.output(wvalue.with_value((k, wvalue.value)))
+      if fire_early:
+        # Values still to come may share the timestamp of the last one.
+        self.fire_timers(k, driver, state,
+                         chunk[-1].timestamp - Duration(micros=1))
+    self.fire_timers(k, driver, state, MAX_TIMESTAMP)
+
+  def fire_timers(self, key, driver, state, watermark):
+    """Fires the timers set for up to the given watermark."""
+    timers = state.get_and_clear_timers(watermark)
+    while timers:
       for timer_window, (name, time_domain, timestamp) in timers:
         for wvalue in driver.process_timer(
             timer_window, name, time_domain, timestamp, state):
-          self.output(wvalue.with_value((k, wvalue.value)))
+          self.output(wvalue.with_value((key, wvalue.value)))
+      timers = state.get_and_clear_timers(watermark)
 
 
 class StreamingGroupAlsoByWindowsOperation(Operation):
@@ -715,7 +1178,10 @@ class StreamingGroupAlsoByWindowsOperation(Operation):
         state, keyed_work.elements(), output_watermark):
       self.output(wvalue.with_value((key, wvalue.value)))
 
-    for timer in keyed_work.timers():
+    timers = list(keyed_work.timers())
+    if timers:
+      driver.prefetch_timers([int(timer.namespace) for timer in timers], state)
+    for timer in timers:
       timer_window = int(timer.namespace)
       for wvalue in driver.process_timer(
           timer_window, timer.name, timer.time_domain, timer.timestamp, state):
@@ -732,9 +1198,18 @@ class MapTaskExecutor(object):
   multiple_read_instruction_error_msg = (
       'Found more than one \'read instruction\' in a single \'map task\'')
 
-  def __init__(self):
+  def __init__(self, pipeline_options=None, specialize_receivers=True):
+    self._map_task = None
     self._ops = []
+    self._specialize_receivers = specialize_receivers
     self._read_operation = None
+    # Memory budget, in bytes, of each partial group-by-key operation.
+    self._pgbk_max_bytes = None
+    if pipeline_options is not None:
+      memory_mb = pipeline_options.view_as(
+          WorkerOptions).partial_group_by_key_memory_mb
+      if memory_mb:
+        self._pgbk_max_bytes = memory_mb << 20
 
   def get_progress(self):
     return (self._read_operation.get_progress()
@@ -749,6 +1224,10 @@ class MapTaskExecutor(object):
 
     We update the map_task with the execution status, expressed as counters.
 
+    The operations are created on the first call only.  Executing the same
+    map task again reuses (restarts) them, which avoids deserializing the
+    functions and coders of every operation each time.
+
     Args:
       map_task: The map task we are to run.
       test_shuffle_source: Used during tests for dependency injection into
@@ -760,8 +1239,27 @@ class MapTaskExecutor(object):
       RuntimeError: if we find more than on read instruction in task spec.
       TypeError: if the spec parameter is not an instance of the recognized
         maptask.Worker* classes.
+      ValueError: if asked to execute a different map task than the one
+        previously executed.
     """
+    if self._map_task is None:
+      self._create_operations(map_task, test_shuffle_source, test_shuffle_sink)
+      self._map_task = map_task
+    elif self._map_task is not map_task:
+      raise ValueError('A MapTaskExecutor can only re-execute the map task it '
+                       'first executed.')
+
+    ix = len(self._ops)
+    for op in reversed(self._ops):
+      ix -= 1
+      logging.debug('Starting op %d %s', ix, op)
+      op.start()
+    for op in self._ops:
+      op.finish(*())
 
+  def _create_operations(self, map_task, test_shuffle_source,
+                         test_shuffle_sink):
+    """Creates the graph of operations of a map task."""
     # operations is a list of maptask.Worker* instances. The order of the
     # elements is important because the inputs use list indexes as references.
     for spec in map_task.operations:
@@ -777,9 +1275,11 @@ class MapTaskExecutor(object):
       elif isinstance(spec, maptask.WorkerCombineFn):
         op = CombineOperation(spec, map_task.counter_factory)
       elif isinstance(spec, maptask.WorkerPartialGroupByKey):
-        op = create_pgbk_op(spec, map_task.counter_factory)
+        op = create_pgbk_op(spec, map_task.counter_factory,
+                            max_bytes=self._pgbk_max_bytes)
       elif isinstance(spec, maptask.WorkerDoFn):
-        op = DoOperation(spec, map_task.counter_factory)
+        op = DoOperation(spec, map_task.counter_factory,
+                         side_input_cache=side_input_cache)
       elif isinstance(spec, maptask.WorkerGroupingShuffleRead):
         op = GroupedShuffleReadOperation(
             spec, map_task.counter_factory, shuffle_source=test_shuffle_source)
@@ -836,10 +1336,7 @@ class MapTaskExecutor(object):
       for ix, op in enumerate(self._ops):
         op.step_name = map_task.step_names[ix]
 
-    ix = len(self._ops)
-    for op in reversed(self._ops):
-      ix -= 1
-      logging.debug('Starting op %d %s', ix, op)
-      op.start()
-    for op in self._ops:
-      op.finish(*())
+    # Now that the graph is complete, specialize the edges between operations.
+    if self._specialize_receivers:
+      for op in self._ops:
+        op.receivers = [specialize_receiver_set(r) for r in op.receivers]
@@ -25,11 +25,15 @@ from google.cloud.dataflow.internal import util
 from google.cloud.dataflow.io import bigquery
 from google.cloud.dataflow.io import fileio
 import google.cloud.dataflow.transforms as ptransform
+from google.cloud.dataflow.transforms import combiners
 from google.cloud.dataflow.transforms import core
 from google.cloud.dataflow.transforms import window
+from google.cloud.dataflow.utils.counters import CounterFactory
+from google.cloud.dataflow.utils.options import PipelineOptions
 from google.cloud.dataflow.worker import executor
 from google.cloud.dataflow.worker import inmemory
 from google.cloud.dataflow.worker import maptask
+from google.cloud.dataflow.worker import sideinputs
 import mock
 
 
@@ -97,11 +101,23 @@ class ProgressRequestRecordingInMemorySource(inmemory.InMemorySource):
     return self.last_reader
 
 
+class ReadCountingInMemorySource(inmemory.InMemorySource):
+
+  reads = 0
+
+  def reader(self):
+    self.reads += 1
+    return super(ReadCountingInMemorySource, self).reader()
+
+
 class ExecutorTest(unittest.TestCase):
 
   SHUFFLE_CODER = coders.PickleCoder()
   OUTPUT_CODER = coders.PickleCoder()
 
+  def setUp(self):
+    executor.side_input_cache.clear()
+
   def create_temp_file(self, content_text):
     """Creates a temporary file with content and returns the path to it."""
     temp = tempfile.NamedTemporaryFile(delete=False)
@@ -136,6 +152,74 @@ class ExecutorTest(unittest.TestCase):
     with open(output_path) as f:
       self.assertEqual('XYZ: 01234567890123456789\n', f.read())
 
+  def test_specialized_edges_preserve_counters(self):
+    def run(specialize_receivers):
+      output_buffer = []
+      map_task = make_map_task([
+          maptask.WorkerRead(
+              inmemory.InMemorySource(
+                  elements=[pickler.dumps(e) for e in ['a b', 'c', 'd e f']],
+                  start_index=0,
+                  end_index=3),
+              output_coders=[self.OUTPUT_CODER]),
+          maptask.WorkerDoFn(serialized_fn=pickle_with_side_inputs(
+              ptransform.CallableWrapperDoFn(lambda x: x.split())),
+                             output_tags=['out'],
+                             output_coders=[self.OUTPUT_CODER],
+                             input=(0, 0),
+                             side_inputs=None),
+          maptask.WorkerInMemoryWrite(output_buffer=output_buffer,
+                                      input=(1, 0),
+                                      output_coders=(self.OUTPUT_CODER,))
+      ])
+      map_task_executor = executor.MapTaskExecutor(
+          specialize_receivers=specialize_receivers)
+      map_task_executor.execute(map_task)
+      counters = dict((c.name, c.total)
+                      for c in map_task.counter_factory.get_counters())
+      # pylint: disable=protected-access
+      return map_task_executor._ops, output_buffer, counters
+
+    ops, output, counters = run(True)
+    generic_ops, generic_output, generic_counters = run(False)
+    self.assertEqual(['a', 'b', 'c', 'd', 'e', 'f'], output)
+    self.assertEqual(generic_output, output)
+    self.assertEqual(generic_counters, counters)
+    self.assertEqual(3, counters['step-0-out0-ElementCount'])
+    self.assertEqual(6, counters['step-1-out0-ElementCount'])
+    self.assertIsInstance(ops[0].receivers[0], executor.SingletonReceiverSet)
+    self.assertNotIsInstance(generic_ops[0].receivers[0],
+                             executor.SingletonReceiverSet)
+
+  def test_reexecute_map_task(self):
+    output_buffer = []
+    map_task = make_map_task([
+        maptask.WorkerRead(
+            inmemory.InMemorySource(
+                elements=[pickler.dumps(e) for e in ['a', 'b']],
+                start_index=0,
+                end_index=2),
+            output_coders=[self.OUTPUT_CODER]),
+        maptask.WorkerDoFn(serialized_fn=pickle_with_side_inputs(
+            ptransform.CallableWrapperDoFn(lambda x: [x.upper()])),
+                           output_tags=['out'],
+                           output_coders=[self.OUTPUT_CODER],
+                           input=(0, 0),
+                           side_inputs=None),
+        maptask.WorkerInMemoryWrite(output_buffer=output_buffer,
+                                    input=(1, 0),
+                                    output_coders=(self.OUTPUT_CODER,))
+    ])
+    map_task_executor = executor.MapTaskExecutor()
+    map_task_executor.execute(map_task)
+    # pylint: disable=protected-access
+    ops = list(map_task_executor._ops)
+    map_task_executor.execute(map_task)
+    self.assertEqual(['A', 'B', 'A', 'B'], output_buffer)
+    self.assertEqual(ops, map_task_executor._ops)
+    with self.assertRaises(ValueError):
+      map_task_executor.execute(make_map_task(map_task.operations))
+
   def test_read_do_write_with_start_bundle(self):
     input_path = self.create_temp_file('01234567890123456789\n0123456789')
     output_path = '%s.out' % input_path
@@ -518,6 +602,180 @@ class ExecutorTest(unittest.TestCase):
     self.assertEqual([u'aa:x', u'aa:y', u'bb:x', u'bb:y'],
                      sorted(output_buffer))
 
+  def test_side_inputs_cached_across_work_items(self):
+    input_path = self.create_temp_file('x\ny\n')
+
+    def run_work_item():
+      output_buffer = []
+      map_task = make_map_task([
+          maptask.WorkerRead(
+              inmemory.InMemorySource(
+                  elements=[pickler.dumps(e) for e in ['aa', 'bb']],
+                  start_index=0,
+                  end_index=2),
+              output_coders=[self.OUTPUT_CODER]),
+          maptask.WorkerDoFn(
+              serialized_fn=pickle_with_side_inputs(
+                  ptransform.CallableWrapperDoFn(
+                      lambda x, side: ['%s:%s' % (x, s) for s in side]),
+                  tag_and_type=('textfile', pvalue.IterablePCollectionView,
+                                ())),
+              output_tags=['out'], input=(0, 0),
+              side_inputs=[
+                  maptask.WorkerSideInputSource(fileio.TextFileSource(
+                      file_path=input_path, strip_trailing_newlines=True,
+                      coder=coders.StrUtf8Coder()), tag='textfile')],
+              output_coders=[self.OUTPUT_CODER]),
+          maptask.WorkerInMemoryWrite(output_buffer=output_buffer,
+                                      input=(1, 0),
+                                      output_coders=(self.OUTPUT_CODER,))])
+      executor.MapTaskExecutor().execute(map_task)
+      counters = dict((c.name, c.total)
+                      for c in map_task.counter_factory.get_counters())
+      return (sorted(output_buffer),
+              counters['step-1-SideInputCacheHits'],
+              counters['step-1-SideInputCacheMisses'])
+
+    self.assertEqual(([u'aa:x', u'aa:y', u'bb:x', u'bb:y'], 0, 1),
+                     run_work_item())
+    # Side sources do not change, so the values are not read again.
+    with open(input_path, 'w') as f:
+      f.write('z\n')
+    self.assertEqual(([u'aa:x', u'aa:y', u'bb:x', u'bb:y'], 1, 0),
+                     run_work_item())
+    executor.side_input_cache.clear()
+    self.assertEqual(([u'aa:z', u'bb:z'], 0, 1), run_work_item())
+
+  def test_large_side_inputs_read_lazily(self):
+    input_path = self.create_temp_file('x\ny\nz\n')
+
+    def run_work_item(view_class, fn):
+      output_buffer = []
+      executor.MapTaskExecutor().execute(make_map_task([
+          maptask.WorkerRead(
+              inmemory.InMemorySource(
+                  elements=[pickler.dumps(e) for e in ['aa', 'bb']],
+                  start_index=0,
+                  end_index=2),
+              output_coders=[self.OUTPUT_CODER]),
+          maptask.WorkerDoFn(
+              serialized_fn=pickle_with_side_inputs(
+                  ptransform.CallableWrapperDoFn(fn),
+                  tag_and_type=('textfile', view_class, ())),
+              output_tags=['out'], input=(0, 0),
+              side_inputs=[
+                  maptask.WorkerSideInputSource(fileio.TextFileSource(
+                      file_path=input_path, strip_trailing_newlines=True,
+                      coder=coders.StrUtf8Coder()), tag='textfile')],
+              output_coders=[self.OUTPUT_CODER]),
+          maptask.WorkerInMemoryWrite(output_buffer=output_buffer,
+                                      input=(1, 0),
+                                      output_coders=(self.OUTPUT_CODER,))]))
+      return sorted(output_buffer)
+
+    with mock.patch.object(executor.side_input_cache, 'max_bytes', 1):
+      self.assertEqual(
+          [u'aa:SpilledListSideInput:xyz:xyz',
+           u'bb:SpilledListSideInput:xyz:xyz'],
+          run_work_item(
+              pvalue.IterablePCollectionView,
+              lambda x, side: ['%s:%s:%s:%s' % (
+                  x, type(side).__name__, ''.join(side), ''.join(side))]))
+      self.assertEqual(
+          [u'aa:SpilledListSideInput:3:z:y', u'bb:SpilledListSideInput:3:z:y'],
+          run_work_item(
+              pvalue.ListPCollectionView,
+              lambda x, side: ['%s:%s:%d:%s:%s' % (
+                  x, type(side).__name__, len(side), side[-1], side[1])]))
+      # The spilled side inputs are shared with later work items rather than
+      # read again from their sources.
+      with open(input_path, 'w') as f:
+        f.write('w\n')
+      self.assertEqual(
+          [u'aa:3:z', u'bb:3:z'],
+          run_work_item(
+              pvalue.ListPCollectionView,
+              lambda x, side: ['%s:%d:%s' % (x, len(side), side[-1])]))
+
+  def test_large_side_inputs_read_lazily_without_cache(self):
+    side_source = ReadCountingInMemorySource(
+        elements=[pickler.dumps(e) for e in ['x', 'y', 'z']])
+    spec = maptask.WorkerDoFn(
+        serialized_fn=pickle_with_side_inputs(
+            ptransform.CallableWrapperDoFn(lambda x, side: [x])),
+        output_tags=['out'], input=(0, 0),
+        side_inputs=[maptask.WorkerSideInputSource(side_source, tag='side')],
+        output_coders=[self.OUTPUT_CODER])
+    op = executor.DoOperation(spec, CounterFactory())
+    with mock.patch.object(executor.SideInputCache, 'DEFAULT_MAX_BYTES', 1):
+      side, = op._read_side_inputs(
+          [('side', pvalue.IterablePCollectionView, ())])
+    self.assertIsInstance(side, sideinputs.ReiterableSideInput)
+    # The values read while sizing the source are not read again.
+    self.assertEqual(['x', 'y', 'z'], list(side))
+    self.assertEqual(1, side_source.reads)
+    self.assertEqual(['x', 'y', 'z'], list(side))
+    self.assertEqual(2, side_source.reads)
+
+  def test_dict_and_multimap_side_inputs(self):
+    side_pairs = [('a', 1), ('b', 2), ('a', 3)]
+
+    def run_work_item(view_class):
+      output_buffer = []
+      executor.MapTaskExecutor().execute(make_map_task([
+          maptask.WorkerRead(
+              inmemory.InMemorySource(
+                  elements=[pickler.dumps(e) for e in ['a', 'b', 'c']],
+                  start_index=0,
+                  end_index=3),
+              output_coders=[self.OUTPUT_CODER]),
+          maptask.WorkerDoFn(
+              serialized_fn=pickle_with_side_inputs(
+                  ptransform.CallableWrapperDoFn(
+                      lambda x, side: [(x, side.get(x))]),
+                  tag_and_type=('inmemory', view_class, ())),
+              output_tags=['out'], input=(0, 0),
+              side_inputs=[
+                  maptask.WorkerSideInputSource(
+                      inmemory.InMemorySource(
+                          elements=[pickler.dumps(e) for e in side_pairs],
+                          start_index=None,
+                          end_index=None),
+                      tag='inmemory')],
+              output_coders=[self.OUTPUT_CODER]),
+          maptask.WorkerInMemoryWrite(output_buffer=output_buffer,
+                                      input=(1, 0),
+                                      output_coders=(self.OUTPUT_CODER,))]))
+      return output_buffer
+
+    for max_bytes in (executor.SideInputCache.DEFAULT_MAX_BYTES, 1):
+      executor.side_input_cache.clear()
+      with mock.patch.object(executor.side_input_cache, 'max_bytes',
+                             max_bytes):
+        self.assertEqual([('a', 3), ('b', 2), ('c', None)],
+                         run_work_item(pvalue.DictPCollectionView))
+        self.assertEqual([('a', [1, 3]), ('b', [2]), ('c', None)],
+                         run_work_item(pvalue.MultimapPCollectionView))
+
+  def test_side_input_cache_evicts_least_recently_used(self):
+    sources = [inmemory.InMemorySource(elements=[pickler.dumps(i)])
+               for i in range(3)]
+    side_values = ['x' * 10000] * 10
+
+    def read(i):
+      values, hit = cache.read(sources[i], False, lambda: side_values)
+      self.assertEqual(side_values, list(values() if callable(values)
+                                         else values))
+      return hit
+
+    cache = executor.SideInputCache(max_bytes=1)
+    self.assertEqual([False, False], [read(0), read(0)])
+
+    # Room for two of the sources' values.
+    cache = executor.SideInputCache(max_bytes=250000)
+    self.assertEqual([False, False, True, False, True, False],
+                     [read(i) for i in (0, 1, 0, 2, 0, 1)])
+
   def test_combine(self):
     elements = [('a', [1, 2, 3]), ('b', [10])]
     output_buffer = []
@@ -559,6 +817,217 @@ class ExecutorTest(unittest.TestCase):
     ]))
     self.assertEqual([('a', [1, 3, 4]), ('b', [2])], sorted(output_buffer))
 
+  def test_pgbk_memory_budget_option(self):
+    output_buffer = []
+    map_task_executor = executor.MapTaskExecutor(
+        PipelineOptions(['--partial_group_by_key_memory_mb=3']))
+    map_task_executor.execute(make_map_task([
+        maptask.WorkerRead(
+            inmemory.InMemorySource(elements=[pickler.dumps(('a', 1))],
+                                    start_index=0,
+                                    end_index=100),
+            output_coders=[self.OUTPUT_CODER]),
+        maptask.WorkerPartialGroupByKey(
+            combine_fn=None,
+            input=(0, 0),
+            output_coders=[self.OUTPUT_CODER]),
+        maptask.WorkerInMemoryWrite(output_buffer=output_buffer,
+                                    input=(1, 0),
+                                    output_coders=(self.OUTPUT_CODER,))
+    ]))
+    self.assertEqual([('a', [1])], output_buffer)
+    # pylint: disable=protected-access
+    self.assertEqual(3 << 20, map_task_executor._ops[1].max_bytes)
+
+  def test_pgbk_flushes_largest_groups_first(self):
+    counter_factory = CounterFactory()
+    output_buffer = []
+    pgbk = executor.PGBKOperation(
+        maptask.WorkerPartialGroupByKey(
+            combine_fn=None,
+            input=(0, 0),
+            output_coders=[self.OUTPUT_CODER]),
+        counter_factory,
+        max_bytes=10 * executor.PGBKOperation.GROUP_OVERHEAD_BYTES)
+    write = executor.InMemoryWriteOperation(
+        maptask.WorkerInMemoryWrite(output_buffer=output_buffer,
+                                    input=(0, 0),
+                                    output_coders=(self.OUTPUT_CODER,)),
+        counter_factory)
+    pgbk.add_receiver(write)
+    pgbk.step_name, write.step_name = 'pgbk', 'write'
+    write.start()
+    pgbk.start()
+    for i in range(200):
+      pgbk.process(window.GlobalWindows.WindowedValue(('big', i)))
+      if i % 10 == 0:
+        pgbk.process(window.GlobalWindows.WindowedValue(('small', i)))
+    pgbk.finish()
+
+    self.assertEqual(range(200),
+                     [v for k, vs in output_buffer if k == 'big' for v in vs])
+    self.assertEqual(range(0, 200, 10),
+                     [v for k, vs in output_buffer if k == 'small' for v in vs])
+    # The budget forced flushes, each of which emitted the bigger group.
+    self.assertLess(2, len(output_buffer))
+    self.assertEqual('big', output_buffer[0][0])
+    self.assertLess(len(output_buffer[0][1]) / 2, len(output_buffer[1][1]))
+
+  def test_batch_gabw_fires_windows_of_sorted_values_early(self):
+
+    class Values(object):
+
+      def __init__(self, values, sorted_by_timestamp):
+        self.values = values
+        self.sorted_by_timestamp = sorted_by_timestamp
+        self.outputs_when_read = None
+
+      def __iter__(self):
+        for value in self.values:
+          yield value
+        self.outputs_when_read = len(output_buffer)
+
+    window_fn = window.FixedWindows(1000)
+    elements = [
+        window.WindowedValue(
+            t, t, window_fn.assign(window.WindowFn.AssignContext(t)))
+        for t in range(3000)]
+    for sorted_by_timestamp, expected_outputs_when_read in ((False, 0),
+                                                           (True, 2)):
+      counter_factory = CounterFactory()
+      output_buffer = []
+      gabw = executor.BatchGroupAlsoByWindowsOperation(
+          maptask.WorkerMergeWindows(
+              window_fn=pickler.dumps(core.Windowing(window_fn)),
+              combine_fn=None,
+              phase=None,
+              output_tags=['out'],
+              input=(0, 0),
+              coders=None,
+              context=None,
+              output_coders=[self.OUTPUT_CODER]),
+          counter_factory)
+      write = executor.InMemoryWriteOperation(
+          maptask.WorkerInMemoryWrite(output_buffer=output_buffer,
+                                      input=(0, 0),
+                                      output_coders=(self.OUTPUT_CODER,)),
+          counter_factory)
+      gabw.add_receiver(write)
+      gabw.step_name, write.step_name = 'gabw', 'write'
+      write.start()
+      gabw.start()
+      values = Values(elements, sorted_by_timestamp)
+      gabw.process(window.GlobalWindows.WindowedValue(('k', values)))
+      gabw.finish()
+
+      self.assertEqual(expected_outputs_when_read, values.outputs_when_read)
+      self.assertEqual([('k', range(n, n + 1000)) for n in (0, 1000, 2000)],
+                       sorted((k, sorted(vs)) for k, vs in output_buffer))
+
+  def test_batch_gabw_measures_grouped_values_as_read(self):
+
+    class ReadValuesOperation(executor.Operation):
+
+      def __init__(self):
+        super(ReadValuesOperation, self).__init__(None, None)
+        self.read_values = []
+
+      def process(self, o):
+        self.read_values.extend(o.value[1])
+
+      def str_internal(self, is_recursive=False):
+        # There is no spec to print, e.g. when debug logging is on.
+        return '<ReadValuesOperation>'
+
+    counter_factory = CounterFactory()
+    gabw = executor.BatchGroupAlsoByWindowsOperation(
+        maptask.WorkerMergeWindows(
+            window_fn=pickler.dumps(core.Windowing(window.GlobalWindows())),
+            combine_fn=None,
+            phase=None,
+            output_tags=['out'],
+            input=(0, 0),
+            coders=None,
+            context=None,
+            output_coders=[coders.WindowedValueCoder(coders.TupleCoder(
+                (coders.BytesCoder(),
+                 coders.IterableCoder(coders.BytesCoder()))))]),
+        counter_factory)
+    read = ReadValuesOperation()
+    gabw.add_receiver(read)
+    gabw.step_name = 'gabw'
+    gabw.start()
+    values = [window.GlobalWindows.WindowedValue('x' * n) for n in range(100)]
+    gabw.process(window.GlobalWindows.WindowedValue(('k', iter(values))))
+    gabw.finish()
+
+    self.assertEqual(['x' * n for n in range(100)], read.read_values)
+    counters = dict((c.name, c) for c in counter_factory.get_counters())
+    self.assertEqual(1, counters['gabw-out0-ElementCount'].total)
+    # The key and the values, whose sizes are extrapolated from a sample.
+    # Each value is encoded with its length, in one byte.
+    size = counters['gabw-out0-MeanByteCount'].value()
+    self.assertLess(size, 1 + 100 + sum(range(100)) * 2)
+    self.assertGreater(size, 1 + 100 + sum(range(100)) / 2)
+
+  def test_pgbk_combine(self):
+    elements = [('a', 1), ('b', 2), ('a', 3), ('a', 4)]
+    output_buffer = []
+    executor.MapTaskExecutor().execute(make_map_task([
+        maptask.WorkerRead(
+            inmemory.InMemorySource(elements=[pickler.dumps(e) for e in elements
+                                             ],
+                                    start_index=0,
+                                    end_index=100),
+            output_coders=[self.OUTPUT_CODER]),
+        maptask.WorkerPartialGroupByKey(
+            combine_fn=pickle_with_side_inputs(
+                ptransform.CombineFn.from_callable(sum)),
+            input=(0, 0),
+            output_coders=[self.OUTPUT_CODER]),
+        maptask.WorkerInMemoryWrite(output_buffer=output_buffer,
+                                    input=(1, 0),
+                                    output_coders=(self.OUTPUT_CODER,))
+    ]))
+    self.assertEqual([('a', 8), ('b', 2)], sorted(output_buffer))
+
+  def test_pgbk_combine_evicts_cold_keys(self):
+    counter_factory = CounterFactory()
+    output_buffer = []
+    pgbk = executor.PGBKCVOperation(
+        maptask.WorkerPartialGroupByKey(
+            combine_fn=pickle_with_side_inputs(combiners.CountCombineFn()),
+            input=(0, 0),
+            output_coders=[self.OUTPUT_CODER]),
+        counter_factory,
+        max_bytes=20 * executor.PGBKCVOperation.ENTRY_OVERHEAD_BYTES)
+    write = executor.InMemoryWriteOperation(
+        maptask.WorkerInMemoryWrite(output_buffer=output_buffer,
+                                    input=(0, 0),
+                                    output_coders=(self.OUTPUT_CODER,)),
+        counter_factory)
+    pgbk.add_receiver(write)
+    pgbk.step_name, write.step_name = 'pgbk', 'write'
+    write.start()
+    pgbk.start()
+    # A hot key interleaved with many cold ones.
+    for i in range(1000):
+      pgbk.process(window.GlobalWindows.WindowedValue(('hot', None)))
+      pgbk.process(window.GlobalWindows.WindowedValue((i, None)))
+    pgbk.finish()
+
+    totals = {}
+    for key, count in output_buffer:
+      totals[key] = totals.get(key, 0) + count
+    self.assertEqual(dict([('hot', 1000)] + [(i, 1) for i in range(1000)]),
+                     totals)
+    # The hot key stayed in the table while the cold keys got evicted.
+    self.assertEqual(1, len([k for k, _ in output_buffer if k == 'hot']))
+    counters = dict((c.name, c.total) for c in counter_factory.get_counters())
+    self.assertEqual(999, counters['pgbk-CombinerTableHits'])
+    self.assertEqual(1001, counters['pgbk-CombinerTableMisses'])
+    self.assertLess(900, counters['pgbk-CombinerTableEvictions'])
+
 if __name__ == '__main__':
   logging.getLogger().setLevel(logging.INFO)
   unittest.main()
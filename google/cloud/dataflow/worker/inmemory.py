@@ -52,6 +52,9 @@ class InMemorySource(iobase.NativeSource):
 class InMemoryReader(iobase.NativeSourceReader):
   """A reader for in-memory source."""
 
+  # Number of elements decoded together by each call into the coder.
+  DECODE_BATCH_SIZE = 1000
+
   def __init__(self, source):
     self.source = source
 
@@ -66,11 +69,22 @@ class InMemoryReader(iobase.NativeSourceReader):
     pass
 
   def __iter__(self):
-    for value in itertools.islice(self.source.elements,
-                                  self.source.start_index,
-                                  self.source.end_index):
-      self.current_index += 1
-      yield self.source.coder.decode(value)
+    if not isinstance(self.source.coder, coders.FastCoder):
+      # Other coders may decode elements that are not bytes, so they are
+      # called on one element at a time.
+      for value in itertools.islice(self.source.elements,
+                                    self.source.start_index,
+                                    self.source.end_index):
+        self.current_index += 1
+        yield self.source.coder.decode(value)
+      return
+    coder_impl = self.source.coder.get_impl()
+    for start in xrange(self.source.start_index, self.source.end_index,
+                        self.DECODE_BATCH_SIZE):
+      end = min(start + self.DECODE_BATCH_SIZE, self.source.end_index)
+      for value in coder_impl.decode_each(self.source.elements[start:end]):
+        self.current_index += 1
+        yield value
 
   def get_progress(self):
     if (self.current_index >= self.source.end_index or
@@ -17,6 +17,7 @@
 import logging
 import unittest
 
+from google.cloud.dataflow import coders
 from google.cloud.dataflow.worker import inmemory
 
 
@@ -67,6 +68,19 @@ class InMemoryIO(unittest.TestCase):
       self.assertEqual(5, i)
       self.assertEqual(1, reader.get_progress().percent_complete)
 
+  def test_in_memory_source_decodes_in_batches(self):
+    coder = coders.VarIntCoder()
+    source = inmemory.InMemorySource(
+        [coder.encode(i) for i in range(10)], coder, 1, 9)
+    with source.reader() as reader:
+      reader.DECODE_BATCH_SIZE = 3
+      items = []
+      for item in reader:
+        items.append(item)
+        self.assertEqual(item + 1, reader.current_index)
+      self.assertEqual(range(1, 9), items)
+
+
 if __name__ == '__main__':
   logging.getLogger().setLevel(logging.INFO)
   unittest.main()
@@ -371,6 +371,26 @@ def get_coder_from_spec(coder_spec, kv_pair=False):
     return coder
 
 
+def get_grouped_source_coder(coder):
+  """Returns the coder of the individual (key, value) pairs of a grouped source.
+
+  A source of grouped values may be described by the coder of its output, in
+  which the values of each key are coded together by an IterableCoder.  The
+  values are however read one by one, and so decoded by its element coder.
+
+  Args:
+    coder: The KV coder of the source.
+
+  Returns:
+    A KV coder whose value coder decodes individual values.
+  """
+  if coder.is_kv_coder():
+    value_coder = coder.value_coder()
+    if isinstance(value_coder, coders.IterableCoder):
+      return coders.TupleCoder([coder.key_coder(), value_coder.elem_coder()])
+  return coder
+
+
 def get_output_coders(work):
   """Return a list of coder instances for the output(s) of this work item.
 
@@ -407,6 +427,7 @@ def get_read_work_item(work, env, context):
   if isinstance(coder, coders.WindowedValueCoder):
     coder = coder.wrapped_value_coder
   if specs['@type'] == 'GroupingShuffleSource':
+    coder = get_grouped_source_coder(coder)
     return WorkerGroupingShuffleRead(
         start_shuffle_position=specs['start_shuffle_position']['value'],
         end_shuffle_position=specs['end_shuffle_position']['value'],
@@ -776,7 +797,7 @@ class WorkerEnvironment(object):
   def _parse_windmill_source(specs, codec_specs, context):
     if specs['@type'] == 'WindowingWindmillReader':
       stream_id = specs['stream_id']['value']
-      coder = get_coder_from_spec(codec_specs)
+      coder = get_grouped_source_coder(get_coder_from_spec(codec_specs))
       return windmillio.WindowingWindmillSource(context, stream_id, coder)
 
   @staticmethod
@@ -19,7 +19,7 @@
 import logging
 import unittest
 
-
+from google.cloud.dataflow import coders
 from google.cloud.dataflow.utils.counters import Counter
 from google.cloud.dataflow.worker import maptask
 
@@ -36,6 +36,19 @@ class MapTaskTest(unittest.TestCase):
       counters_found += 1
     self.assertEqual(1, counters_found)
 
+  def test_get_grouped_source_coder(self):
+    grouped_coder = coders.TupleCoder(
+        [coders.BytesCoder(), coders.IterableCoder(coders.VarIntCoder())])
+    self.assertEqual(
+        coders.TupleCoder([coders.BytesCoder(), coders.VarIntCoder()]),
+        maptask.get_grouped_source_coder(grouped_coder))
+    # Coders of individual values are left alone.
+    kv_coder = coders.TupleCoder([coders.BytesCoder(), coders.PickleCoder()])
+    self.assertEqual(kv_coder, maptask.get_grouped_source_coder(kv_coder))
+    pickle_coder = coders.PickleCoder()
+    self.assertEqual(pickle_coder,
+                     maptask.get_grouped_source_coder(pickle_coder))
+
 
 if __name__ == '__main__':
   logging.getLogger().setLevel(logging.INFO)
@@ -16,11 +16,29 @@
 
 from __future__ import absolute_import
 
+import logging
+import random
+
+from google.cloud.dataflow.coders import IterableCoder
+from google.cloud.dataflow.coders import WindowedValueCoder
+from google.cloud.dataflow.coders import observable
 from google.cloud.dataflow.utils.counters import Counter
 
 
 class OperationCounters(object):
-  """The set of basic counters to attach to an Operation."""
+  """The set of basic counters to attach to an Operation.
+
+  The mean byte count is estimated from a sample of the elements, which
+  gets sparser as more elements are seen: every one of the first
+  INITIAL_SAMPLE_COUNT elements is sampled, and then about one in every
+  (element count / INITIAL_SAMPLE_COUNT) elements, but at least one in every
+  MAX_SAMPLE_PERIOD elements.  The sampled elements are picked at random
+  intervals, so as not to follow patterns in the data.
+  """
+
+  INITIAL_SAMPLE_COUNT = 16
+
+  MAX_SAMPLE_PERIOD = 1000
 
   def __init__(self, counter_factory, step_name, coder, output_index):
     self.element_counter = counter_factory.get_counter(
@@ -28,27 +46,65 @@ class OperationCounters(object):
     self.mean_byte_counter = counter_factory.get_counter(
         '%s-out%d-MeanByteCount' % (step_name, output_index), Counter.MEAN)
     self.coder = coder
+    self._elements_until_sample = 0
+    # The size accumulated for a sampled element whose grouped values are
+    # measured as they are read.
+    self._pending_size = None
 
   def update_from(self, windowed_value, coder=None):
     """Add one value to this counter."""
     self.element_counter.update(1)
-    # TODO(silviuc): Implement estimated size sampling.
-    # TODO(gildea):
-    # Actually compute the encoded size of this value.
-    # In spirit, something like this:
-    #     if coder is None:
-    #       coder = self.coder
-    #     coder.store_estimated_size(windowed_value, byte_size_accumulator)
-    # but will need to do sampling.
+    if self._elements_until_sample > 0:
+      self._elements_until_sample -= 1
+      return
+    self._sample(windowed_value, coder or self.coder)
+    sample_period = min(
+        self.element_counter.elements // self.INITIAL_SAMPLE_COUNT,
+        self.MAX_SAMPLE_PERIOD)
+    if sample_period > 1:
+      self._elements_until_sample = random.randint(0, 2 * sample_period - 2)
+
+  def _sample(self, windowed_value, coder):
+    """Estimates the encoded size of the given value for the byte counter."""
+    if coder is None:
+      return
+    value = windowed_value.value
+    try:
+      if (isinstance(value, tuple) and len(value) == 2
+          and isinstance(value[1], observable.ObservableMixin)):
+        # The values of a key are read lazily by the consumers of this element
+        # and cannot be encoded here, so they are measured as they are read,
+        # and collected by update_collect().
+        if isinstance(coder, WindowedValueCoder):
+          coder = coder.wrapped_value_coder
+        value_coder = coder.value_coder()
+        if isinstance(value_coder, IterableCoder):
+          value_coder = value_coder.elem_coder()
+        pending_size = _GroupedValuesSize(
+            coder.key_coder().estimate_size(value[0]), value_coder,
+            self.INITIAL_SAMPLE_COUNT, self.MAX_SAMPLE_PERIOD)
+        value[1].register_observer(pending_size.observe)
+        self._pending_size = pending_size
+      elif isinstance(coder, WindowedValueCoder):
+        self.mean_byte_counter.update(coder.estimate_size(windowed_value))
+      else:
+        self.mean_byte_counter.update(coder.estimate_size(value))
+    except Exception:  # pylint: disable=broad-except
+      # Values passed between fused steps are never encoded, and need not be
+      # encodable by their coders; such values are left out of the sample.
+      logging.debug('Could not estimate the size of %s with %s.',
+                    windowed_value, coder, exc_info=True)
 
   def update_collect(self):
     """Collects the accumulated size estimates.
 
-    Now that the element has been processed, we ask our accumulator
-    for the total and store the result in a counter.
+    Now that the element has been processed, the size of a sampled element
+    whose values were measured as they were read is added to the byte
+    counter.
     """
-    # TODO(silviuc): Implement estimated size sampling.
-    pass
+    if self._pending_size is not None:
+      self.mean_byte_counter.update(self._pending_size.size())
+      self._pending_size = None
 
   def __str__(self):
     return '<%s [%s]>' % (self.__class__.__name__,
@@ -57,3 +113,54 @@ class OperationCounters(object):
   def __repr__(self):
     return '<%s %s at %s>' % (self.__class__.__name__,
                               [x for x in self.__iter__()], hex(id(self)))
+
+
+class _GroupedValuesSize(object):
+  """The size of a key and its grouped values, measured as they are read.
+
+  Values read from shuffle are observed in their encoded form, and their
+  encodings are measured.  Values that are observed decoded, as after a
+  batch GroupAlsoByWindows, are estimated with the coder of the values; as
+  these can be many, only a sample of them is estimated, the same way
+  OperationCounters samples elements, and the size of the rest is
+  extrapolated from the sample.
+  """
+
+  def __init__(self, key_size, value_coder, initial_sample_count,
+               max_sample_period):
+    self.value_coder = value_coder
+    self.initial_sample_count = initial_sample_count
+    self.max_sample_period = max_sample_period
+    self.encoded_size = key_size
+    self.unencoded_count = 0
+    self.sampled_count = 0
+    self.sampled_size = 0
+    self._values_until_sample = 0
+
+  def observe(self, observed_value, is_encoded=False):
+    if is_encoded:
+      self.encoded_size += len(observed_value)
+      return
+    self.unencoded_count += 1
+    if self._values_until_sample > 0:
+      self._values_until_sample -= 1
+      return
+    try:
+      self.sampled_size += self.value_coder.estimate_size(observed_value)
+      self.sampled_count += 1
+    except Exception:  # pylint: disable=broad-except
+      # The consumer reading the values must not be interrupted by a value
+      # that cannot be estimated; the value is left out of the sample.
+      logging.debug('Could not estimate the size of %s with %s.',
+                    observed_value, self.value_coder, exc_info=True)
+    sample_period = min(self.unencoded_count // self.initial_sample_count,
+                        self.max_sample_period)
+    if sample_period > 1:
+      self._values_until_sample = random.randint(0, 2 * sample_period - 2)
+
+  def size(self):
+    """Returns the size of the key and of all the values observed so far."""
+    if not self.sampled_count:
+      return self.encoded_size
+    return self.encoded_size + int(
+        float(self.sampled_size) / self.sampled_count * self.unencoded_count)
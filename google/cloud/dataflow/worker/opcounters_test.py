@@ -14,10 +14,12 @@
 
 """Tests for worker counters."""
 
+import cPickle as pickle
 import logging
 import unittest
 
 from google.cloud.dataflow import coders
+from google.cloud.dataflow.coders import observable
 from google.cloud.dataflow.transforms.window import GlobalWindows
 from google.cloud.dataflow.utils.counters import CounterFactory
 from google.cloud.dataflow.worker.opcounters import OperationCounters
@@ -39,11 +41,26 @@ class ObjectThatDoesNotImplementLen(object):
     pass
 
 
+class ObservableValues(observable.ObservableMixin):
+
+  def __init__(self, values, is_encoded=True):
+    super(ObservableValues, self).__init__()
+    self.values = values
+    self.is_encoded = is_encoded
+
+  def __iter__(self):
+    for value in self.values:
+      self.notify_observers(value, is_encoded=self.is_encoded)
+      yield value
+
+
 class OperationCountersTest(unittest.TestCase):
 
-  def verify_counters(self, opcounts, expected_elements):
+  def verify_counters(self, opcounts, expected_elements, expected_size=None):
     self.assertEqual(expected_elements, opcounts.element_counter.total)
     self.assertEqual(expected_elements, opcounts.element_counter.elements)
+    if expected_size is not None:
+      self.assertEqual(expected_size, opcounts.mean_byte_counter.value())
 
   def test_update_int(self):
     opcounts = OperationCounters(CounterFactory(), 'some-name',
@@ -51,7 +68,7 @@ class OperationCountersTest(unittest.TestCase):
     self.verify_counters(opcounts, 0)
     opcounts.update_from(GlobalWindows.WindowedValue(1))
     opcounts.update_collect()
-    self.verify_counters(opcounts, 1)
+    self.verify_counters(opcounts, 1, len(pickle.dumps(1)))
 
   def test_update_str(self):
     opcounts = OperationCounters(CounterFactory(), 'some-name',
@@ -59,7 +76,66 @@ class OperationCountersTest(unittest.TestCase):
     self.verify_counters(opcounts, 0)
     opcounts.update_from(GlobalWindows.WindowedValue('abcde'))
     opcounts.update_collect()
+    self.verify_counters(opcounts, 1, len(pickle.dumps('abcde')))
+
+  def test_update_windowed_value(self):
+    coder = coders.WindowedValueCoder(coders.BytesCoder())
+    opcounts = OperationCounters(CounterFactory(), 'some-name', coder, 0)
+    windowed_value = GlobalWindows.WindowedValue('abcde')
+    opcounts.update_from(windowed_value)
+    opcounts.update_collect()
+    self.verify_counters(opcounts, 1, len(coder.encode(windowed_value)))
+
+  def test_update_with_other_coder(self):
+    opcounts = OperationCounters(CounterFactory(), 'some-name',
+                                 coders.PickleCoder(), 0)
+    opcounts.update_from(GlobalWindows.WindowedValue('abcde'),
+                         coders.BytesCoder())
+    opcounts.update_collect()
+    self.verify_counters(opcounts, 1, 5)
+
+  def test_update_unencodable(self):
+    opcounts = OperationCounters(CounterFactory(), 'some-name',
+                                 coders.BytesCoder(), 0)
+    opcounts.update_from(GlobalWindows.WindowedValue(lambda: None))
+    opcounts.update_collect()
     self.verify_counters(opcounts, 1)
+    self.assertEqual(0, opcounts.mean_byte_counter.elements)
+
+  def test_update_grouped_values(self):
+    coder = coders.TupleCoder((coders.BytesCoder(), coders.BytesCoder()))
+    opcounts = OperationCounters(CounterFactory(), 'some-name', coder, 0)
+    values = ObservableValues(['a', 'bc', 'def'])
+    opcounts.update_from(GlobalWindows.WindowedValue(('key', values)))
+    # The values are measured as they are read by the consumers.
+    self.assertEqual(['a', 'bc', 'def'], list(values))
+    opcounts.update_collect()
+    self.verify_counters(opcounts, 1, 3 + 6)
+
+  def test_update_unencoded_grouped_values(self):
+    elem_coder = coders.VarIntCoder()
+    coder = coders.TupleCoder(
+        (coders.BytesCoder(), coders.IterableCoder(elem_coder)))
+    opcounts = OperationCounters(CounterFactory(), 'some-name', coder, 0)
+    values = ObservableValues([1, 1000, 1000000], is_encoded=False)
+    opcounts.update_from(GlobalWindows.WindowedValue(('key', values)))
+    self.assertEqual([1, 1000, 1000000], list(values))
+    opcounts.update_collect()
+    # The values are estimated with the coder of the elements.
+    self.verify_counters(opcounts, 1, 3 + 1 + 2 + 3)
+
+  def test_sampling_decays(self):
+    opcounts = OperationCounters(CounterFactory(), 'some-name',
+                                 coders.VarIntCoder(), 0)
+    for n in xrange(100000):
+      opcounts.update_from(GlobalWindows.WindowedValue(n % 100))
+      opcounts.update_collect()
+    self.verify_counters(opcounts, 100000, 1)
+    samples = opcounts.mean_byte_counter.elements
+    # All of the first elements are sampled, and then ever fewer of them, but
+    # at least about one in MAX_SAMPLE_PERIOD.
+    self.assertGreater(samples, 100000 / OperationCounters.MAX_SAMPLE_PERIOD)
+    self.assertLess(samples, 1000)
 
   def test_update_old_object(self):
     opcounts = OperationCounters(CounterFactory(), 'some-name',
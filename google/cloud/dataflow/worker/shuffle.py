@@ -77,6 +77,24 @@ def _shuffle_decode(parameter):
   return base64.urlsafe_b64decode(parameter)
 
 
+# Length of the secondary keys written by timestamp_secondary_key.
+TIMESTAMP_SECONDARY_KEY_LENGTH = 8
+
+
+def timestamp_secondary_key(timestamp):
+  """Returns a secondary key sorting shuffle entries by the given timestamp.
+
+  Args:
+    timestamp: A timeutil.Timestamp object.
+
+  Returns:
+    A string of TIMESTAMP_SECONDARY_KEY_LENGTH bytes.  Keys of earlier
+    timestamps compare lower.
+  """
+  # Offset the signed microseconds so that the keys sort as unsigned bytes.
+  return struct.pack('>Q', timestamp.micros + (1 << 63))
+
+
 class ShuffleEntry(object):
   """A (position, key, 2nd-key, value) tuple as used by the shuffle library."""
 
@@ -254,10 +272,13 @@ class ShuffleKeyValuesIterable(observable.ObservableMixin):
   iterables every time __iter__ gets called. This way the values can be
   reiterated. The first time __iter__ is called no cloning happens.
   This supports the very common case of going once over all values for all keys.
+
+  The sorted_by_timestamp attribute tells whether the values were written with
+  timestamp secondary keys, and hence come in timestamp order.
   """
 
   def __init__(self, entries_iterator, key, value_coder,
-               start_position, end_position=''):
+               start_position, end_position='', sorted_by_timestamp=False):
     super(ShuffleKeyValuesIterable, self).__init__()
     self.key = key
     self.value_coder = value_coder
@@ -265,6 +286,7 @@ class ShuffleKeyValuesIterable(observable.ObservableMixin):
     self.end_position = end_position
     self.entries_iterator = entries_iterator
     self.first_values_iterator = None
+    self.sorted_by_timestamp = sorted_by_timestamp
 
   def __iter__(self):
     if self.first_values_iterator is None:
@@ -344,9 +366,13 @@ class GroupedShuffleReader(ShuffleReaderBase):
     entries_iterator = ShuffleEntriesIterator(self.entries_iterable)
     for entry in entries_iterator:
       entries_iterator.push_back(entry)
+      # Timestamp secondary keys are written either for all the values of a
+      # shuffle or for none of them.
       key_values = ShuffleKeyValuesIterable(
           entries_iterator,
-          entry.key, self.value_coder, entry.position)
+          entry.key, self.value_coder, entry.position,
+          sorted_by_timestamp=(
+              len(entry.secondary_key) == TIMESTAMP_SECONDARY_KEY_LENGTH))
       group_start = entry.position
 
       last_group_start = self._range_tracker.last_group_start
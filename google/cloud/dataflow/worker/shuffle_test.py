@@ -21,9 +21,13 @@ import unittest
 
 from google.cloud.dataflow import coders
 from google.cloud.dataflow.io import iobase
+from google.cloud.dataflow.transforms.timeutil import MAX_TIMESTAMP
+from google.cloud.dataflow.transforms.timeutil import MIN_TIMESTAMP
+from google.cloud.dataflow.transforms.timeutil import Timestamp
 from google.cloud.dataflow.worker.shuffle import GroupedShuffleSource
 from google.cloud.dataflow.worker.shuffle import ShuffleEntry
 from google.cloud.dataflow.worker.shuffle import ShuffleSink
+from google.cloud.dataflow.worker.shuffle import timestamp_secondary_key
 from google.cloud.dataflow.worker.shuffle import UngroupedShuffleSource
 
 
@@ -50,8 +54,9 @@ class FakeShuffleReader(object):
   - keys appear in lexicographic order
   """
 
-  def __init__(self, chunk_descriptors):
+  def __init__(self, chunk_descriptors, secondary_key=''):
     """Initializes the fake shuffle from a list of lists of (k,v) pairs."""
+    self.secondary_key = secondary_key
     self.all_vals = []
     self.chunk_starts = []
     last_index = 0
@@ -68,7 +73,7 @@ class FakeShuffleReader(object):
     for key, value in descriptor:
       ShuffleEntry(
           coder.encode(key),
-          '',
+          self.secondary_key,
           coder.encode(value),
           position=str(position)).to_bytes(stream)
       position += 1
@@ -173,6 +178,25 @@ class TestGroupedShuffleSource(unittest.TestCase):
           result.append((key, value))
     self.assertEqual(TEST_CHUNK1 + TEST_CHUNK2, result)
 
+  def test_sorted_by_timestamp(self):
+    source = GroupedShuffleSource(
+        config_bytes='not used', coder=Base64Coder())
+    for secondary_key, expected in (('', False),
+                                    (timestamp_secondary_key(Timestamp(5)),
+                                     True)):
+      test_reader = FakeShuffleReader([TEST_CHUNK1], secondary_key)
+      with source.reader(test_reader=test_reader) as reader:
+        for unused_key, key_values in reader:
+          self.assertEqual(expected, key_values.sorted_by_timestamp)
+
+  def test_timestamp_secondary_keys_sort_in_timestamp_order(self):
+    timestamps = [MIN_TIMESTAMP, Timestamp(-1000), Timestamp(micros=-1),
+                  Timestamp(0), Timestamp(micros=1), Timestamp(1 << 20),
+                  MAX_TIMESTAMP]
+    keys = [timestamp_secondary_key(t) for t in timestamps]
+    self.assertEqual(sorted(keys), keys)
+    self.assertEqual(len(set(keys)), len(keys))
+
   def test_progress_reporting(self):
     result = []
     progress_record = []
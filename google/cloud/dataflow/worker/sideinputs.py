@@ -0,0 +1,253 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Side input collections too large to be held in memory.
+
+Small side inputs are handed to DoFns as plain lists and dicts.  The classes
+here are used instead once a side input is estimated to be too large for that:
+iterable side inputs re-read their sources on every iteration, while list,
+dict and multimap side inputs are spilled to a local file and paged back in
+on access.
+"""
+
+from __future__ import absolute_import
+
+import collections
+import cPickle as pickle
+import tempfile
+import threading
+
+
+class ReiterableSideInput(object):
+  """An iterable side input reading its values anew on every iteration.
+
+  Each of the given callables returns an iterable of values; iterating over
+  this object iterates over the values of all of them in turn.
+  """
+
+  def __init__(self, read_fns):
+    self._read_fns = read_fns
+
+  def __iter__(self):
+    for read_fn in self._read_fns:
+      for value in read_fn():
+        yield value
+
+
+class SpilledListSideInput(object):
+  """A read-only list side input held in a local file.
+
+  The values are pickled into the file in pages of PAGE_SIZE values, and
+  only the file offset of each page is kept in memory.  The most recently
+  accessed pages (at most MAX_CACHED_PAGES of them) are kept unpickled, so
+  that sequential and clustered accesses do not hit the file for every
+  value.
+  """
+
+  # Number of values pickled together in each page of the file.
+  PAGE_SIZE = 1000
+
+  # Number of unpickled pages kept in memory.
+  MAX_CACHED_PAGES = 4
+
+  def __init__(self, values):
+    self._file = tempfile.TemporaryFile(prefix='dataflow-side-input-')
+    self._lock = threading.Lock()
+    # The file offset of the start of each page.
+    self._page_offsets = []
+    self._length = 0
+    # Maps page indices to unpickled pages, least recently used first.
+    self._cached_pages = collections.OrderedDict()
+
+    page = []
+    for value in values:
+      page.append(value)
+      if len(page) == self.PAGE_SIZE:
+        self._write_page(page)
+        page = []
+    if page:
+      self._write_page(page)
+    self._file.flush()
+
+  def _write_page(self, page):
+    self._page_offsets.append(self._file.tell())
+    pickle.dump(page, self._file, pickle.HIGHEST_PROTOCOL)
+    self._length += len(page)
+
+  def _get_page(self, page_index):
+    with self._lock:
+      page = self._cached_pages.pop(page_index, None)
+      if page is None:
+        self._file.seek(self._page_offsets[page_index])
+        page = pickle.load(self._file)
+        if len(self._cached_pages) >= self.MAX_CACHED_PAGES:
+          self._cached_pages.popitem(last=False)
+      self._cached_pages[page_index] = page
+      return page
+
+  def __len__(self):
+    return self._length
+
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      return [self[i] for i in xrange(*index.indices(self._length))]
+    if index < 0:
+      index += self._length
+    if not 0 <= index < self._length:
+      raise IndexError('list index out of range')
+    return self._get_page(index // self.PAGE_SIZE)[index % self.PAGE_SIZE]
+
+  def __iter__(self):
+    for page_index in xrange(len(self._page_offsets)):
+      for value in self._get_page(page_index):
+        yield value
+
+  def __contains__(self, value):
+    return any(v == value for v in self)
+
+  def __repr__(self):
+    return '<%s of %d values>' % (self.__class__.__name__, self._length)
+
+
+class SpilledMapSideInput(collections.Mapping):
+  """A read-only dict or multimap side input held in a local file.
+
+  The (key, value) pairs are partitioned into shards by the hash of their
+  keys, the number of shards doubling as the pairs are spilled so that each
+  shard holds about SHARD_SIZE pairs.  The pairs are buffered per shard and
+  pickled into the file in chunks; whenever the number of shards doubles,
+  and once all the pairs are spilled, the file is rewritten so that each
+  shard takes a single chunk.  Only the file offsets of the chunks of each
+  shard, and the number of keys, are kept in memory.  Looking a key up loads
+  the dict of its shard; the dicts of the most recently used shards (at most
+  MAX_CACHED_SHARDS of them) are kept in memory.
+
+  In a multimap, each key maps to the list of all the values paired with it;
+  otherwise, to the last of them.
+  """
+
+  # Number of pairs each shard holds on average, at most.
+  SHARD_SIZE = 1024
+
+  # Number of pairs buffered in memory before being pickled into the file.
+  MAX_BUFFERED_PAIRS = 64 * 1024
+
+  # Number of shard dicts kept in memory.
+  MAX_CACHED_SHARDS = 64
+
+  def __init__(self, pairs, multimap=False):
+    self.multimap = multimap
+    self._file = self._new_file()
+    self._lock = threading.Lock()
+    self._num_shards = 1
+    # The file offsets of the chunks of each shard.
+    self._chunk_offsets = [[]]
+    # The number of keys, counted as the file is last rewritten.
+    self._length = 0
+    # Maps shard indices to shard dicts, least recently used first.
+    self._cached_shards = collections.OrderedDict()
+
+    buffers = [[]]
+    buffered = 0
+    count = 0
+    for key, value in pairs:
+      buffers[self._shard_index(key)].append((key, value))
+      buffered += 1
+      count += 1
+      if (count > self._num_shards * self.SHARD_SIZE or
+          buffered >= self.MAX_BUFFERED_PAIRS):
+        self._write_chunks(buffers)
+        if count > self._num_shards * self.SHARD_SIZE:
+          self._rewrite(2 * self._num_shards)
+        buffers = [[] for _ in xrange(self._num_shards)]
+        buffered = 0
+    self._write_chunks(buffers)
+    self._rewrite(self._num_shards)
+
+  def _new_file(self):
+    return tempfile.TemporaryFile(prefix='dataflow-side-input-')
+
+  def _shard_index(self, key):
+    return hash(key) % self._num_shards
+
+  def _write_chunks(self, buffers):
+    for shard_index, chunk in enumerate(buffers):
+      if chunk:
+        self._chunk_offsets[shard_index].append(self._file.tell())
+        pickle.dump(chunk, self._file, pickle.HIGHEST_PROTOCOL)
+
+  def _read_pairs(self, shard_index):
+    pairs = []
+    for offset in self._chunk_offsets[shard_index]:
+      self._file.seek(offset)
+      pairs.extend(pickle.load(self._file))
+    return pairs
+
+  def _rewrite(self, num_shards):
+    """Rewrites the file with num_shards shards of a single chunk each.
+
+    As num_shards is a multiple of the current number of shards, the pairs
+    of each new shard all come from a single current shard, so that only one
+    shard at a time is held in memory.
+
+    Args:
+      num_shards: the new number of shards.
+    """
+    new_file = self._new_file()
+    chunk_offsets = [[] for _ in xrange(num_shards)]
+    length = 0
+    for shard_index in xrange(self._num_shards):
+      chunks = collections.defaultdict(list)
+      for key, value in self._read_pairs(shard_index):
+        chunks[hash(key) % num_shards].append((key, value))
+      for new_index, chunk in chunks.iteritems():
+        chunk_offsets[new_index].append(new_file.tell())
+        pickle.dump(chunk, new_file, pickle.HIGHEST_PROTOCOL)
+        length += len(set(key for key, _ in chunk))
+    new_file.flush()
+    self._file.close()
+    self._file = new_file
+    self._num_shards = num_shards
+    self._chunk_offsets = chunk_offsets
+    self._length = length
+
+  def _get_shard(self, shard_index):
+    with self._lock:
+      shard = self._cached_shards.pop(shard_index, None)
+      if shard is None:
+        shard = {}
+        for key, value in self._read_pairs(shard_index):
+          if self.multimap:
+            shard.setdefault(key, []).append(value)
+          else:
+            shard[key] = value
+        if len(self._cached_shards) >= self.MAX_CACHED_SHARDS:
+          self._cached_shards.popitem(last=False)
+      self._cached_shards[shard_index] = shard
+      return shard
+
+  def __getitem__(self, key):
+    return self._get_shard(self._shard_index(key))[key]
+
+  def __iter__(self):
+    for shard_index in xrange(self._num_shards):
+      if self._chunk_offsets[shard_index]:
+        for key in self._get_shard(shard_index):
+          yield key
+
+  def __len__(self):
+    return self._length
+
+  def __repr__(self):
+    return '<%s of %d keys>' % (self.__class__.__name__, len(self))
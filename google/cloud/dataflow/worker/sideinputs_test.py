@@ -0,0 +1,119 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for side input collections too large to be held in memory."""
+
+import logging
+import unittest
+
+from google.cloud.dataflow.worker import sideinputs
+import mock
+
+
+class ReiterableSideInputTest(unittest.TestCase):
+
+  def test_values_read_on_every_iteration(self):
+    reads = []
+
+    def read_fn(values):
+      def read():
+        reads.append(values)
+        return iter(values)
+      return read
+
+    side_input = sideinputs.ReiterableSideInput(
+        [read_fn([1, 2]), read_fn([]), read_fn([3])])
+    self.assertEqual([], reads)
+    self.assertEqual([1, 2, 3], list(side_input))
+    self.assertEqual([1, 2, 3], list(side_input))
+    self.assertEqual([[1, 2], [], [3]] * 2, reads)
+
+
+class SpilledListSideInputTest(unittest.TestCase):
+
+  def setUp(self):
+    self.values = [(i, 'value %d' % i) for i in range(2500)]
+    self.side_input = sideinputs.SpilledListSideInput(iter(self.values))
+
+  def test_len_and_iteration(self):
+    self.assertEqual(2500, len(self.side_input))
+    self.assertEqual(self.values, list(self.side_input))
+    self.assertEqual(self.values, list(self.side_input))
+
+  def test_random_access(self):
+    for index in (0, 999, 1000, 2499, 17, 1500, -1, -2500):
+      self.assertEqual(self.values[index], self.side_input[index])
+    for index in (2500, -2501):
+      with self.assertRaises(IndexError):
+        self.side_input[index]  # pylint: disable=pointless-statement
+    self.assertEqual(self.values[995:1005], self.side_input[995:1005])
+    self.assertEqual(self.values[::-700], self.side_input[::-700])
+    self.assertIn((1234, 'value 1234'), self.side_input)
+    self.assertNotIn((1234, 'value 1235'), self.side_input)
+
+  def test_empty(self):
+    side_input = sideinputs.SpilledListSideInput([])
+    self.assertEqual(0, len(side_input))
+    self.assertEqual([], list(side_input))
+    with self.assertRaises(IndexError):
+      side_input[0]  # pylint: disable=pointless-statement
+
+
+class SpilledMapSideInputTest(unittest.TestCase):
+
+  def setUp(self):
+    self.pairs = [('key %d' % (i % 3000), i) for i in range(10000)]
+
+  def test_dict(self):
+    side_input = sideinputs.SpilledMapSideInput(iter(self.pairs))
+    expected = dict(self.pairs)
+    self.assertEqual(3000, len(side_input))
+    self.assertEqual(9999, side_input['key 999'])
+    self.assertEqual(8000, side_input['key 2000'])
+    self.assertNotIn('key 3000', side_input)
+    with self.assertRaises(KeyError):
+      side_input['key 3000']  # pylint: disable=pointless-statement
+    self.assertEqual(expected, dict(side_input.iteritems()))
+
+  def test_multimap(self):
+    side_input = sideinputs.SpilledMapSideInput(iter(self.pairs),
+                                                multimap=True)
+    self.assertEqual(3000, len(side_input))
+    self.assertEqual([0, 3000, 6000, 9000], side_input['key 0'])
+    self.assertEqual([2999, 5999, 8999], side_input['key 2999'])
+    self.assertIsNone(side_input.get('key 3000'))
+    self.assertEqual(10000, sum(len(v) for v in side_input.itervalues()))
+
+  def test_shards_sized_from_input(self):
+    with mock.patch.multiple(sideinputs.SpilledMapSideInput,
+                             SHARD_SIZE=100, MAX_BUFFERED_PAIRS=64):
+      side_input = sideinputs.SpilledMapSideInput(iter(self.pairs))
+      self.assertEqual(128, side_input._num_shards)
+      # Each shard takes a single chunk once all the pairs are spilled.
+      self.assertTrue(all(len(offsets) <= 1
+                          for offsets in side_input._chunk_offsets))
+      self.assertEqual(3000, len(side_input))
+      self.assertEqual(0, len(side_input._cached_shards))
+      self.assertEqual(dict(self.pairs), dict(side_input.iteritems()))
+
+  def test_empty(self):
+    side_input = sideinputs.SpilledMapSideInput([])
+    self.assertEqual(0, len(side_input))
+    self.assertEqual([], list(side_input))
+    self.assertNotIn('key', side_input)
+
+
+if __name__ == '__main__':
+  logging.getLogger().setLevel(logging.INFO)
+  unittest.main()
@@ -16,9 +16,12 @@
 
 from __future__ import absolute_import
 
+import collections
+import functools
 import logging
 import random
 import sys
+import threading
 import time
 import traceback
 
@@ -72,6 +75,210 @@ class WindmillClient(object):
 # pylint: enable=invalid-name
 
 
+class KeyedWorkExecutor(object):
+  """Runs work on a bounded pool of threads, serially for any given key.
+
+  Work submitted for a key that is already being processed (or waiting to
+  be) is queued behind it, so that work items for the same key are never
+  processed concurrently and always complete in submission order.  Work for
+  different keys runs in parallel, which lets the Windmill round trips of
+  one work item overlap with the processing of others.
+  """
+
+  def __init__(self, num_threads, max_queued_work):
+    self.num_threads = num_threads
+    self.max_queued_work = max_queued_work
+    self._lock = threading.Condition()
+    # Maps each key with queued or running work to the deque of its
+    # not-yet-started work.
+    self._work_by_key = {}
+    # Keys whose next work may be started, i.e. that are not running.
+    self._ready_keys = collections.deque()
+    self._num_queued = 0
+    self._threads = []
+    self._shutdown = False
+
+  def submit(self, key, fn):
+    """Schedules fn() to be run; blocks while too much work is queued."""
+    with self._lock:
+      if not self._threads:
+        self._start_threads()
+      while self._num_queued >= self.max_queued_work:
+        self._lock.wait()
+      self._num_queued += 1
+      if key in self._work_by_key:
+        self._work_by_key[key].append(fn)
+      else:
+        self._work_by_key[key] = collections.deque([fn])
+        self._ready_keys.append(key)
+        self._lock.notify_all()
+
+  def wait_until_idle(self):
+    """Blocks until all submitted work has completed."""
+    with self._lock:
+      while self._num_queued:
+        self._lock.wait()
+
+  def shutdown(self):
+    """Stops the threads once all submitted work has completed."""
+    with self._lock:
+      self._shutdown = True
+      self._lock.notify_all()
+    for thread in self._threads:
+      thread.join()
+    self._threads = []
+
+  def _start_threads(self):
+    for _ in range(self.num_threads):
+      thread = threading.Thread(target=self._work_thread)
+      thread.daemon = True
+      thread.start()
+      self._threads.append(thread)
+
+  def _work_thread(self):
+    while True:
+      with self._lock:
+        while not self._ready_keys:
+          if self._shutdown and not self._num_queued:
+            return
+          self._lock.wait()
+        key = self._ready_keys.popleft()
+        fn = self._work_by_key[key].popleft()
+      try:
+        fn()
+      except:  # pylint: disable=bare-except
+        logging.error('Unexpected exception while processing work for key '
+                      '%r: %s', key, traceback.format_exc())
+      with self._lock:
+        if self._work_by_key[key]:
+          self._ready_keys.append(key)
+        else:
+          del self._work_by_key[key]
+        self._num_queued -= 1
+        self._lock.notify_all()
+
+
+class CommitQueue(object):
+  """Sends work item commits to Windmill asynchronously, in batches.
+
+  Commits are queued and sent by a background thread.  While one
+  CommitWork call is in flight, the commits queued in the meantime
+  accumulate and are sent together in the next call, up to max_batch_bytes
+  per call.  Queued and in-flight commits may hold at most max_queued_bytes
+  in total; commit() blocks beyond that so that work processing cannot get
+  arbitrarily far ahead of Windmill.
+
+  If given, failure_callback is called with the list of (computation id,
+  WorkItemCommitRequest) tuples of every batch that failed to be sent.
+  """
+
+  def __init__(self, windmill, max_batch_bytes, max_queued_bytes,
+               failure_callback=None):
+    self.windmill = windmill
+    self.max_batch_bytes = max_batch_bytes
+    self.max_queued_bytes = max_queued_bytes
+    self.failure_callback = failure_callback
+    self._lock = threading.Condition()
+    # Tuples of (computation id, WorkItemCommitRequest, byte size).
+    self._pending = collections.deque()
+    # Number and bytes of the commits that are either pending or in flight.
+    self._num_queued = 0
+    self._queued_bytes = 0
+    self._thread = None
+    self._shutdown = False
+
+  def commit(self, computation_id, workitem_commit_request):
+    """Queues a commit; blocks while too many bytes are already queued."""
+    size = workitem_commit_request.ByteSize()
+    with self._lock:
+      if self._thread is None:
+        self._thread = threading.Thread(target=self._commit_thread)
+        self._thread.daemon = True
+        self._thread.start()
+      # A commit larger than the limit is still let through on its own.
+      while (self._queued_bytes
+             and self._queued_bytes + size > self.max_queued_bytes):
+        self._lock.wait()
+      self._pending.append((computation_id, workitem_commit_request, size))
+      self._num_queued += 1
+      self._queued_bytes += size
+      self._lock.notify_all()
+
+  def flush(self):
+    """Blocks until all queued commits have been sent."""
+    with self._lock:
+      while self._num_queued:
+        self._lock.wait()
+
+  def shutdown(self):
+    """Stops the commit thread once all queued commits have been sent."""
+    with self._lock:
+      self._shutdown = True
+      self._lock.notify_all()
+    if self._thread is not None:
+      self._thread.join()
+      self._thread = None
+
+  def _commit_thread(self):
+    while True:
+      with self._lock:
+        while not self._pending:
+          if self._shutdown:
+            return
+          self._lock.wait()
+        batch = []
+        batch_bytes = 0
+        while self._pending and (
+            not batch
+            or batch_bytes + self._pending[0][2] <= self.max_batch_bytes):
+          computation_id, request, size = self._pending.popleft()
+          batch.append((computation_id, request))
+          batch_bytes += size
+      try:
+        self._send(batch)
+      except:  # pylint: disable=bare-except
+        # Windmill will hand out the work again once its token expires.
+        logging.error('Failed to commit %d work items: %s', len(batch),
+                      traceback.format_exc())
+        if self.failure_callback is not None:
+          self.failure_callback(batch)
+      with self._lock:
+        self._num_queued -= len(batch)
+        self._queued_bytes -= batch_bytes
+        self._lock.notify_all()
+
+  def _send(self, batch):
+    requests_by_computation = collections.OrderedDict()
+    for computation_id, request in batch:
+      requests_by_computation.setdefault(computation_id, []).append(request)
+    commit_request = windmill_pb2.CommitWorkRequest()
+    commit_request.requests.extend([
+        windmill_pb2.ComputationCommitWorkRequest(
+            computation_id=computation_id, requests=requests)
+        for computation_id, requests in requests_by_computation.items()])
+    self.windmill.CommitWork(commit_request)
+
+
+class PreparedMapTask(object):
+  """A decoded map task ready to be executed for any work item.
+
+  Decoding a map task and creating its operations deserializes every coder,
+  source, sink and function in it.  StreamingWorker keeps these around after
+  a work item completes successfully and reuses them for later work items of
+  the same computation, only swapping in the new work item through the
+  (shared) execution context.
+  """
+
+  def __init__(self, map_task_proto):
+    self.context = maptask.StreamingExecutionContext()
+    self.map_task = maptask.decode_map_task(
+        map_task_proto, maptask.WorkerEnvironment(), self.context)
+    self.executor = executor.MapTaskExecutor()
+
+  def execute(self):
+    self.executor.execute(self.map_task)
+
+
 class StreamingWorker(object):
   """A streaming worker that communicates with Windmill."""
 
@@ -84,6 +291,23 @@ class StreamingWorker(object):
   # Delay to use before retrying work items locally, in seconds.
   RETRY_LOCALLY_DELAY = 10.0
 
+  # Number of threads processing work items.
+  DEFAULT_NUM_WORK_THREADS = 16
+
+  # Maximum number of work items waiting to be processed before get_work
+  # stops being called.
+  MAX_QUEUED_WORK_ITEMS = 2 * MAX_GET_WORK_ITEMS
+
+  # Maximum size of a single CommitWork request.
+  MAX_COMMIT_BATCH_BYTES = 32 << 20  # 32m
+
+  # Maximum size of the commits waiting to be (or being) sent to Windmill
+  # before work item processing blocks.
+  MAX_QUEUED_COMMIT_BYTES = 128 << 20  # 128m
+
+  # Maximum size of the state cached across work items.
+  MAX_STATE_CACHE_BYTES = 100 << 20  # 100m
+
   def __init__(self, properties):
     self.project_id = properties['project_id']
     self.job_id = properties['job_id']
@@ -95,13 +319,26 @@ class StreamingWorker(object):
     logging.info('Using gRPC to connect to Windmill at %s:%d.', windmill_host,
                  windmill_port)
     self.windmill = WindmillClient(windmill_host, windmill_port)
+    self.state_cache = windmillstate.WindmillStateCache(
+        StreamingWorker.MAX_STATE_CACHE_BYTES)
+    self.commit_queue = CommitQueue(
+        self.windmill, StreamingWorker.MAX_COMMIT_BATCH_BYTES,
+        StreamingWorker.MAX_QUEUED_COMMIT_BYTES,
+        failure_callback=self.invalidate_committed_state)
 
     self.instruction_map = {}
     self.system_name_to_computation_id_map = {}
+    # Idle PreparedMapTask instances, keyed by computation id.
+    self.prepared_map_tasks = collections.defaultdict(list)
+    self.prepared_map_tasks_lock = threading.Lock()
+
+    num_work_threads = int(properties.get(
+        'num_work_threads', StreamingWorker.DEFAULT_NUM_WORK_THREADS))
+    self.work_executor = KeyedWorkExecutor(
+        num_work_threads, StreamingWorker.MAX_QUEUED_WORK_ITEMS)
 
   def run(self):
     self.running = True
-    # TODO(ccy): support multi-threaded or multi-process execution.
     self.dispatch_loop()
 
   def get_work(self):
@@ -157,32 +394,42 @@ class StreamingWorker(object):
       self.get_config(computation_id)
     map_task_proto = self.instruction_map[computation_id]
     for work_item in computation_work.work:
-      retry_locally = True
-      while retry_locally:
-        try:
-          self.process_work_item(computation_id, map_task_proto,
-                                 input_data_watermark, work_item)
-          break
-        except:  # pylint: disable=bare-except
-          logging.error(
-              'Exception while processing work item for computation %r: '
-              '%s, %s', computation_id, work_item, traceback.format_exc())
-
-          # Send exception details to Windmill, retry locally if possible.
-          retry_locally = self.report_failure(computation_id, work_item,
-                                              sys.exc_info())
-
-          # TODO(ccy): handle token expiration in retry logic.
-          # TODO(ccy): handle out-of-memory error in retry logic.
-          if retry_locally:
-            logging.error('Execution of work in computation %s for key %r '
-                          'failed; will retry locally.', computation_id,
-                          work_item.key)
-            time.sleep(StreamingWorker.RETRY_LOCALLY_DELAY)
-          else:
-            logging.error('Execution of work in computation %s for key %r '
-                          'failed; Windmill indicated to not retry '
-                          'locally.', computation_id, work_item.key)
+      # Work items for the same key must not be processed concurrently.
+      self.work_executor.submit(
+          (computation_id, work_item.key),
+          functools.partial(self.process_work_item_with_retries,
+                            computation_id, map_task_proto,
+                            input_data_watermark, work_item))
+
+  def process_work_item_with_retries(self, computation_id, map_task_proto,
+                                     input_data_watermark, work_item):
+    retry_locally = True
+    while retry_locally:
+      try:
+        self.process_work_item(computation_id, map_task_proto,
+                               input_data_watermark, work_item)
+        break
+      except:  # pylint: disable=bare-except
+        logging.error(
+            'Exception while processing work item for computation %r: '
+            '%s, %s', computation_id, work_item, traceback.format_exc())
+        self.state_cache.invalidate(computation_id, work_item.key)
+
+        # Send exception details to Windmill, retry locally if possible.
+        retry_locally = self.report_failure(computation_id, work_item,
+                                            sys.exc_info())
+
+        # TODO(ccy): handle token expiration in retry logic.
+        # TODO(ccy): handle out-of-memory error in retry logic.
+        if retry_locally:
+          logging.error('Execution of work in computation %s for key %r '
+                        'failed; will retry locally.', computation_id,
+                        work_item.key)
+          time.sleep(StreamingWorker.RETRY_LOCALLY_DELAY)
+        else:
+          logging.error('Execution of work in computation %s for key %r '
+                        'failed; Windmill indicated to not retry '
+                        'locally.', computation_id, work_item.key)
 
   def report_failure(self, computation_id, work_item, exc_info):
     """Send exception details to Windmill; returns whether to retry locally."""
@@ -201,6 +448,23 @@ class StreamingWorker(object):
     response = self.windmill.ReportStats(report_stats_request)
     return not response.failed
 
+  def invalidate_committed_state(self, failed_commits):
+    """Drops the cached state of keys whose commits failed."""
+    for computation_id, workitem_commit_request in failed_commits:
+      self.state_cache.invalidate(computation_id, workitem_commit_request.key)
+
+  def acquire_prepared_map_task(self, computation_id, map_task_proto):
+    """Returns a PreparedMapTask for exclusive use by a single work item."""
+    with self.prepared_map_tasks_lock:
+      idle = self.prepared_map_tasks[computation_id]
+      if idle:
+        return idle.pop()
+    return PreparedMapTask(map_task_proto)
+
+  def release_prepared_map_task(self, computation_id, prepared):
+    with self.prepared_map_tasks_lock:
+      self.prepared_map_tasks[computation_id].append(prepared)
+
   def process_work_item(self, computation_id, map_task_proto,
                         input_data_watermark, work_item):
     """Process a work item."""
@@ -208,35 +472,31 @@ class StreamingWorker(object):
         key=work_item.key,
         work_token=work_item.work_token)
 
-    env = maptask.WorkerEnvironment()
-    context = maptask.StreamingExecutionContext()
+    prepared = self.acquire_prepared_map_task(computation_id, map_task_proto)
 
     reader = windmillstate.WindmillStateReader(
         computation_id,
         work_item.key,
         work_item.work_token,
-        self.windmill)
+        self.windmill,
+        cache=self.state_cache.for_key(computation_id, work_item.key,
+                                       work_item.cache_token,
+                                       work_item.work_token))
     state_internals = windmillstate.WindmillStateInternals(reader)
     state = windmillstate.WindmillUnmergedState(state_internals)
     output_data_watermark = windmillio.windmill_to_harness_timestamp(
         work_item.output_data_watermark)
 
-    context.start(computation_id, work_item, input_data_watermark,
-                  output_data_watermark, workitem_commit_request,
-                  self.windmill, state)
-
-    map_task_executor = executor.MapTaskExecutor()
-    map_task = maptask.decode_map_task(map_task_proto, env, context)
+    prepared.context.start(computation_id, work_item, input_data_watermark,
+                           output_data_watermark, workitem_commit_request,
+                           self.windmill, state)
 
-    map_task_executor.execute(map_task)
+    prepared.execute()
     state_internals.persist_to(workitem_commit_request)
+    # Only reuse the operations if execution completed; after a failure they
+    # may be left in an inconsistent state.
+    self.release_prepared_map_task(computation_id, prepared)
 
-    # Send result to Windmill.
-    # TODO(ccy): in the future, this will not be done serially with respect to
-    # work execution.
-    commit_request = windmill_pb2.CommitWorkRequest()
-    computation_commit_request = windmill_pb2.ComputationCommitWorkRequest(
-        computation_id=computation_id,
-        requests=[workitem_commit_request])
-    commit_request.requests.extend([computation_commit_request])
-    self.windmill.CommitWork(commit_request)
+    # Send result to Windmill.  Windmill does not hand out more work for this
+    # key until the commit has been applied.
+    self.commit_queue.commit(computation_id, workitem_commit_request)
@@ -19,12 +19,16 @@ interactions with Windmill.
 """
 
 import logging
+import threading
+import time
 import unittest
 
 
 import mock
 
 from google.cloud.dataflow.internal import windmill_pb2
+from google.cloud.dataflow.worker.streamingworker import CommitQueue
+from google.cloud.dataflow.worker.streamingworker import KeyedWorkExecutor
 from google.cloud.dataflow.worker.streamingworker import StreamingWorker
 
 
@@ -40,7 +44,10 @@ class StreamingWorkerTest(unittest.TestCase):
         'windmill.host': 'fake_host',
         'windmill.grpc_port': '12345',
     }
-    return StreamingWorker(fake_properties)
+    worker = StreamingWorker(fake_properties)
+    self.addCleanup(worker.work_executor.shutdown)
+    self.addCleanup(worker.commit_queue.shutdown)
+    return worker
 
   def _get_worker_and_single_computation(self):
     worker = self._get_worker()
@@ -57,6 +64,7 @@ class StreamingWorkerTest(unittest.TestCase):
   def test_successful_work_item(self, *unused_mocks):
     worker, computation_work = self._get_worker_and_single_computation()
     worker.process_computation(computation_work)
+    worker.work_executor.wait_until_idle()
     self.assertEqual(0, len(worker.windmill.ReportStats.call_args_list))
     self.assertEqual(1, len(worker.process_work_item.call_args_list))
 
@@ -70,6 +78,7 @@ class StreamingWorkerTest(unittest.TestCase):
     worker.process_work_item.side_effect = Exception
 
     worker.process_computation(computation_work)
+    worker.work_executor.wait_until_idle()
 
     # Verify number of attempts and that failed work was reported.
     self.assertEqual(1, len(worker.windmill.ReportStats.call_args_list))
@@ -91,6 +100,7 @@ class StreamingWorkerTest(unittest.TestCase):
         [Exception] * retries + [None])
 
     worker.process_computation(computation_work)
+    worker.work_executor.wait_until_idle()
 
     # Verify number of attempts and that failed work was reported the correct
     # number of times.
@@ -100,6 +110,191 @@ class StreamingWorkerTest(unittest.TestCase):
         'Execution of work in computation %s for key %r failed; will retry '
         'locally.', u'A1', 'k')
 
+  @mock.patch('google.cloud.dataflow.worker.executor.MapTaskExecutor')
+  @mock.patch('google.cloud.dataflow.worker.maptask.decode_map_task')
+  def test_prepared_map_task_reused_across_work_items(
+      self, mock_decode_map_task, mock_executor_class):
+    worker = self._get_worker()
+    map_task_proto = mock.Mock()
+    for token in (1, 2, 3):
+      worker.process_work_item(
+          'A1', map_task_proto, 0,
+          windmill_pb2.WorkItem(key='k', work_token=token))
+
+    worker.commit_queue.flush()
+
+    self.assertEqual(1, mock_decode_map_task.call_count)
+    self.assertEqual(1, mock_executor_class.call_count)
+    self.assertEqual(3, mock_executor_class.return_value.execute.call_count)
+    committed_tokens = [
+        r.work_token
+        for call in worker.windmill.CommitWork.call_args_list
+        for c in call[0][0].requests for r in c.requests]
+    self.assertEqual([1, 2, 3], committed_tokens)
+    # The shared context is pointed at each new work item.
+    context = mock_decode_map_task.call_args[0][2]
+    self.assertEqual(3, context.work_item.work_token)
+
+  @mock.patch('google.cloud.dataflow.worker.executor.MapTaskExecutor')
+  @mock.patch('google.cloud.dataflow.worker.maptask.decode_map_task')
+  def test_prepared_map_task_discarded_after_failure(
+      self, mock_decode_map_task, mock_executor_class):
+    worker = self._get_worker()
+    map_task_proto = mock.Mock()
+    mock_executor_class.return_value.execute.side_effect = [ValueError, None]
+    work_item = windmill_pb2.WorkItem(key='k', work_token=1)
+    with self.assertRaises(ValueError):
+      worker.process_work_item('A1', map_task_proto, 0, work_item)
+    worker.process_work_item('A1', map_task_proto, 0, work_item)
+
+    self.assertEqual(2, mock_decode_map_task.call_count)
+    self.assertEqual(1, len(worker.prepared_map_tasks['A1']))
+
+
+class FakeWindmillClient(object):
+  """Records CommitWork requests, optionally holding them until released."""
+
+  def __init__(self):
+    self.commit_requests = []
+    self.release = threading.Event()
+    self.release.set()
+
+  def CommitWork(self, request):  # pylint: disable=invalid-name
+    self.commit_requests.append(request)
+    self.release.wait()
+    return windmill_pb2.CommitWorkResponse()
+
+  def committed(self):
+    return [[(c.computation_id, r.work_token)
+             for c in request.requests for r in c.requests]
+            for request in self.commit_requests]
+
+
+class CommitQueueTest(unittest.TestCase):
+
+  def _commit_queue(self, max_batch_bytes=1 << 20, max_queued_bytes=1 << 20):
+    windmill = FakeWindmillClient()
+    commit_queue = CommitQueue(windmill, max_batch_bytes, max_queued_bytes)
+    self.addCleanup(commit_queue.shutdown)
+    self.addCleanup(windmill.release.set)
+    return windmill, commit_queue
+
+  def _request(self, token, value_size=0):
+    request = windmill_pb2.WorkItemCommitRequest(key='k%d' % token,
+                                                 work_token=token)
+    if value_size:
+      request.output_messages.add(destination_stream_id='s').bundles.add(
+          key='k').messages.add(timestamp=0, data='x' * value_size)
+    return request
+
+  def test_commits_batched_while_in_flight(self):
+    windmill, commit_queue = self._commit_queue()
+    windmill.release.clear()
+    commit_queue.commit('A', self._request(1))
+    while not windmill.commit_requests:
+      time.sleep(0.001)
+    commit_queue.commit('A', self._request(2))
+    commit_queue.commit('B', self._request(3))
+    commit_queue.commit('A', self._request(4))
+    windmill.release.set()
+    commit_queue.flush()
+
+    self.assertEqual([[('A', 1)], [('A', 2), ('A', 4), ('B', 3)]],
+                     windmill.committed())
+
+  def test_batches_limited_by_bytes(self):
+    size = self._request(1, value_size=1000).ByteSize()
+    windmill, commit_queue = self._commit_queue(max_batch_bytes=2 * size)
+    windmill.release.clear()
+    for token in range(1, 6):
+      commit_queue.commit('A', self._request(token, value_size=1000))
+    windmill.release.set()
+    commit_queue.flush()
+
+    self.assertEqual(range(1, 6),
+                     [t for batch in windmill.committed() for _, t in batch])
+    for batch in windmill.committed():
+      self.assertGreaterEqual(2, len(batch))
+
+  def test_commit_blocks_when_queue_is_full(self):
+    size = self._request(1, value_size=1000).ByteSize()
+    windmill, commit_queue = self._commit_queue(max_queued_bytes=2 * size)
+    windmill.release.clear()
+    committed = []
+
+    def commit_all():
+      for token in range(1, 5):
+        commit_queue.commit('A', self._request(token, value_size=1000))
+        committed.append(token)
+
+    thread = threading.Thread(target=commit_all)
+    thread.daemon = True
+    thread.start()
+    time.sleep(0.1)
+    self.assertEqual([1, 2], committed)
+    windmill.release.set()
+    thread.join(5)
+    commit_queue.flush()
+    self.assertEqual([1, 2, 3, 4], committed)
+
+
+class KeyedWorkExecutorTest(unittest.TestCase):
+
+  def test_serial_per_key_and_parallel_across_keys(self):
+    work_executor = KeyedWorkExecutor(num_threads=4, max_queued_work=100)
+    self.addCleanup(work_executor.shutdown)
+    lock = threading.Lock()
+    running = set()
+    max_running = [0]
+    completed = []
+    # Assertions failing in the threads of the executor would go unnoticed,
+    # so the keys found running concurrently are checked here instead.
+    overlapping = []
+
+    def work(key, index):
+      with lock:
+        if key in running:
+          overlapping.append((key, index))
+        running.add(key)
+        max_running[0] = max(max_running[0], len(running))
+      time.sleep(0.005)
+      with lock:
+        running.remove(key)
+        completed.append((key, index))
+
+    for index in range(10):
+      for key in ('a', 'b', 'c'):
+        work_executor.submit(key, lambda k=key, i=index: work(k, i))
+    work_executor.wait_until_idle()
+
+    self.assertEqual([], overlapping)
+    self.assertEqual(30, len(completed))
+    for key in ('a', 'b', 'c'):
+      self.assertEqual(range(10), [i for k, i in completed if k == key])
+    self.assertLess(1, max_running[0])
+
+  def test_submit_blocks_when_queue_is_full(self):
+    work_executor = KeyedWorkExecutor(num_threads=1, max_queued_work=2)
+    self.addCleanup(work_executor.shutdown)
+    release = threading.Event()
+    submitted = []
+
+    def submit_all():
+      for index in range(4):
+        work_executor.submit(index, release.wait)
+        submitted.append(index)
+
+    thread = threading.Thread(target=submit_all)
+    thread.daemon = True
+    thread.start()
+    time.sleep(0.1)
+    self.assertEqual([0, 1], submitted)
+    release.set()
+    thread.join(5)
+    work_executor.wait_until_idle()
+    self.assertEqual([0, 1, 2, 3], submitted)
+
+
 if __name__ == '__main__':
   logging.getLogger().setLevel(logging.INFO)
   unittest.main()
@@ -236,10 +236,14 @@ class KeyedWorkItem(observable.ObservableMixin):
     self.windmill_pb2 = windmill_pb2
 
   def elements(self):
+    wv_coder_impl = self.wv_coder.get_impl()
     for bundle in self.work_item.message_bundles:
-      for message in bundle.messages:
-        element = self.wv_coder.decode(message.data)
-        self.notify_observers(message.data, is_encoded=True)
+      # The messages of a bundle are decoded together to save per-element
+      # calls into the coder.
+      encoded_elements = [message.data for message in bundle.messages]
+      elements = wv_coder_impl.decode_each(encoded_elements)
+      for encoded, element in zip(encoded_elements, elements):
+        self.notify_observers(encoded, is_encoded=True)
         yield element
 
   def timers(self):
@@ -18,8 +18,12 @@ from __future__ import absolute_import
 
 from abc import ABCMeta
 from abc import abstractmethod
+import collections
 import cPickle as pickle
 import logging
+import Queue
+import sys
+import threading
 
 
 from google.cloud.dataflow.internal import windmill_pb2
@@ -40,9 +44,18 @@ class WindmillUnmergedState(trigger.UnmergedState):
   def set_global_state(self, tag, value):
     self.internals.access('_global_', tag).add(value)
 
+  def add_global_state(self, tag, value):
+    self.internals.access('_global_', tag).add(value)
+
   def get_global_state(self, tag, default=None):
     return self.internals.access('_global_', tag).get() or default
 
+  def clear_global_state(self, tag):
+    self.internals.access('_global_', tag).clear()
+
+  def prefetch_global_state(self, tags):
+    self.internals.prefetch([('_global_', tag) for tag in tags])
+
   def set_timer(self, window, name, time_domain, timestamp):
     namespace = self._encode_window(window)
     self.internals.add_output_timer(namespace, name, time_domain, timestamp)
@@ -72,6 +85,10 @@ class WindmillUnmergedState(trigger.UnmergedState):
     namespace = self._encode_window(window)
     self.internals.access(namespace, tag).clear()
 
+  def prefetch_state(self, window_tag_pairs):
+    self.internals.prefetch(
+        [(self._encode_window(window), tag) for window, tag in window_tag_pairs])
+
 
 class WindmillStateInternals(object):
   """Internal interface to access data in Windmill via state tags."""
@@ -106,6 +123,26 @@ class WindmillStateInternals(object):
         raise ValueError('Invalid state tag.')
     return self.accessed[state_key]
 
+  def prefetch(self, namespace_tag_pairs):
+    """Fetches the state of all the given tags that is yet to be read at once.
+    """
+    value_keys = []
+    list_keys = []
+    watermark_hold_keys = []
+    for namespace, state_tag in namespace_tag_pairs:
+      accessor = self.access(namespace, state_tag)
+      if isinstance(accessor, WindmillBagAccessor):
+        # A cleared bag is never read from Windmill again.
+        if not accessor.cleared and accessor.first_page is None:
+          list_keys.append(accessor.state_key)
+      elif accessor.fetched:
+        continue
+      elif isinstance(accessor, WindmillWatermarkHoldAccessor):
+        watermark_hold_keys.append(accessor.state_key)
+      else:
+        value_keys.append(accessor.state_key)
+    self.reader.prefetch(value_keys, list_keys, watermark_hold_keys)
+
   def add_output_timer(self, namespace, name, time_domain, timestamp):
     windmill_ts = windmillio.harness_to_windmill_timestamp(timestamp)
     # Note: The character "|" must not be in the given namespace or name
@@ -128,6 +165,7 @@ class WindmillStateInternals(object):
     for unused_key, accessor in self.accessed.iteritems():
       accessor.persist_to(commit_request)
     commit_request.output_timers.extend(self.output_timers.values())
+    self.reader.cache_commit(commit_request)
 
 
 class WindmillStateReader(object):
@@ -137,60 +175,304 @@ class WindmillStateReader(object):
   # least one list element, if a single such element would exceed this size).
   MAX_LIST_BYTES = 8 << 20  # 8MB
 
-  def __init__(self, computation_id, key, work_token, windmill):
+  def __init__(self, computation_id, key, work_token, windmill, cache=None):
     self.computation_id = computation_id
     self.key = key
     self.work_token = work_token
     self.windmill = windmill
+    # Optional WindmillKeyStateCache of this key; TagValue, WatermarkHold and
+    # (complete) TagList messages found in it are not fetched from Windmill.
+    self.cache = cache
+    # Prefetched TagValue, TagList (first page) and WatermarkHold messages,
+    # keyed by (kind, state_key) and consumed by the first matching fetch.
+    self.prefetched = {}
+
+  def prefetch(self, value_keys=(), list_keys=(), watermark_hold_keys=()):
+    """Fetches the given state in a single request, for later fetch_* calls.
+
+    State already prefetched (and not yet consumed) is not requested again.
+
+    Args:
+      value_keys: state keys to be read with fetch_value.
+      list_keys: state keys to be read with fetch_list.
+      watermark_hold_keys: state keys to be read with fetch_watermark_hold.
+    """
+    keyed_request = self._keyed_request()
+    for state_key in set(value_keys):
+      if not self._prefetch_from_cache('value', state_key):
+        keyed_request.values_to_fetch.add(tag=state_key, state_family='')
+    for state_key in set(list_keys):
+      if not self._prefetch_from_cache('list', state_key):
+        keyed_request.lists_to_fetch.add(
+            tag=state_key,
+            state_family='',
+            end_timestamp=MAX_TIMESTAMP,
+            request_token='',
+            fetch_max_bytes=WindmillStateReader.MAX_LIST_BYTES)
+    for state_key in set(watermark_hold_keys):
+      if not self._prefetch_from_cache('watermark_hold', state_key):
+        keyed_request.watermark_holds_to_fetch.add(
+            tag=state_key, state_family='')
+    if not (keyed_request.values_to_fetch or keyed_request.lists_to_fetch
+            or keyed_request.watermark_holds_to_fetch):
+      return
+
+    result = self._get_data(keyed_request)
+    for wrapper in result.data:
+      for item in wrapper.data:
+        if item.failed:
+          # Leave it to the individual fetches to surface the failure.
+          continue
+        for value in item.values:
+          self.prefetched[('value', value.tag)] = value
+        for tag_list in item.lists:
+          self.prefetched[('list', tag_list.tag)] = tag_list
+        for hold in item.watermark_holds:
+          self.prefetched[('watermark_hold', hold.tag)] = hold
+    self._cache_response(result)
 
   def fetch_value(self, state_key):
     """Get the value at given state tag."""
-    request = windmill_pb2.GetDataRequest()
-    computation_request = windmill_pb2.ComputationGetDataRequest(
-        computation_id=self.computation_id)
-    keyed_request = windmill_pb2.KeyedGetDataRequest(
-        key=self.key,
-        work_token=self.work_token)
+    prefetched = self._pop_prefetched('value', state_key)
+    if prefetched is not None:
+      return self._response(values=[prefetched])
+    keyed_request = self._keyed_request()
     keyed_request.values_to_fetch.add(
         tag=state_key,
         state_family='')
-    computation_request.requests.extend([keyed_request])
-    request.requests.extend([computation_request])
-    return self.windmill.GetData(request)
+    return self._cache_response(self._get_data(keyed_request))
 
   def fetch_list(self, state_key, request_token=None):
     """Get the list at given state tag."""
-    request = windmill_pb2.GetDataRequest()
-    computation_request = windmill_pb2.ComputationGetDataRequest(
-        computation_id=self.computation_id)
-    keyed_request = windmill_pb2.KeyedGetDataRequest(
-        key=self.key,
-        work_token=self.work_token)
+    if not request_token:
+      prefetched = self._pop_prefetched('list', state_key)
+      if prefetched is not None:
+        return self._response(lists=[prefetched])
+    keyed_request = self._keyed_request()
     keyed_request.lists_to_fetch.add(
         tag=state_key,
         state_family='',
         end_timestamp=MAX_TIMESTAMP,
         request_token=request_token or '',
         fetch_max_bytes=WindmillStateReader.MAX_LIST_BYTES)
-    computation_request.requests.extend([keyed_request])
-    request.requests.extend([computation_request])
-    return self.windmill.GetData(request)
+    result = self._get_data(keyed_request)
+    if request_token:
+      # Later pages are never cached.
+      return result
+    return self._cache_response(result)
 
   def fetch_watermark_hold(self, state_key):
     """Get the watermark hold at given state tag."""
-    request = windmill_pb2.GetDataRequest()
-    computation_request = windmill_pb2.ComputationGetDataRequest(
-        computation_id=self.computation_id)
-    keyed_request = windmill_pb2.KeyedGetDataRequest(
-        key=self.key,
-        work_token=self.work_token)
+    prefetched = self._pop_prefetched('watermark_hold', state_key)
+    if prefetched is not None:
+      return self._response(watermark_holds=[prefetched])
+    keyed_request = self._keyed_request()
     keyed_request.watermark_holds_to_fetch.add(
         tag=state_key,
         state_family='')
+    return self._cache_response(self._get_data(keyed_request))
+
+  def cache_commit(self, commit_request):
+    """Updates the cache with the state written by the given commit."""
+    if self.cache is None:
+      return
+    for value_update in commit_request.value_updates:
+      self.cache.put('value', value_update.tag, windmill_pb2.TagValue(
+          tag=value_update.tag, value=value_update.value))
+    for hold in commit_request.watermark_holds:
+      if hold.reset:
+        self.cache.put('watermark_hold', hold.tag, windmill_pb2.WatermarkHold(
+            tag=hold.tag, timestamps=hold.timestamps))
+      else:
+        # The new hold depends on the one in Windmill, which we may not know.
+        self.cache.discard('watermark_hold', hold.tag)
+    # Maps the tags of the updated lists to their new complete contents, or
+    # to None if those are not known.
+    lists = {}
+    for list_update in commit_request.list_updates:
+      tag = list_update.tag
+      if list_update.HasField('end_timestamp'):
+        # The list is cleared.
+        lists[tag] = []
+      elif tag not in lists:
+        cached = self.cache.get('list', tag)
+        lists[tag] = None if cached is None else list(cached.values)
+      if lists[tag] is not None:
+        lists[tag].extend(list_update.values)
+    for tag, values in lists.iteritems():
+      if values is None:
+        self.cache.discard('list', tag)
+      else:
+        self.cache.put('list', tag, windmill_pb2.TagList(
+            tag=tag, values=values))
+
+  def _prefetch_from_cache(self, kind, state_key):
+    """Returns whether the given state is prefetched or found in the cache."""
+    if (kind, state_key) in self.prefetched:
+      return True
+    if self.cache is not None:
+      cached = self.cache.get(kind, state_key)
+      if cached is not None:
+        self.prefetched[(kind, state_key)] = cached
+        return True
+    return False
+
+  def _pop_prefetched(self, kind, state_key):
+    prefetched = self.prefetched.pop((kind, state_key), None)
+    if prefetched is None and self.cache is not None:
+      prefetched = self.cache.get(kind, state_key)
+    return prefetched
+
+  def _cache_response(self, result):
+    if self.cache is not None:
+      for wrapper in result.data:
+        for item in wrapper.data:
+          if item.failed:
+            continue
+          # Copy the messages so as not to hold on to the whole response.
+          for value in item.values:
+            self.cache.put('value', value.tag, windmill_pb2.TagValue(
+                tag=value.tag, value=value.value))
+          for hold in item.watermark_holds:
+            self.cache.put('watermark_hold', hold.tag,
+                           windmill_pb2.WatermarkHold(
+                               tag=hold.tag, timestamps=hold.timestamps))
+          for tag_list in item.lists:
+            # Only lists read in full (in a single page) are cached.
+            if not tag_list.continuation_token:
+              self.cache.put('list', tag_list.tag, windmill_pb2.TagList(
+                  tag=tag_list.tag, values=tag_list.values))
+    return result
+
+  def _keyed_request(self):
+    return windmill_pb2.KeyedGetDataRequest(
+        key=self.key,
+        work_token=self.work_token)
+
+  def _get_data(self, keyed_request):
+    request = windmill_pb2.GetDataRequest()
+    computation_request = windmill_pb2.ComputationGetDataRequest(
+        computation_id=self.computation_id)
     computation_request.requests.extend([keyed_request])
     request.requests.extend([computation_request])
     return self.windmill.GetData(request)
 
+  def _response(self, **keyed_response_fields):
+    """Wraps prefetched state as if it were the response to a fetch."""
+    return windmill_pb2.GetDataResponse(data=[
+        windmill_pb2.ComputationGetDataResponse(
+            computation_id=self.computation_id,
+            data=[windmill_pb2.KeyedGetDataResponse(
+                key=self.key, **keyed_response_fields)])])
+
+
+class WindmillStateCache(object):
+  """Worker-level cache of Windmill state, reused across work items.
+
+  Holds the TagValue and WatermarkHold messages, and the TagList messages of
+  lists read in full, read or written by the work items of each (computation
+  id, key), so that later work items for that key need not read them from
+  Windmill again.  The cached state of a key is dropped when a work item for
+  it comes with a different cache token, or with a work token not greater
+  than that of the previous one, as either means that Windmill may hold
+  state this worker has not seen.  Once the entries weigh more than
+  max_weight bytes, the least recently used ones are evicted.
+  """
+
+  def __init__(self, max_weight):
+    self.max_weight = max_weight
+    self._lock = threading.Lock()
+    # Maps (computation id, key, kind, state key) to a tuple of (message,
+    # weight), least recently used first.
+    self._entries = collections.OrderedDict()
+    # Maps each (computation id, key) with entries to a tuple of the (cache
+    # token, work token) of the work item that last cached state for it and
+    # the set of (kind, state key) of its entries.
+    self._keys = {}
+    self._weight = 0
+
+  def for_key(self, computation_id, key, cache_token, work_token):
+    """Returns the WindmillKeyStateCache of a key for a new work item.
+
+    Returns None if the work item has no cache token, i.e. its state may not
+    be cached.
+    """
+    if not cache_token:
+      return None
+    cache_key = (computation_id, key)
+    with self._lock:
+      if cache_key in self._keys:
+        last_cache_token, last_work_token = self._keys[cache_key][0]
+        if last_cache_token != cache_token or last_work_token >= work_token:
+          self._invalidate(cache_key)
+    return WindmillKeyStateCache(self, cache_key, (cache_token, work_token))
+
+  def invalidate(self, computation_id, key):
+    """Drops all the cached state of a key."""
+    with self._lock:
+      self._invalidate((computation_id, key))
+
+  def get(self, cache_key, kind, state_key):
+    with self._lock:
+      entry = self._entries.pop(cache_key + (kind, state_key), None)
+      if entry is None:
+        return None
+      self._entries[cache_key + (kind, state_key)] = entry
+      return entry[0]
+
+  def put(self, cache_key, tokens, kind, state_key, message):
+    weight = message.ByteSize()
+    with self._lock:
+      self._discard(cache_key, kind, state_key)
+      if cache_key in self._keys:
+        entry_keys = self._keys[cache_key][1]
+      else:
+        entry_keys = set()
+      self._keys[cache_key] = tokens, entry_keys
+      entry_keys.add((kind, state_key))
+      self._entries[cache_key + (kind, state_key)] = (message, weight)
+      self._weight += weight
+      while self._weight > self.max_weight:
+        entry_key = next(iter(self._entries))
+        self._discard(entry_key[:2], *entry_key[2:])
+
+  def discard(self, cache_key, kind, state_key):
+    with self._lock:
+      self._discard(cache_key, kind, state_key)
+
+  def _discard(self, cache_key, kind, state_key):
+    entry = self._entries.pop(cache_key + (kind, state_key), None)
+    if entry is not None:
+      self._weight -= entry[1]
+      entry_keys = self._keys[cache_key][1]
+      entry_keys.discard((kind, state_key))
+      if not entry_keys:
+        del self._keys[cache_key]
+
+  def _invalidate(self, cache_key):
+    if cache_key in self._keys:
+      for kind, state_key in self._keys.pop(cache_key)[1]:
+        self._weight -= self._entries.pop(cache_key + (kind, state_key))[1]
+
+
+class WindmillKeyStateCache(object):
+  """The part of a WindmillStateCache holding the state of a single key."""
+
+  def __init__(self, cache, cache_key, tokens):
+    self.cache = cache
+    self.cache_key = cache_key
+    self.tokens = tokens
+
+  def get(self, kind, state_key):
+    """Returns the cached message of the given kind and state key, or None."""
+    return self.cache.get(self.cache_key, kind, state_key)
+
+  def put(self, kind, state_key, message):
+    self.cache.put(self.cache_key, self.tokens, kind, state_key, message)
+
+  def discard(self, kind, state_key):
+    self.cache.discard(self.cache_key, kind, state_key)
+
 
 # TODO(ccy): investigate use of coders for Windmill state data.
 def encode_value(value):
@@ -201,6 +483,66 @@ def decode_value(encoded):
   return pickle.loads(encoded)
 
 
+class PageFetch(object):
+  """Fetches a page of state on a pool of helper threads.
+
+  The fetch is queued as soon as the PageFetch is created; result() waits for
+  it and returns the page, or re-raises the exception raised while fetching
+  it.  The threads are shared by the fetches of all the keys, and started on
+  first use.  A fetch cancelled before a thread gets to it is skipped.
+  """
+
+  NUM_FETCH_THREADS = 16
+
+  _lock = threading.Lock()
+  _queue = None
+
+  def __init__(self, fetch_fn, request_token):
+    self._fetch_fn = fetch_fn
+    self._request_token = request_token
+    self._page = None
+    self._exc_info = None
+    self._cancelled = False
+    self._done = threading.Event()
+    PageFetch._submit(self)
+
+  @classmethod
+  def _submit(cls, page_fetch):
+    with cls._lock:
+      if cls._queue is None:
+        cls._queue = Queue.Queue()
+        for _ in xrange(cls.NUM_FETCH_THREADS):
+          thread = threading.Thread(target=cls._fetch_thread,
+                                    args=(cls._queue,))
+          thread.daemon = True
+          thread.start()
+    cls._queue.put(page_fetch)
+
+  @staticmethod
+  def _fetch_thread(queue):
+    while True:
+      queue.get()._run()
+
+  def _run(self):
+    if not self._cancelled:
+      try:
+        self._page = self._fetch_fn(self._request_token)
+      except:  # pylint: disable=bare-except
+        self._exc_info = sys.exc_info()
+    self._fetch_fn = None
+    self._done.set()
+
+  def cancel(self):
+    """Skips the fetch if it has not started yet."""
+    self._cancelled = True
+
+  def result(self):
+    self._done.wait()
+    if self._exc_info is not None:
+      raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+    return self._page
+
+
 class StateAccessor(object):
   """Interface for accessing state bound to a given tag."""
   __metaclass__ = ABCMeta
@@ -385,7 +727,12 @@ class WindmillCombiningValueAccessor(StateAccessor):
 
 
 class WindmillBagAccessor(StateAccessor):
-  """Accessor for list state in Windmill."""
+  """Accessor for list state in Windmill.
+
+  The first page of the list is cached, so that repeated iteration does not
+  fetch it again.  While the values of a page are being consumed, the next
+  page is fetched on a helper thread.
+  """
 
   class WindmillBagIterable(object):
 
@@ -401,6 +748,8 @@ class WindmillBagAccessor(StateAccessor):
 
     self.cleared = False
     self.encoded_new_values = []
+    # Tuple of (encoded values, continuation token) of the first page.
+    self.first_page = None
 
   def get(self):
     # Don't directly iterate here; we want to return an iterable object so that
@@ -408,36 +757,50 @@ class WindmillBagAccessor(StateAccessor):
     return WindmillBagAccessor.WindmillBagIterable(self)
 
   def _get_iter(self):
-    if not self.cleared:
-      pass
     # Fetch values from Windmill, followed by values added in this sesison.
-    for value in self._fetch():
-      yield value
+    if not self.cleared:
+      for value in self._fetch():
+        yield value
     for value in self.encoded_new_values:
       yield decode_value(value)
 
   def _fetch(self):
     """Fetch state from Windmill."""
-    # TODO(ccy): the Java SDK caches the first page and at the start of each
-    # page of values, fires off an asynchronous read for the next page.  We
-    # should do this too once we have asynchronous Windmill state reading.
-    should_fetch_more = True
-    next_request_token = None
-    while should_fetch_more:
-      result = self.reader.fetch_list(self.state_key,
-                                      request_token=next_request_token)
-      next_request_token = None
-      for wrapper in result.data:
-        for datum in wrapper.data:
-          for item in datum.lists:
-            next_request_token = item.continuation_token
-            for value in item.values:
-              try:
-                yield decode_value(value.data)
-              except Exception:  # pylint: disable=broad-except
-                logging.error('Could not decode value: %r.', value.data)
-                yield None
-      should_fetch_more = next_request_token != ''  # pylint: disable=g-explicit-bool-comparison
+    if self.first_page is None:
+      self.first_page = self._fetch_page(None)
+    encoded_values, next_request_token = self.first_page
+    while True:
+      next_page = None
+      if next_request_token:
+        next_page = PageFetch(self._fetch_page, next_request_token)
+      try:
+        for encoded_value in encoded_values:
+          try:
+            yield decode_value(encoded_value)
+          except Exception:  # pylint: disable=broad-except
+            logging.error('Could not decode value: %r.', encoded_value)
+            yield None
+      except GeneratorExit:
+        # The iterator was dropped, so the next page is not needed.
+        if next_page is not None:
+          next_page.cancel()
+        raise
+      if next_page is None:
+        return
+      encoded_values, next_request_token = next_page.result()
+
+  def _fetch_page(self, request_token):
+    """Returns the encoded values and continuation token of a page."""
+    result = self.reader.fetch_list(self.state_key,
+                                    request_token=request_token)
+    encoded_values = []
+    next_request_token = ''
+    for wrapper in result.data:
+      for datum in wrapper.data:
+        for item in datum.lists:
+          next_request_token = item.continuation_token
+          encoded_values.extend(value.data for value in item.values)
+    return encoded_values, next_request_token
 
   def add(self, value):
     # Encode the value here to ensure further mutations of the value don't
@@ -0,0 +1,291 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for Windmill-backed state."""
+
+import logging
+import unittest
+
+from google.cloud.dataflow.internal import windmill_pb2
+from google.cloud.dataflow.transforms import combiners
+from google.cloud.dataflow.transforms import trigger
+from google.cloud.dataflow.transforms.timeutil import Timestamp
+from google.cloud.dataflow.transforms.window import GlobalWindows
+from google.cloud.dataflow.transforms.window import OutputTimeFn
+from google.cloud.dataflow.worker import windmillio
+from google.cloud.dataflow.worker import windmillstate
+import mock
+
+
+class FakeWindmill(object):
+  """Serves GetData requests from in-memory state, recording every request."""
+
+  def __init__(self, values=None, lists=None, watermark_holds=None,
+               page_size=None):
+    self.values = values or {}
+    self.lists = lists or {}
+    self.watermark_holds = watermark_holds or {}
+    self.page_size = page_size
+    self.requests = []
+
+  def GetData(self, request):  # pylint: disable=invalid-name
+    self.requests.append(request)
+    response = windmill_pb2.GetDataResponse()
+    for computation_request in request.requests:
+      computation_response = response.data.add(
+          computation_id=computation_request.computation_id)
+      for keyed_request in computation_request.requests:
+        keyed_response = computation_response.data.add(key=keyed_request.key)
+        for tag_value in keyed_request.values_to_fetch:
+          keyed_response.values.add(tag=tag_value.tag).value.data = (
+              self.values.get(tag_value.tag, ''))
+        for tag_list in keyed_request.lists_to_fetch:
+          values = self.lists.get(tag_list.tag, [])
+          start = int(tag_list.request_token or 0)
+          end = len(values) if self.page_size is None else (
+              start + self.page_size)
+          page = keyed_response.lists.add(
+              tag=tag_list.tag,
+              continuation_token=str(end) if end < len(values) else '')
+          for data in values[start:end]:
+            page.values.add(data=data, timestamp=0)
+        for hold in keyed_request.watermark_holds_to_fetch:
+          keyed_response.watermark_holds.add(
+              tag=hold.tag,
+              timestamps=self.watermark_holds.get(
+                  hold.tag, [windmillstate.MAX_TIMESTAMP]))
+    return response
+
+
+def encode(value):
+  return windmillstate.encode_value(value)
+
+
+class WindmillStateReaderTest(unittest.TestCase):
+
+  def test_fetches_served_from_prefetch(self):
+    windmill = FakeWindmill(
+        values={'1/v': encode('value')},
+        lists={'1/l': [encode(1), encode(2)]},
+        watermark_holds={'1/w': [windmillio.harness_to_windmill_timestamp(
+            Timestamp(5))]})
+    reader = windmillstate.WindmillStateReader('C', 'k', 1, windmill)
+    reader.prefetch(['1/v', '2/v'], ['1/l'], ['1/w'])
+    self.assertEqual(1, len(windmill.requests))
+
+    internals = windmillstate.WindmillStateInternals(reader)
+    output_time_fn_impl = OutputTimeFn.get_impl(OutputTimeFn.OUTPUT_AT_EOW,
+                                                GlobalWindows())
+    self.assertEqual('value', internals.access(
+        '1', trigger.ValueStateTag('v')).get())
+    self.assertEqual(None, internals.access(
+        '2', trigger.ValueStateTag('v')).get())
+    self.assertEqual([1, 2], list(internals.access(
+        '1', trigger.ListStateTag('l')).get()))
+    self.assertEqual(5, internals.access(
+        '1', trigger.WatermarkHoldStateTag('w', output_time_fn_impl)).get())
+    self.assertEqual(1, len(windmill.requests))
+
+  def test_prefetch_is_consumed_once(self):
+    windmill = FakeWindmill(values={'1/v': encode('value')})
+    reader = windmillstate.WindmillStateReader('C', 'k', 1, windmill)
+    reader.prefetch(['1/v'])
+    reader.prefetch(['1/v'])
+    self.assertEqual(1, len(windmill.requests))
+    reader.fetch_value('1/v')
+    reader.fetch_value('1/v')
+    self.assertEqual(2, len(windmill.requests))
+
+  def test_unmerged_state_prefetch(self):
+    tombstone = trigger.CombiningValueStateTag('tombstone',
+                                               combiners.CountCombineFn())
+    elements = trigger.ListStateTag('elements')
+    windmill = FakeWindmill(
+        values=dict(('%d/tombstone' % w, encode(w % 2)) for w in range(10)),
+        lists=dict(('%d/elements' % w, [encode(w)]) for w in range(10)))
+    reader = windmillstate.WindmillStateReader('C', 'k', 1, windmill)
+    state = windmillstate.WindmillUnmergedState(
+        windmillstate.WindmillStateInternals(reader))
+
+    state.prefetch_state([(w, tag) for w in range(10)
+                          for tag in (tombstone, elements)])
+    for w in range(10):
+      self.assertEqual(w % 2, state.get_state(w, tombstone))
+      self.assertEqual([w], list(state.get_state(w, elements)))
+    self.assertEqual(1, len(windmill.requests))
+
+  def test_cleared_bags_are_not_prefetched(self):
+    windmill = FakeWindmill(lists={'1/l': [encode(1)]})
+    reader = windmillstate.WindmillStateReader('C', 'k', 1, windmill)
+    internals = windmillstate.WindmillStateInternals(reader)
+    internals.access('1', trigger.ListStateTag('l')).clear()
+    internals.prefetch([('1', trigger.ListStateTag('l'))])
+    self.assertEqual(0, len(windmill.requests))
+    self.assertEqual([], list(internals.access(
+        '1', trigger.ListStateTag('l')).get()))
+
+
+class WindmillBagAccessorTest(unittest.TestCase):
+
+  def test_pages_are_all_read(self):
+    windmill = FakeWindmill(lists={'1/l': [encode(i) for i in range(5)]},
+                            page_size=2)
+    reader = windmillstate.WindmillStateReader('C', 'k', 1, windmill)
+    accessor = windmillstate.WindmillBagAccessor(reader, '1/l')
+    accessor.add(5)
+    self.assertEqual(range(6), list(accessor.get()))
+    self.assertEqual(3, len(windmill.requests))
+
+  def test_first_page_is_cached(self):
+    windmill = FakeWindmill(lists={'1/l': [encode(i) for i in range(5)]},
+                            page_size=2)
+    reader = windmillstate.WindmillStateReader('C', 'k', 1, windmill)
+    accessor = windmillstate.WindmillBagAccessor(reader, '1/l')
+    values = accessor.get()
+    self.assertEqual(range(5), list(values))
+    self.assertEqual(range(5), list(values))
+    self.assertEqual(5, len(windmill.requests))
+
+    single_page = windmillstate.WindmillBagAccessor(reader, '1/l')
+    windmill.page_size = None
+    self.assertEqual(range(5), list(single_page.get()))
+    self.assertEqual(range(5), list(single_page.get()))
+    self.assertEqual(6, len(windmill.requests))
+
+  def test_page_fetch_failure_is_raised(self):
+
+    class FailingWindmill(FakeWindmill):
+
+      def GetData(self, request):  # pylint: disable=invalid-name
+        if request.requests[0].requests[0].lists_to_fetch[0].request_token:
+          raise RuntimeError('GetData failed')
+        return super(FailingWindmill, self).GetData(request)
+
+    windmill = FailingWindmill(lists={'1/l': [encode(i) for i in range(5)]},
+                               page_size=2)
+    reader = windmillstate.WindmillStateReader('C', 'k', 1, windmill)
+    values = iter(windmillstate.WindmillBagAccessor(reader, '1/l').get())
+    self.assertEqual([0, 1], [next(values), next(values)])
+    with self.assertRaisesRegexp(RuntimeError, 'GetData failed'):
+      next(values)
+
+  def test_dropped_iterator_cancels_next_page(self):
+    windmill = FakeWindmill(lists={'1/l': [encode(i) for i in range(5)]},
+                            page_size=2)
+    reader = windmillstate.WindmillStateReader('C', 'k', 1, windmill)
+    accessor = windmillstate.WindmillBagAccessor(reader, '1/l')
+    with mock.patch.object(windmillstate.PageFetch, 'cancel') as cancel:
+      values = iter(accessor.get())
+      self.assertEqual(0, next(values))
+      del values
+      cancel.assert_called_once_with()
+
+  def test_cancelled_page_fetch_is_skipped(self):
+    fetch_fn = mock.Mock()
+    with mock.patch.object(windmillstate.PageFetch, '_submit'):
+      page_fetch = windmillstate.PageFetch(fetch_fn, 'token')
+    page_fetch.cancel()
+    page_fetch._run()  # pylint: disable=protected-access
+    self.assertIsNone(page_fetch.result())
+    self.assertFalse(fetch_fn.called)
+
+
+class WindmillStateCacheTest(unittest.TestCase):
+
+  def _run_work_item(self, windmill, cache, work_token, cache_token=7,
+                     add=None):
+    reader = windmillstate.WindmillStateReader(
+        'C', 'k', work_token, windmill,
+        cache=cache.for_key('C', 'k', cache_token, work_token))
+    internals = windmillstate.WindmillStateInternals(reader)
+    accessor = internals.access('1', trigger.ValueStateTag('v'))
+    value = accessor.get()
+    if add is not None:
+      accessor.add(add)
+    internals.persist_to(windmill_pb2.WorkItemCommitRequest(
+        key='k', work_token=work_token))
+    return value
+
+  def test_state_reused_across_work_items(self):
+    windmill = FakeWindmill(values={'1/v': encode('a')})
+    cache = windmillstate.WindmillStateCache(1 << 20)
+    self.assertEqual('a', self._run_work_item(windmill, cache, 1, add='b'))
+    self.assertEqual('b', self._run_work_item(windmill, cache, 2))
+    self.assertEqual('b', self._run_work_item(windmill, cache, 3))
+    self.assertEqual(1, len(windmill.requests))
+
+  def test_invalidated_by_tokens(self):
+    windmill = FakeWindmill(values={'1/v': encode('a')})
+    cache = windmillstate.WindmillStateCache(1 << 20)
+    self._run_work_item(windmill, cache, 1, add='b')
+    # A new cache token.
+    self.assertEqual('a', self._run_work_item(windmill, cache, 2,
+                                              cache_token=8))
+    self.assertEqual(2, len(windmill.requests))
+    # A work token that is not newer.
+    self.assertEqual('a', self._run_work_item(windmill, cache, 2,
+                                              cache_token=8))
+    self.assertEqual(3, len(windmill.requests))
+    # No cache token at all.
+    self._run_work_item(windmill, cache, 3, cache_token=8)
+    self._run_work_item(windmill, cache, 4, cache_token=0)
+    self.assertEqual(4, len(windmill.requests))
+
+  def test_invalidate(self):
+    windmill = FakeWindmill(values={'1/v': encode('a')})
+    cache = windmillstate.WindmillStateCache(1 << 20)
+    self._run_work_item(windmill, cache, 1, add='b')
+    cache.invalidate('C', 'k')
+    self.assertEqual('a', self._run_work_item(windmill, cache, 2))
+    self.assertEqual(2, len(windmill.requests))
+
+  def test_lists_reused_across_work_items(self):
+    windmill = FakeWindmill(lists={'1/l': [encode('a')]})
+    cache = windmillstate.WindmillStateCache(1 << 20)
+    tag = trigger.ListStateTag('l')
+    for work_token, expected, add, clear in [(1, ['a'], 'b', False),
+                                             (2, ['a', 'b'], 'c', True),
+                                             (3, ['c'], None, False)]:
+      reader = windmillstate.WindmillStateReader(
+          'C', 'k', work_token, windmill,
+          cache=cache.for_key('C', 'k', 7, work_token))
+      internals = windmillstate.WindmillStateInternals(reader)
+      accessor = internals.access('1', tag)
+      self.assertEqual(expected, list(accessor.get()))
+      if clear:
+        accessor.clear()
+        self.assertEqual([], list(accessor.get()))
+      if add is not None:
+        accessor.add(add)
+      internals.persist_to(windmill_pb2.WorkItemCommitRequest(
+          key='k', work_token=work_token))
+    self.assertEqual(1, len(windmill.requests))
+
+  def test_least_recently_used_evicted(self):
+    value = windmill_pb2.TagValue(tag='t', value=windmill_pb2.Value(
+        data='x' * 100, timestamp=0))
+    cache = windmillstate.WindmillStateCache(3 * value.ByteSize())
+    key_cache = cache.for_key('C', 'k', 7, 1)
+    for tag in 'abc':
+      key_cache.put('value', tag, value)
+    key_cache.get('value', 'a')
+    key_cache.put('value', 'd', value)
+    self.assertIsNone(key_cache.get('value', 'b'))
+    for tag in 'acd':
+      self.assertEqual(value, key_cache.get('value', tag))
+
+
+if __name__ == '__main__':
+  logging.getLogger().setLevel(logging.INFO)
+  unittest.main()